@@ -0,0 +1,51 @@
+"""fila de tarefas do crawler
+
+Revision ID: 3a7e1c9d42b6
+Revises: 05e21e7dd79a
+Create Date: 2026-10-18 13:02:14.386129
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a7e1c9d42b6'
+down_revision: Union[str, None] = '05e21e7dd79a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+status_tarefa_crawl = postgresql.ENUM('PENDENTE', 'EM_EXECUCAO', 'CONCLUIDA', 'ERRO', name='status_tarefa_crawl')
+
+
+def upgrade() -> None:
+    status_tarefa_crawl.create(op.get_bind(), checkfirst=True)
+    op.create_table('tarefas_crawl',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('controle_carga_id', sa.Integer(), nullable=False),
+    sa.Column('fonte', sa.String(), nullable=False),
+    sa.Column('cidade', sa.String(), nullable=False),
+    sa.Column('estado', sa.String(), nullable=False),
+    sa.Column('passada', sa.String(), nullable=False),
+    sa.Column('pagina', sa.Integer(), nullable=False),
+    sa.Column('status', postgresql.ENUM(name='status_tarefa_crawl', create_type=False), nullable=False),
+    sa.Column('tentativas', sa.Integer(), nullable=False),
+    sa.Column('visivel_em', sa.DateTime(), nullable=False),
+    sa.Column('erro', sa.Text(), nullable=True),
+    sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['controle_carga_id'], ['controle_carga.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('controle_carga_id', 'fonte', 'cidade', 'estado', 'passada', 'pagina', name='uq_tarefas_crawl_pagina')
+    )
+    op.create_index(op.f('ix_tarefas_crawl_id'), 'tarefas_crawl', ['id'], unique=False)
+    op.create_index('ix_tarefas_crawl_status_visivel_em', 'tarefas_crawl', ['status', 'visivel_em'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tarefas_crawl_status_visivel_em', table_name='tarefas_crawl')
+    op.drop_index(op.f('ix_tarefas_crawl_id'), table_name='tarefas_crawl')
+    op.drop_table('tarefas_crawl')
+    status_tarefa_crawl.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,64 @@
+"""unique (fonte, id_sistema_origem) em eventos e contadores da carga
+
+Revision ID: 5ff3bf663656
+Revises: f5e65e3826a3
+Create Date: 2026-10-18 10:12:41.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5ff3bf663656'
+down_revision: Union[str, None] = 'f5e65e3826a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def deduplicar_eventos() -> None:
+    # Cargas anteriores podem ter gravado o mesmo evento mais de uma vez.
+    # Mantém o registro de menor id e move as relações dos duplicados para ele.
+    op.execute("""
+        CREATE TEMP TABLE eventos_duplicados ON COMMIT DROP AS
+        SELECT id, manter FROM (
+            SELECT id, min(id) OVER (PARTITION BY fonte, id_sistema_origem) AS manter
+            FROM eventos
+            WHERE id_sistema_origem IS NOT NULL
+        ) AS eventos_agrupados
+        WHERE id <> manter
+    """)
+    for tabela in ('usuarios_eventos_querem_ir', 'usuarios_eventos_foram'):
+        op.execute(f"""
+            INSERT INTO {tabela} (usuario_id, evento_id)
+            SELECT t.usuario_id, d.manter FROM {tabela} t JOIN eventos_duplicados d ON t.evento_id = d.id
+            ON CONFLICT DO NOTHING
+        """)
+        op.execute(f"DELETE FROM {tabela} WHERE evento_id IN (SELECT id FROM eventos_duplicados)")
+    # Quem avaliou mais de uma cópia do evento fica com uma única avaliação do registro
+    # mantido: a mais recente (maior id)
+    op.execute("UPDATE avaliacoes SET evento_id = d.manter FROM eventos_duplicados d WHERE avaliacoes.evento_id = d.id")
+    op.execute("""
+        DELETE FROM avaliacoes a USING avaliacoes b
+        WHERE a.usuario_id = b.usuario_id AND a.evento_id = b.evento_id AND a.id < b.id
+          AND a.evento_id IN (SELECT manter FROM eventos_duplicados)
+    """)
+    op.execute("DELETE FROM eventos WHERE id IN (SELECT id FROM eventos_duplicados)")
+
+
+def upgrade() -> None:
+    deduplicar_eventos()
+
+    op.create_unique_constraint('uq_eventos_fonte_id_sistema_origem', 'eventos', ['fonte', 'id_sistema_origem'])
+    op.add_column('controle_carga', sa.Column('qtd_inseridos', sa.Integer(), nullable=True))
+    op.add_column('controle_carga', sa.Column('qtd_atualizados', sa.Integer(), nullable=True))
+    op.add_column('controle_carga', sa.Column('qtd_inalterados', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('controle_carga', 'qtd_inalterados')
+    op.drop_column('controle_carga', 'qtd_atualizados')
+    op.drop_column('controle_carga', 'qtd_inseridos')
+    op.drop_constraint('uq_eventos_fonte_id_sistema_origem', 'eventos', type_='unique')
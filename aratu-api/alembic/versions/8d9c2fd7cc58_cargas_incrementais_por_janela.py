@@ -0,0 +1,47 @@
+"""cargas incrementais por janela de datas
+
+Revision ID: 8d9c2fd7cc58
+Revises: 5ff3bf663656
+Create Date: 2026-10-18 11:03:27.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d9c2fd7cc58'
+down_revision: Union[str, None] = '5ff3bf663656'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+tipo_carga = postgresql.ENUM('COMPLETA', 'INCREMENTAL', name='tipo_carga')
+
+
+def upgrade() -> None:
+    tipo_carga.create(op.get_bind(), checkfirst=True)
+    op.add_column('controle_carga', sa.Column('tipo', tipo_carga, nullable=True, server_default='COMPLETA'))
+
+    op.create_table('janelas_carga',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('fonte', sa.String(), nullable=False),
+    sa.Column('dt_inic', sa.DateTime(), nullable=False),
+    sa.Column('dt_fim', sa.DateTime(), nullable=False),
+    sa.Column('qtd_src_total', sa.Integer(), nullable=True),
+    sa.Column('controle_carga_id', sa.Integer(), nullable=True),
+    sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['controle_carga_id'], ['controle_carga.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('fonte', 'dt_inic', 'dt_fim', name='uq_janelas_carga_fonte_dt_inic_dt_fim')
+    )
+    op.create_index(op.f('ix_janelas_carga_id'), 'janelas_carga', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_janelas_carga_id'), table_name='janelas_carga')
+    op.drop_table('janelas_carga')
+    op.drop_column('controle_carga', 'tipo')
+    tipo_carga.drop(op.get_bind(), checkfirst=True)
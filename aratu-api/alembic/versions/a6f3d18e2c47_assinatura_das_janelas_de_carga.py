@@ -0,0 +1,30 @@
+"""assinatura das janelas de carga
+
+A carga incremental passa a comparar a assinatura de cada janela (total e primeira
+página, FonteEventos.assinar_janela) em vez de só o total. As janelas já
+registradas ficam sem assinatura e são percorridas de novo na próxima carga.
+
+Revision ID: a6f3d18e2c47
+Revises: e2a9c7b4f158
+Create Date: 2026-10-18 18:41:09.227513
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6f3d18e2c47'
+down_revision: Union[str, None] = 'e2a9c7b4f158'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('janelas_carga', sa.Column('assinatura', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('janelas_carga', 'assinatura')
@@ -0,0 +1,64 @@
+"""índices das consultas das rotas
+
+Índices para os predicados das rotas de feed, busca e usuários, criados com
+CREATE INDEX CONCURRENTLY para que a migração rode com o banco em uso, sem
+bloquear escritas nas tabelas.
+
+(fonte, id_sistema_origem), usuarios.email e usuarios.telefone já têm índice pelas
+suas constraints unique e não entram aqui.
+
+Se uma criação concorrente falhar, o Postgres deixa o índice como INVALID; apague-o
+(DROP INDEX CONCURRENTLY ...) e rode a migração de novo.
+
+Revision ID: b7d41f0e9a23
+Revises: 3a7e1c9d42b6
+Create Date: 2026-10-18 15:27:41.902318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d41f0e9a23'
+down_revision: Union[str, None] = '3a7e1c9d42b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (nome, tabela, colunas, opções)
+INDICES = [
+    # categoria @> / && (categorias, feed aleatório, recomendados)
+    ('ix_eventos_categoria', 'eventos', ['categoria'], dict(postgresql_using='gin')),
+    # nome ILIKE '%x%' (buscas por nome)
+    ('ix_eventos_nome_trgm', 'eventos', ['nome'], dict(postgresql_using='gin', postgresql_ops={'nome': 'gin_trgm_ops'})),
+    # ORDER BY data_hora (feed paginado), com id para desempatar
+    ('ix_eventos_data_hora_id', 'eventos', ['data_hora', 'id'], {}),
+    # nome ILIKE '%x%' (busca de usuários)
+    ('ix_usuarios_nome_trgm', 'usuarios', ['nome'], dict(postgresql_using='gin', postgresql_ops={'nome': 'gin_trgm_ops'})),
+    # As chaves primárias das associações começam por usuario_id; as consultas por
+    # evento (populares, quem quer ir/foi) e por amigo_id precisam do índice inverso
+    ('ix_usuarios_eventos_querem_ir_evento_id', 'usuarios_eventos_querem_ir', ['evento_id', 'usuario_id'], {}),
+    ('ix_usuarios_eventos_foram_evento_id', 'usuarios_eventos_foram', ['evento_id', 'usuario_id'], {}),
+    ('ix_amigos_amigo_id', 'amigos', ['amigo_id', 'usuario_id'], {}),
+    # Média por evento e avaliação existente do usuário (avaliar_evento)
+    ('ix_avaliacoes_evento_id', 'avaliacoes', ['evento_id'], {}),
+    ('ix_avaliacoes_usuario_id_evento_id', 'avaliacoes', ['usuario_id', 'evento_id'], {}),
+    # Última carga / carga em andamento da fonte
+    ('ix_controle_carga_fonte_status_inic_exec', 'controle_carga', ['fonte', 'status', 'inic_exec'], {}),
+]
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    with op.get_context().autocommit_block():
+        for nome, tabela, colunas, opcoes in INDICES:
+            op.create_index(nome, tabela, colunas, unique=False, postgresql_concurrently=True, if_not_exists=True, **opcoes)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for nome, tabela, _, _ in reversed(INDICES):
+            op.drop_index(nome, table_name=tabela, postgresql_concurrently=True, if_exists=True)
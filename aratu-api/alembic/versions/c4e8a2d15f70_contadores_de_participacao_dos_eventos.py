@@ -0,0 +1,45 @@
+"""contadores de participação dos eventos
+
+qtd_quero_ir e qtd_fui em eventos, mantidos pelas ações dos usuários, e o índice
+do feed de populares. As colunas entram com default (sem reescrever a tabela), os
+contadores são preenchidos a partir das associações e o índice é criado com
+CREATE INDEX CONCURRENTLY.
+
+Revision ID: c4e8a2d15f70
+Revises: b7d41f0e9a23
+Create Date: 2026-10-18 16:04:12.518730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a2d15f70'
+down_revision: Union[str, None] = 'b7d41f0e9a23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('eventos', sa.Column('qtd_quero_ir', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('eventos', sa.Column('qtd_fui', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        """
+        UPDATE eventos SET
+            qtd_quero_ir = (SELECT count(*) FROM usuarios_eventos_querem_ir WHERE evento_id = eventos.id),
+            qtd_fui = (SELECT count(*) FROM usuarios_eventos_foram WHERE evento_id = eventos.id)
+        WHERE id IN (SELECT evento_id FROM usuarios_eventos_querem_ir UNION SELECT evento_id FROM usuarios_eventos_foram)
+        """
+    )
+    with op.get_context().autocommit_block():
+        op.create_index('ix_eventos_qtd_quero_ir_id', 'eventos', ['qtd_quero_ir', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_eventos_qtd_quero_ir_id', table_name='eventos', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('eventos', 'qtd_fui')
+    op.drop_column('eventos', 'qtd_quero_ir')
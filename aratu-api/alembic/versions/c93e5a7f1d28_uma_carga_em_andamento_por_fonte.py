@@ -0,0 +1,41 @@
+"""uma carga em andamento por fonte
+
+Índice único parcial em controle_carga(fonte) WHERE status = 'EM_PROGRESSO': dois
+pedidos de carga ao mesmo tempo não criam duas cargas da mesma fonte
+(carga_services.iniciar_carga insere com ON CONFLICT DO NOTHING).
+
+Cargas EM_PROGRESSO repetidas de uma mesma fonte, de antes do índice, ficam como
+ERRO, menos a mais recente.
+
+Revision ID: c93e5a7f1d28
+Revises: a6f3d18e2c47
+Create Date: 2026-10-18 20:12:37.518604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c93e5a7f1d28'
+down_revision: Union[str, None] = 'a6f3d18e2c47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        UPDATE controle_carga SET status = 'ERRO', fim_exec = coalesce(fim_exec, localtimestamp)
+        WHERE status = 'EM_PROGRESSO'
+          AND id NOT IN (SELECT max(id) FROM controle_carga WHERE status = 'EM_PROGRESSO' GROUP BY fonte)
+    """)
+    op.create_index(
+        'uq_controle_carga_fonte_em_progresso', 'controle_carga', ['fonte'],
+        unique=True, postgresql_where=sa.text("status = 'EM_PROGRESSO'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_controle_carga_fonte_em_progresso', table_name='controle_carga')
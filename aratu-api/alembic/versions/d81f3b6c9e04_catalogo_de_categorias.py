@@ -0,0 +1,43 @@
+"""catálogo de categorias
+
+Tabela categorias com as contagens de eventos (totais e futuros) de cada categoria,
+preenchida a partir dos eventos existentes.
+
+Revision ID: d81f3b6c9e04
+Revises: c4e8a2d15f70
+Create Date: 2026-10-18 16:48:30.227164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81f3b6c9e04'
+down_revision: Union[str, None] = 'c4e8a2d15f70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('categorias',
+    sa.Column('nome', sa.String(), nullable=False),
+    sa.Column('qtd_eventos', sa.Integer(), nullable=False),
+    sa.Column('qtd_futuros', sa.Integer(), nullable=False),
+    sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('nome')
+    )
+    op.execute(
+        """
+        INSERT INTO categorias (nome, qtd_eventos, qtd_futuros, atualizado_em)
+        SELECT nome, count(DISTINCT e.id), count(DISTINCT e.id) FILTER (WHERE e.data_hora >= localtimestamp), localtimestamp
+        FROM eventos e CROSS JOIN LATERAL unnest(e.categoria) AS nome
+        GROUP BY nome
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('categorias')
@@ -0,0 +1,43 @@
+"""recomendações pré-calculadas
+
+Tabela recomendacoes com o top-K de eventos de cada usuário, calculado por
+app/services/recomendacao_services.py. Fica vazia até o primeiro recálculo
+(python -m app.services.recomendacao_services); enquanto isso o feed de
+recomendados usa a consulta por categorias de interesse.
+
+Revision ID: e2a9c7b4f158
+Revises: d81f3b6c9e04
+Create Date: 2026-10-18 17:12:05.381946
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a9c7b4f158'
+down_revision: Union[str, None] = 'd81f3b6c9e04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('recomendacoes',
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('posicao', sa.Integer(), nullable=False),
+    sa.Column('evento_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('calculado_em', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['evento_id'], ['eventos.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('usuario_id', 'posicao')
+    )
+    # ON DELETE CASCADE a partir de eventos precisa do índice por evento_id
+    op.create_index('ix_recomendacoes_evento_id', 'recomendacoes', ['evento_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recomendacoes_evento_id', table_name='recomendacoes')
+    op.drop_table('recomendacoes')
@@ -1,26 +1,43 @@
-from datetime import datetime
 from math import ceil
 from fastapi import APIRouter, HTTPException, Depends, status, Query
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
-
-from app.models.models import Evento as ModelEvento, ControleCarga, Usuario as ModelUsuario, usuarios_eventos_querem_ir
-from app.schemas import Evento, EventoList, EventoResponse, EventoResponseExpand, UsuarioMini, AvaliacaoEvento
-from app.db.base import get_db
-from app.services.crowler_sympla import get_eventos_sympla, count_eventos_sympla
-from app.services import usuario_services as usuario_service
-
-from typing import List
+from sqlalchemy import or_, func, select
+
+from app.models.models import Evento as ModelEvento, ControleCarga, Usuario as ModelUsuario
+from app.schemas import ContagemFeed, Evento, EventoList, EventoSimilar, FeedHome, StatusCarrossel, EventoResponse, EventoResponseExpand, UsuarioMini, AvaliacaoEvento, TipoCarga, ProgressoCarga
+from app.core.config import settings
+from app.db.base import get_db, get_async_db
+from app.db.replicas import get_async_db_leitura, sessao_leitura
+from app.services import evento_services as evento_service
+from app.services import carga_services as carga_service
+from app.services import categorias_services as categoria_service
+from app.services import feed_services as feed_service
+from app.services import execucao_cargas
+from app.services import fontes_eventos
+from app.services import fila_crawl
+from app.services import indice_textual
+from app.services.coocorrencia_eventos import coocorrencia_eventos
+from app.services.cache import GRUPO_EVENTOS, GRUPO_PARTICIPACAO, cache_respostas
+
+from typing import List, Optional
+import asyncio
 import logging
-import random
 
 logger = logging.getLogger(__name__)
 
 evento_router = APIRouter()
 
+# As rotas "async def" usam a AsyncSession; as que chamam serviços síncronos (as de
+# carga) são "def" com a Session de get_db e rodam no threadpool, sem bloquear o loop.
+# Feed, busca e categorias só leem e usam get_async_db_leitura (réplicas, se houver).
+
+# Relações exibidas em /{evento_id}/expand, carregadas junto com o evento
+RELACOES_EXPAND = (ModelEvento.usuarios_que_querem_ir, ModelEvento.usuarios_que_foram, ModelEvento.avaliacoes)
+
 @evento_router.post("/", response_model=EventoResponse, status_code=status.HTTP_201_CREATED, summary='Criar um Evento', tags=["CRUD Evento"])
-async def criar_evento(evento: Evento, db: Session = Depends(get_db)):
+async def criar_evento(evento: Evento, db: AsyncSession = Depends(get_async_db)):
     novo_evento = ModelEvento(
     nome=evento.nome,
     descricao=evento.descricao,
@@ -39,23 +56,60 @@ async def criar_evento(evento: Evento, db: Session = Depends(get_db)):
     onde_comprar_ingressos=evento.onde_comprar_ingressos,
     )
     db.add(novo_evento)
-    db.commit()
-    db.refresh(novo_evento)
+    await categoria_service.ajustar_categorias(db, depois=categoria_service.contagem_do_evento(evento.categoria, evento.data_hora))
+    await db.commit()
+    await db.refresh(novo_evento)
+    await cache_respostas.invalidar_async(GRUPO_EVENTOS)
+    indice_textual.agendar_atualizacao([novo_evento.id])
 
     evento_response = EventoResponse.from_orm(novo_evento)
 
     return evento_response
 
 @evento_router.get("/{evento_id}", response_model=EventoResponse, status_code=status.HTTP_200_OK, summary='Buscar um Evento', tags=["CRUD Evento"])
-async def listar_evento_por_id(evento_id: int, db: Session = Depends(get_db)):
-    evento = db.query(ModelEvento).filter(ModelEvento.id == evento_id).first()
+async def listar_evento_por_id(evento_id: int, db: AsyncSession = Depends(get_async_db)):
+    evento = await db.get(ModelEvento, evento_id)
     if not evento:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
     return EventoResponse.from_orm(evento)
 
+@evento_router.get("/{evento_id}/similares", response_model=List[EventoSimilar], summary='Eventos que quem quer ir (ou foi) a este evento também marcou', tags=["Feed"])
+async def eventos_similares(
+    evento_id: int,
+    limite: int = Query(ge=1, le=settings.SIMILARES_MAXIMO_VIZINHOS, default=10, description="Quantidade de eventos similares"),
+    somente_futuros: bool = Query(default=True, description="Só eventos que ainda não aconteceram"),
+):
+    # Direto do índice de co-ocorrência em memória, sem consultar o banco; os dados
+    # dos eventos saem de /selectedEvents
+    return [
+        EventoSimilar(evento_id=vizinho, similaridade=similaridade, usuarios_em_comum=em_comum)
+        for vizinho, similaridade, em_comum in coocorrencia_eventos.similares(evento_id, limite, somente_futuros)
+    ]
+
+@evento_router.get("/{evento_id}/similares-por-conteudo", response_model=List[EventoSimilar], summary='Eventos com nome, descrição, organizador e local parecidos com os deste evento', tags=["Feed"])
+async def eventos_similares_por_conteudo(
+    evento_id: int,
+    limite: int = Query(ge=1, le=100, default=10, description="Quantidade de eventos similares"),
+    somente_futuros: bool = Query(default=True, description="Só eventos que ainda não aconteceram"),
+    db: AsyncSession = Depends(get_async_db_leitura),
+):
+    # Pelo índice textual em memória; o banco só é lido para um evento que não está
+    # no índice (antigo, ou criado depois da última atualização do arquivo)
+    indice = indice_textual.indice_atual()
+    vetor = indice.vetor_do_evento(evento_id)
+    if vetor is None:
+        evento = await db.get(ModelEvento, evento_id)
+        if not evento:
+            raise HTTPException(status_code=404, detail="Evento não encontrado")
+        vetor = indice.vetor(evento)
+    return [
+        EventoSimilar(evento_id=vizinho, similaridade=similaridade)
+        for vizinho, similaridade in indice.similares(vetor, limite, excluir=evento_id, somente_futuros=somente_futuros)
+    ]
+
 @evento_router.get("/{evento_id}/expand", response_model=EventoResponseExpand, status_code=status.HTTP_200_OK, summary='Buscar um Evento expandindo usuarios (Fui/Quero ir) e avaliacoes', tags=["Busca"])
-async def listar_evento_por_id(evento_id: int, db: Session = Depends(get_db)):
-    evento = db.query(ModelEvento).filter(ModelEvento.id == evento_id).first()
+async def listar_evento_por_id(evento_id: int, db: AsyncSession = Depends(get_async_db)):
+    evento = await evento_service.buscar_evento(db, evento_id, *RELACOES_EXPAND)
     if not evento:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
     
@@ -92,13 +146,13 @@ async def listar_evento_por_id(evento_id: int, db: Session = Depends(get_db)):
     return evento_response
 
 @evento_router.get("/{evento_id}/expand/{user_id}", response_model=EventoResponseExpand, status_code=status.HTTP_200_OK, summary='Buscar um Evento expandindo usuarios (Fui/Quero ir) e avaliacoes', tags=["Busca"])
-async def listar_evento_por_id(evento_id: int, user_id: int, db: Session = Depends(get_db)):
-    evento = db.query(ModelEvento).filter(ModelEvento.id == evento_id).first()
+async def listar_evento_por_id(evento_id: int, user_id: int, db: AsyncSession = Depends(get_async_db)):
+    evento = await evento_service.buscar_evento(db, evento_id, *RELACOES_EXPAND)
     if not evento:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
     
     # Encontra o usuário pelo ID
-    usuario = db.query(ModelUsuario).filter(ModelUsuario.id == user_id).first()
+    usuario = await db.get(ModelUsuario, user_id)
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
@@ -144,13 +198,15 @@ async def listar_evento_por_id(evento_id: int, user_id: int, db: Session = Depen
 async def update_event(
     evento_id: int,
     evento: Evento,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Busca o evento por ID
-    evento_db = db.query(ModelEvento).filter(ModelEvento.id == evento_id).first()
+    evento_db = await db.get(ModelEvento, evento_id)
     if not evento_db:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
 
+    antes = categoria_service.contagem_do_evento(evento_db.categoria, evento_db.data_hora)
+
     # Atualiza o evento com os novos campos
     evento_db.nome = evento.nome
     evento_db.descricao = evento.descricao
@@ -162,32 +218,39 @@ async def update_event(
     
     evento_db.onde_comprar_ingressos = evento.onde_comprar_ingressos  # Novo campo adicionado
 
-    db.commit()
-    db.refresh(evento_db)
+    await categoria_service.ajustar_categorias(db, antes, categoria_service.contagem_do_evento(evento_db.categoria, evento_db.data_hora))
+    await db.commit()
+    await db.refresh(evento_db)
+    await cache_respostas.invalidar_async(GRUPO_EVENTOS)
+    indice_textual.agendar_atualizacao([evento_id])
 
     return EventoResponse.from_orm(evento_db)
 
 @evento_router.delete("/{evento_id}", status_code=status.HTTP_204_NO_CONTENT, summary='Excluir um Evento', tags=["CRUD Evento"])
 async def deletar_evento(
     evento_id: int, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
     ):
-    # Deleta evento por ID
-    evento = db.query(ModelEvento).filter(ModelEvento.id == evento_id).first()
+    # Deleta evento por ID (as relações são carregadas para que o delete limpe as associações)
+    evento = await evento_service.buscar_evento(db, evento_id, *RELACOES_EXPAND)
     if not evento:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
-    db.delete(evento)
-    db.commit()
+    await db.delete(evento)
+    await categoria_service.ajustar_categorias(db, antes=categoria_service.contagem_do_evento(evento.categoria, evento.data_hora))
+    await db.commit()
+    await cache_respostas.invalidar_async(GRUPO_EVENTOS, GRUPO_PARTICIPACAO)
+    coocorrencia_eventos.remover_evento(evento_id)
+    indice_textual.agendar_atualizacao(removidos=[evento_id])
     
     return Response(content="", status_code=status.HTTP_204_NO_CONTENT)
 
 @evento_router.post("/selectedEvents", response_model=list[EventoResponse], summary='Buscar Eventos por uma lista de ids de evento', tags=["Busca"])
 async def listar_eventos_selecionados(
     eventos_ids: List[int],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Busca os eventos por uma lista de ID's
-    eventos = db.query(ModelEvento).filter(ModelEvento.id.in_(eventos_ids)).all()
+    eventos = (await db.scalars(select(ModelEvento).where(ModelEvento.id.in_(eventos_ids)))).all()
     
     # Use from_orm para criar uma lista de EventoResponse a partir dos eventos
     eventos_response = [EventoResponse.from_orm(evento) for evento in eventos]
@@ -197,72 +260,34 @@ async def listar_eventos_selecionados(
 @evento_router.get("/categories/{categoria}", response_model=list[EventoResponse], summary='Buscar Eventos por uma categoria', tags=["Feed"])
 async def listar_eventos_por_categoria(
     categoria: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db_leitura)
 ):
-    # Busca os eventos por categoria
-    eventos = db.query(ModelEvento).filter(ModelEvento.categoria.contains([categoria])).all()
-    
-    # Use from_orm para criar uma lista de EventoResponse a partir dos eventos
-    eventos_response = [EventoResponse.from_orm(evento) for evento in eventos]
-    
-    return eventos_response
+    return await feed_service.eventos_da_categoria(db, categoria)
 
 @evento_router.get("/feed/populares", response_model=list[EventoResponse], summary='Top 10 Eventos Populares', tags=["Feed"])
 async def listar_eventos_populares(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db_leitura)
 ):
-    # Consulta para contar o número de usuários por evento e ordenar os top 10
-    print("TOP10")
-    logger.info("TOP10")
-    eventos_populares = db.query(
-        ModelEvento,
-        func.count(usuarios_eventos_querem_ir.c.usuario_id).label("quantidade_querem_ir")
-    ).join(
-        usuarios_eventos_querem_ir, ModelEvento.id == usuarios_eventos_querem_ir.c.evento_id
-    ).group_by(
-        ModelEvento.id
-    ).order_by(
-        func.count(usuarios_eventos_querem_ir.c.usuario_id).desc()
-    ).limit(15).all()
-    
-    [print(evento) for evento in eventos_populares]
-    if not eventos_populares:
+    eventos_response = await feed_service.eventos_populares(db)
+    if not eventos_response:
         raise HTTPException(status_code=404, detail="Nenhum evento encontrado")
-    
-    eventos_response = [EventoResponse.from_orm(evento) for evento, _ in eventos_populares]
-    
+
     return eventos_response
 
 @evento_router.get("/feed/popular-entre-amigos/{user_id}", response_model=list[EventoResponse], summary='Eventos mais populares entre amigos de um usuario', tags=["Feed"])
-async def eventos_populares_entre_amigos(user_id: int, db: Session = Depends(get_db)):
-    # Verifica se o usuário existe no banco de dados
-    user = db.query(ModelUsuario).filter(ModelUsuario.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Usuário não encontrado")
-    
-    ids_amigos = [amigo.id for amigo in user.amigos]
-
-    # Query para obter os eventos mais populares entre os amigos do usuário
-    eventos = db.query(ModelEvento)\
-                .join(ModelEvento.usuarios_que_querem_ir)\
-                .filter(ModelUsuario.id.in_(ids_amigos))\
-                .group_by(ModelEvento.id)\
-                .order_by(func.count().desc())\
-                .limit(15)\
-                .all()
-
-    if not eventos:
+async def eventos_populares_entre_amigos(user_id: int, db: AsyncSession = Depends(get_async_db_leitura)):
+    eventos_response = await feed_service.eventos_populares_entre_amigos(db, user_id)
+    if not eventos_response:
+        if not await db.get(ModelUsuario, user_id):
+            raise HTTPException(status_code=404, detail="Usuário não encontrado")
         raise HTTPException(status_code=404, detail="Nenhum evento encontrado")
-    
-    # Use from_orm para criar uma lista de EventoResponse a partir dos eventos
-    eventos_response = [EventoResponse.from_orm(evento) for evento in eventos]
 
     return eventos_response
 
 @evento_router.get("/feed/recomendados-para-voce/{usuario_id}", response_model=List[EventoResponse], summary='Buscar Eventos alinhados com as Categorias de Interesse do Usuário', tags=["Feed"])
-async def eventos_de_interesse_do_usuario(usuario_id: int, db: Session = Depends(get_db)):
+async def eventos_de_interesse_do_usuario(usuario_id: int, db: AsyncSession = Depends(get_async_db_leitura)):
     try:
-        eventos_de_interesse = await usuario_service.get_eventos_interesse(db, usuario_id)
+        eventos_de_interesse = await feed_service.eventos_recomendados(db, usuario_id)
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
     
@@ -270,33 +295,71 @@ async def eventos_de_interesse_do_usuario(usuario_id: int, db: Session = Depends
 
 '''Este endpoint retorna eventos de uma categoria aleatória, a partir de todas as categorias disponíveis no banco de dados.'''
 @evento_router.get("/feed/categoria_aleatoria", response_model=List[EventoResponse], summary='Buscar Eventos por uma categoria aleatória', tags=["Feed"])
-async def listar_eventos_por_categoria_aleatoria(db: Session = Depends(get_db)):
-    categorias = db.query(ModelEvento.categoria).all()
-    categorias_lista = [categoria for sublist in categorias for categoria in sublist[0]]
-    categorias_unicas = list(set(categorias_lista))
-
-    if not categorias_unicas:
+async def listar_eventos_por_categoria_aleatoria(db: AsyncSession = Depends(get_async_db_leitura)):
+    eventos_response = await feed_service.eventos_de_categoria_aleatoria(db)
+    if not eventos_response:
         raise HTTPException(status_code=404, detail="Nenhuma categoria encontrada")
-    
-    categoria_aleatoria = random.choice(categorias_unicas)
-    print(categoria_aleatoria)
-    eventos = db.query(ModelEvento).filter(ModelEvento.categoria.contains([categoria_aleatoria])).limit(15).all()
-    eventos_response = [EventoResponse.from_orm(evento) for evento in eventos]
-    
+
     return eventos_response
 
+# Carrosséis da tela inicial, na ordem em que aparecem no app; cada um chama o serviço
+# do carrossel (feed_services) com uma sessão só dele
+CARROSSEIS_HOME = {
+    "populares": lambda db, usuario_id: feed_service.eventos_populares(db),
+    "popular_entre_amigos": feed_service.eventos_populares_entre_amigos,
+    "recomendados_para_voce": feed_service.eventos_recomendados,
+    "categoria_aleatoria": lambda db, usuario_id: feed_service.eventos_de_categoria_aleatoria(db),
+}
+
+async def __carrossel_home(nome: str, usuario_id: int):
+    # Um carrossel vazio, lento ou com erro não derruba os outros
+    async def executar():
+        async with sessao_leitura() as db:
+            return await CARROSSEIS_HOME[nome](db, usuario_id)
+
+    try:
+        eventos = await asyncio.wait_for(executar(), settings.FEED_HOME_TIMEOUT_SEGUNDOS)
+    except asyncio.TimeoutError:
+        logger.warning("Carrossel %s da home do usuário %s passou de %ss", nome, usuario_id, settings.FEED_HOME_TIMEOUT_SEGUNDOS)
+        return StatusCarrossel.TEMPO_ESGOTADO, []
+    except Exception:
+        logger.exception("Falha no carrossel %s da home do usuário %s", nome, usuario_id)
+        return StatusCarrossel.ERRO, []
+    return (StatusCarrossel.OK if eventos else StatusCarrossel.VAZIO), eventos
+
+@evento_router.get("/feed/home/{user_id}", response_model=FeedHome, summary='Todos os carrosséis da tela inicial numa única requisição', tags=["Feed"])
+async def feed_home(user_id: int, db: AsyncSession = Depends(get_async_db_leitura)):
+    # O usuário é conferido antes: um id inexistente não dispara os carrosséis
+    if not await db.get(ModelUsuario, user_id):
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+
+    # Os carrosséis rodam ao mesmo tempo, cada um com o seu limite de tempo; um evento
+    # que aparece em mais de um carrossel vai uma única vez em "eventos"
+    resultados = await asyncio.gather(*(__carrossel_home(nome, user_id) for nome in CARROSSEIS_HOME))
+
+    eventos = {}
+    carrosseis = {}
+    for nome, (situacao, eventos_carrossel) in zip(CARROSSEIS_HOME, resultados):
+        for evento in eventos_carrossel:
+            eventos.setdefault(evento["id"], evento)
+        carrosseis[nome] = dict(status=situacao.value, eventos_ids=[evento["id"] for evento in eventos_carrossel])
+
+    # Os eventos já são o JSON dos EventoResponse (feed_services): a resposta sai como
+    # está, sem passar de novo pela validação de FeedHome
+    return JSONResponse(dict(eventos=list(eventos.values()), carrosseis=carrosseis))
+
 @evento_router.post("/selectedCategories/{logicaBusca}", response_model=list[EventoResponse], summary='Buscar Eventos por uma lista de categorias', description = "Se logicaBusca for TRUE, buscara com lógica AND, se FALSE, com lógica OR", tags=["Feed"])
 async def listar_eventos_por_categorias(
     categorias: List[str],
     logicaBusca: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db_leitura)
 ):
     if logicaBusca:
         # Busca os eventos por categoria, CATEGORIA É UM ARRAY
-        eventos = db.query(ModelEvento).filter(ModelEvento.categoria.contains(categorias)).all()
+        eventos = (await db.scalars(select(ModelEvento).where(ModelEvento.categoria.contains(categorias)))).all()
     else:
         # Busca os eventos por categoria, CATEGORIA É UM ARRAY
-        eventos = db.query(ModelEvento).filter(or_(*[ModelEvento.categoria.contains([categoria]) for categoria in categorias])).all()
+        eventos = (await db.scalars(select(ModelEvento).where(or_(*[ModelEvento.categoria.contains([categoria]) for categoria in categorias])))).all()
     
     # Use from_orm para criar uma lista de EventoResponse a partir dos eventos
     eventos_response = [EventoResponse.from_orm(evento) for evento in eventos]
@@ -306,10 +369,10 @@ async def listar_eventos_por_categorias(
 @evento_router.get("/search/{nome}", response_model=list[EventoResponse], summary='Buscar Eventos por uma parte do seu nome', tags=["Busca"])
 async def listar_eventos_por_nome(
     nome: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db_leitura)
 ):
     # Busca os eventos por nome
-    eventos = db.query(ModelEvento).filter(ModelEvento.nome.ilike(f"%{nome}%")).all()
+    eventos = (await db.scalars(select(ModelEvento).where(ModelEvento.nome.ilike(f"%{nome}%")))).all()
     
     # Use from_orm para criar uma lista de EventoResponse a partir dos eventos
     eventos_response = [EventoResponse.from_orm(evento) for evento in eventos]
@@ -320,15 +383,15 @@ async def listar_eventos_por_nome(
 async def listar_eventos_por_nome_e_categoria(
     nome: str = None,
     categoria: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db_leitura)
 ):
     # Busca os eventos por nome e/ou categoria
-    query = db.query(ModelEvento)
+    query = select(ModelEvento)
     if nome:
-        query = query.filter(ModelEvento.nome.ilike(f"%{nome}%"))
+        query = query.where(ModelEvento.nome.ilike(f"%{nome}%"))
     if categoria:
-        query = query.filter(ModelEvento.categoria.contains([categoria]))
-    eventos = query.all()
+        query = query.where(ModelEvento.categoria.contains([categoria]))
+    eventos = (await db.scalars(query)).all()
     
     # Use from_orm para criar uma lista de EventoResponse a partir dos eventos
     eventos_response = [EventoResponse.from_orm(evento) for evento in eventos]
@@ -336,115 +399,99 @@ async def listar_eventos_por_nome_e_categoria(
     return eventos_response
 
 @evento_router.get("/categorias/", response_model=list[str], summary='Buscar todas as categorias distintas', tags=["Busca"])
-async def listar_categorias_distintas(db: Session = Depends(get_db)):
-    # Busca as categorias distintas
-    categorias = db.query(ModelEvento.categoria).all()
-    categorias_lista = [categoria for sublist in categorias for categoria in sublist[0]]
-    categorias_unicas = list(set(categorias_lista))
-    
-    return categorias_unicas
+async def listar_categorias_distintas(db: AsyncSession = Depends(get_async_db_leitura)):
+    return [nome for nome, _ in await feed_service.contagens_categorias(db)]
 
 @evento_router.get("/feed/todos-paginado", response_model=EventoList, summary="Buscar todos Eventos (paginado)" , tags=["Feed"])
 async def feed_eventos(
-    db: Session = Depends(get_db),
-    page: int = Query(ge=1, default=1, description="Número da página para a paginação, começando de 1"),
+    db: AsyncSession = Depends(get_async_db_leitura),
+    page: int = Query(ge=1, default=1, description="Número da página para a paginação, começando de 1. Ignorado com cursor"),
     perPage: int = Query(ge=1, le=100, default=10, description="Número de eventos por página"),
-    order: str = Query(default="asc", description="Ordenação dos eventos, 'asc' para ascendente e 'desc' para descendente")
+    order: str = Query(default="asc", description="Ordenação dos eventos, 'asc' para ascendente e 'desc' para descendente"),
+    cursor: Optional[str] = Query(default=None, description="next_cursor da página anterior: pagina por (data_hora, id) em vez de offset"),
+    contagem: ContagemFeed = Query(default=ContagemFeed.EXATA, description="Total de eventos: exata (em cache), aproximada (estatísticas do Postgres) ou nenhuma"),
 ):
-    # Calcular o offset baseado na página atual
-    offset = (page - 1) * perPage
-
-    # Construir a query com ordenação e paginação
-    query = db.query(ModelEvento)
-    if order == "asc":
-        query = query.order_by(ModelEvento.data_hora.asc())
-    else:
-        query = query.order_by(ModelEvento.data_hora.desc())
-    eventos = query.offset(offset).limit(perPage).all()
-
-    # Criar a resposta dos eventos usando o esquema Pydantic
-    eventos_response = [EventoResponse.from_orm(evento) for evento in eventos]
-
-    # Calcular o total de páginas
-    total_eventos = db.query(ModelEvento).count()
-    total_pages = ceil(total_eventos / perPage)
-
-    return EventoList(pages=total_pages, eventos=eventos_response)
-
-@evento_router.post("/populate/", status_code=status.HTTP_201_CREATED, summary="Roda o crawler pra popular nossa aplicação com eventos do Sympla", tags=["Carregar Eventos"])
-async def criar_eventos_from_api(db: Session = Depends(get_db)):
+    # Com cursor, a página começa depois do último evento da anterior (custo constante);
+    # sem, pelo offset de page. As duas devolvem o next_cursor, para o app trocar de modo
+    ordem = "asc" if order == "asc" else "desc"
     try:
-        # Total que vai ser carregado
-        count_total = count_eventos_sympla()
-
-        controle_carga = ControleCarga(
-            fonte = "SYMPLA",
-            inic_exec = datetime.now(),
-            fim_exec = None,
-            qtd_src_total = count_total,
-            qtd_sucesso = None,
-            status = "EM_PROGRESSO",
-        )
-
-        db.add(controle_carga)
-        db.commit()
-        db.refresh(controle_carga)
-
-        # Carregar eventos
-        eventos = get_eventos_sympla()
-        print(f"Eventos carregados: {len(eventos)}")
-        for evento_api in eventos:
-            evento_db = db.query(ModelEvento).filter(
-                and_(ModelEvento.id_sistema_origem == evento_api["id"], 
-                     ModelEvento.fonte == controle_carga.fonte)).first()
-            
-            if evento_db:
-                # Atualiza o registro existente
-                evento_db.nome = evento_api["name"]
-                evento_db.descricao = ""  # TODO: Check this
-                evento_db.local = evento_api["location"]["name"]
-                evento_db.endereco = f"{evento_api['location']['address']} - {evento_api['location']['city']}, {evento_api['location']['state']}"
-                evento_db.data_hora = evento_api["start_date"]
-                evento_db.data_fim = evento_api["end_date"]
-                evento_db.banner = evento_api["images"]["original"]
-                evento_db.onde_comprar_ingressos = evento_api["url"]
-                evento_db.organizador = evento_api['organizer']['name']
-                evento_db.gratis = evento_api['need_pay']
-                evento_db.categoria = evento_api['category']
-                evento_db.atualizado_em = datetime.now()
-                db.add(evento_db)
-            else:
-                # Cria um novo registro
-                new_evento = ModelEvento(
-                    nome=evento_api["name"],
-                    descricao="",  # TODO: Check this
-                    local=evento_api["location"]["name"],
-                    endereco=f"{evento_api['location']['address']} - {evento_api['location']['city']}, {evento_api['location']['state']}",
-                    data_hora=evento_api["start_date"],
-                    data_fim=evento_api["end_date"],
-                    banner=evento_api["images"]["original"],
-                    onde_comprar_ingressos=evento_api["url"],
-                    id_sistema_origem=evento_api["id"],
-                    fonte=controle_carga.fonte,
-                    organizador=evento_api['organizer']['name'],
-                    gratis=evento_api['need_pay'],
-                    categoria = evento_api['category'],
-                    atualizado_em=datetime.now()
-                )
-                db.add(new_evento)
-
-        controle_carga.status = "SUCESSO"
-        controle_carga.qtd_sucesso = len(eventos)
-        controle_carga.fim_exec = datetime.now()
-        db.add(controle_carga)
-        db.commit()
-
-    except Exception as e:
-        controle_carga.status = "ERRO"
-        controle_carga.fim_exec = datetime.now()
-        db.add(controle_carga)
-        db.commit()
-
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro ao obter eventos da API externa: {str(e)}")
-
-    return {"detail": "Eventos salvos com sucesso"}
+        query = evento_service.pagina_eventos(ordem, cursor)
+    except evento_service.CursorInvalido as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not cursor:
+        query = query.offset((page - 1) * perPage)
+
+    # Um evento a mais para saber se existe página seguinte
+    eventos = (await db.scalars(query.limit(perPage + 1))).all()
+    next_cursor = evento_service.codificar_cursor(eventos[perPage - 1], ordem) if len(eventos) > perPage else None
+    eventos_response = [EventoResponse.from_orm(evento) for evento in eventos[:perPage]]
+
+    # O total não é recalculado a cada página: a contagem exata fica no cache, invalidada pelas escritas
+    total_eventos = None
+    if contagem == ContagemFeed.EXATA:
+        total_eventos = await cache_respostas.obter_ou_calcular("total_eventos_feed", (), (GRUPO_EVENTOS,), lambda: evento_service.contar_eventos_feed(db))
+    elif contagem == ContagemFeed.APROXIMADA:
+        total_eventos = await evento_service.contar_eventos_feed(db, aproximado=True)
+    total_pages = ceil(total_eventos / perPage) if total_eventos is not None else None
+
+    return EventoList(pages=total_pages, total=total_eventos, eventos=eventos_response, next_cursor=next_cursor)
+
+def resposta_progresso_carga(controle_carga: ControleCarga):
+    colunas = {coluna.name: getattr(controle_carga, coluna.name) for coluna in ControleCarga.__table__.columns}
+    return ProgressoCarga(**colunas, **carga_service.progresso_carga(controle_carga))
+
+@evento_router.post("/populate/", response_model=List[ProgressoCarga], status_code=status.HTTP_202_ACCEPTED, summary="Agenda o crawler pra popular nossa aplicação com eventos das fontes externas", tags=["Carregar Eventos"])
+def criar_eventos_from_api(
+    db: Session = Depends(get_db),
+    tipo: Optional[TipoCarga] = Query(default=None, description="COMPLETA ou INCREMENTAL. Se omitido, a carga é incremental, com uma reconciliação completa periódica"),
+    fontes: Optional[List[str]] = Query(default=None, description="Fontes a carregar. Se omitido, todas as fontes registradas")
+):
+    registradas = fontes_eventos.fontes_registradas()
+    fontes = fontes or registradas
+    desconhecidas = [fonte for fonte in fontes if fonte not in registradas]
+    if desconhecidas:
+        raise HTTPException(status_code=404, detail=f"Fonte de eventos não encontrada: {', '.join(desconhecidas)}")
+
+    # Fontes que já têm uma carga em andamento ficam de fora desta execução
+    cargas = [carga_service.iniciar_carga(db, fonte, tipo.value if tipo else None) for fonte in fontes]
+    cargas = [controle_carga for controle_carga in cargas if controle_carga is not None]
+    if not cargas:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Já existe uma carga em andamento para todas as fontes pedidas")
+
+    # As cargas rodam em paralelo num processo separado, uma por fonte; o andamento
+    # de cada uma é acompanhado por GET /populate/{id}
+    execucao_cargas.enfileirar_cargas([controle_carga.id for controle_carga in cargas])
+
+    return [resposta_progresso_carga(controle_carga) for controle_carga in cargas]
+
+@evento_router.post("/populate/fila", response_model=List[ProgressoCarga], status_code=status.HTTP_202_ACCEPTED, summary="Enfileira um crawl distribuído por cidades e categorias", tags=["Carregar Eventos"])
+def enfileirar_crawl(
+    db: Session = Depends(get_db),
+    fontes: Optional[List[str]] = Query(default=None, description="Fontes a carregar. Se omitido, todas as fontes registradas"),
+    cidades: Optional[List[str]] = Query(default=None, description="Cidades no formato Cidade/UF. Se omitido, CRAWL_CIDADES")
+):
+    registradas = fontes_eventos.fontes_registradas()
+    fontes = fontes or registradas
+    desconhecidas = [fonte for fonte in fontes if fonte not in registradas]
+    if desconhecidas:
+        raise HTTPException(status_code=404, detail=f"Fonte de eventos não encontrada: {', '.join(desconhecidas)}")
+    try:
+        [fila_crawl.separar_cidade(cidade) for cidade in cidades or []]
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    # As tarefas são processadas pelos workers (python -m app.services.worker_crawl);
+    # fontes que já têm uma carga em andamento ficam de fora
+    cargas = [fila_crawl.enfileirar_crawl(db, fonte, cidades) for fonte in fontes]
+    cargas = [controle_carga for controle_carga in cargas if controle_carga is not None]
+    if not cargas:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Já existe uma carga em andamento para todas as fontes pedidas")
+    return [resposta_progresso_carga(controle_carga) for controle_carga in cargas]
+
+@evento_router.get("/populate/{controle_carga_id}", response_model=ProgressoCarga, summary="Andamento de uma carga de eventos", tags=["Carregar Eventos"])
+async def progresso_carga(controle_carga_id: int, db: AsyncSession = Depends(get_async_db)):
+    controle_carga = await db.get(ControleCarga, controle_carga_id)
+    if not controle_carga:
+        raise HTTPException(status_code=404, detail="Carga não encontrada")
+
+    return resposta_progresso_carga(controle_carga)
@@ -0,0 +1,102 @@
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.core.config import settings
+from app.db.base import async_engine, engine, get_db
+from app.db.consultas_lentas import consultas_lentas
+from app.db.pool import _PoolInstrumentado
+from app.db.replicas import roteador_replicas
+from app.services.cache import GRUPO_EVENTOS, GRUPO_PARTICIPACAO, cache_respostas
+from app.services.categorias_services import atualizar_categorias
+from app.services.contadores_eventos import reconciliar_contadores
+from app.services.coocorrencia_eventos import coocorrencia_eventos
+from app.services.indice_textual import atualizar_indice_textual, indice_atual
+from app.services.recomendacao_services import agendar_recalculo_completo
+
+def verificar_token_interno(x_token_interno: Optional[str] = Header(None)):
+    # Sem INTERNO_TOKEN configurado, as rotas ficam fechadas: para usá-las localmente,
+    # defina um token qualquer
+    if not settings.INTERNO_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="INTERNO_TOKEN não configurado")
+    if not x_token_interno or not secrets.compare_digest(x_token_interno, settings.INTERNO_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token interno inválido")
+
+interno_router = APIRouter(dependencies=[Depends(verificar_token_interno)])
+
+def __pools():
+    pools = {"sync": engine.pool, "async": async_engine.sync_engine.pool}
+    pools.update({replica.nome: replica.engine.sync_engine.pool for replica in roteador_replicas.replicas})
+    return {nome: pool for nome, pool in pools.items() if isinstance(pool, _PoolInstrumentado)}
+
+@interno_router.get("/pool", summary="Métricas dos pools de conexões com o banco", tags=["Interno"])
+def metricas_pool():
+    return {nome: pool.estado() for nome, pool in __pools().items()}
+
+@interno_router.post("/pool/zerar", status_code=status.HTTP_204_NO_CONTENT, summary="Zera os contadores dos pools de conexões", tags=["Interno"])
+def zerar_metricas_pool():
+    for pool in __pools().values():
+        pool.metricas.zerar()
+    return Response(content="", status_code=status.HTTP_204_NO_CONTENT)
+
+@interno_router.get("/replicas", summary="Saúde e atraso das réplicas de leitura", tags=["Interno"])
+def estado_replicas():
+    return {replica.nome: replica.estado() for replica in roteador_replicas.replicas}
+
+@interno_router.get("/consultas-lentas", summary="Consultas lentas recentes e os planos de cada forma de statement", tags=["Interno"])
+def listar_consultas_lentas():
+    return dict(ativo=settings.LOG_CONSULTAS_LENTAS, limite_ms=settings.CONSULTA_LENTA_MS, **consultas_lentas.resumo())
+
+@interno_router.post("/consultas-lentas/zerar", status_code=status.HTTP_204_NO_CONTENT, summary="Esvazia o log de consultas lentas", tags=["Interno"])
+def zerar_consultas_lentas():
+    consultas_lentas.zerar()
+    return Response(content="", status_code=status.HTTP_204_NO_CONTENT)
+
+@interno_router.post("/contadores/reconciliar", summary="Recalcula qtd_quero_ir/qtd_fui dos eventos a partir das associações", tags=["Interno"])
+def reconciliar_contadores_eventos(db: Session = Depends(get_db)):
+    return dict(eventos_corrigidos=reconciliar_contadores(db))
+
+@interno_router.post("/categorias/atualizar", status_code=status.HTTP_204_NO_CONTENT, summary="Recalcula o catálogo de categorias a partir dos eventos", tags=["Interno"])
+def atualizar_catalogo_categorias(db: Session = Depends(get_db)):
+    atualizar_categorias(db)
+    cache_respostas.invalidar(GRUPO_EVENTOS)
+    return Response(content="", status_code=status.HTTP_204_NO_CONTENT)
+
+@interno_router.post("/recomendacoes/recalcular", status_code=status.HTTP_202_ACCEPTED, summary="Agenda o recálculo das recomendações de todos os usuários", tags=["Interno"])
+def recalcular_recomendacoes():
+    agendar_recalculo_completo()
+    return dict(agendado=True)
+
+@interno_router.get("/similares", summary="Tamanho e última reconstrução do índice de eventos similares", tags=["Interno"])
+def estado_similares():
+    return coocorrencia_eventos.estado()
+
+@interno_router.post("/similares/reconstruir", summary="Reconstrói o índice de eventos similares a partir do banco", tags=["Interno"])
+def reconstruir_similares(db: Session = Depends(get_db)):
+    coocorrencia_eventos.reconstruir(db)
+    return coocorrencia_eventos.estado()
+
+@interno_router.get("/indice-textual", summary="Tamanho do índice textual dos eventos", tags=["Interno"])
+def estado_indice_textual():
+    indice = indice_atual()
+    return dict(arquivo=settings.INDICE_TEXTUAL_ARQUIVO, eventos=len(indice), termos=len(indice.termos), entradas=len(indice.contagens))
+
+@interno_router.post("/indice-textual/reconstruir", summary="Reconstrói o índice textual a partir de todos os eventos", tags=["Interno"])
+def reconstruir_indice_textual(db: Session = Depends(get_db)):
+    return dict(eventos=atualizar_indice_textual(db, completo=True))
+
+@interno_router.get("/cache", summary="Acertos e faltas do cache de respostas", tags=["Interno"])
+def metricas_cache():
+    return cache_respostas.metricas()
+
+@interno_router.post("/cache/invalidar", status_code=status.HTTP_204_NO_CONTENT, summary="Invalida todo o cache de respostas", tags=["Interno"])
+def invalidar_cache():
+    cache_respostas.invalidar(GRUPO_EVENTOS, GRUPO_PARTICIPACAO)
+    return Response(content="", status_code=status.HTTP_204_NO_CONTENT)
+
+@interno_router.post("/cache/zerar", status_code=status.HTTP_204_NO_CONTENT, summary="Zera as métricas do cache de respostas", tags=["Interno"])
+def zerar_metricas_cache():
+    cache_respostas.zerar_metricas()
+    return Response(content="", status_code=status.HTTP_204_NO_CONTENT)
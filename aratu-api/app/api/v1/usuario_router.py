@@ -1,5 +1,7 @@
 from fastapi import APIRouter, HTTPException, Query, status, Depends
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -9,19 +11,20 @@ from app.models.models import Evento as ModelEvento
 from app.models.models import Avaliacao as ModelAvaliacao
 from app.schemas import AvaliacaoEvento
 from app.schemas import UserResponse, UserResponseExpand, UsuarioCreate, UsuarioUpdate, UsuarioMini, Token, EventoMini
-from app.db.base import get_db
+from app.db.base import get_db, get_async_db
 from app.services import usuario_services as service
+from app.services.recomendacao_services import agendar_recalculo
 
 usuario_router = APIRouter()
 
 @usuario_router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED, summary='Criar um usuário', tags=["CRUD Usuario"])
-async def criar_usuario(usuario: UsuarioCreate, db: Session = Depends(get_db)):
+async def criar_usuario(usuario: UsuarioCreate, db: AsyncSession = Depends(get_async_db)):
     # Verifica se o e-mail ou telefone já está cadastrado
-    db_usuario = db.query(ModelUsuario).filter(ModelUsuario.email == usuario.email).first()
+    db_usuario = (await db.scalars(select(ModelUsuario).where(ModelUsuario.email == usuario.email))).first()
     if db_usuario:
         raise HTTPException(status_code=400, detail="Email já está em uso")
     
-    telefone = db.query(ModelUsuario).filter(ModelUsuario.telefone == usuario.telefone).first()
+    telefone = (await db.scalars(select(ModelUsuario).where(ModelUsuario.telefone == usuario.telefone))).first()
     if telefone:
         raise HTTPException(status_code=400, detail="Telefone já está em uso")
     
@@ -40,31 +43,32 @@ async def criar_usuario(usuario: UsuarioCreate, db: Session = Depends(get_db)):
     )
 
     db.add(novo_usuario)
-    db.commit()
-    db.refresh(novo_usuario)
+    await db.commit()
+    await db.refresh(novo_usuario)
 
     if usuario.lista_contatos:
-        service.adicionar_amigos_por_telefone(db, novo_usuario.id, usuario.lista_contatos)
+        await service.adicionar_amigos_por_telefone(db, novo_usuario.id, usuario.lista_contatos)
+    agendar_recalculo(novo_usuario.id)
 
     return UserResponse.from_orm(novo_usuario)
 
 @usuario_router.get("/{usuario_id}", response_model=UserResponse, summary='Buscar um usuário', tags=["CRUD Usuario"])
-async def buscar_usuario(usuario_id: int, db: Session = Depends(get_db)):
+async def buscar_usuario(usuario_id: int, db: AsyncSession = Depends(get_async_db)):
     # Busca o usuário por ID
-    usuario = db.query(ModelUsuario).filter(ModelUsuario.id == usuario_id).first()
+    usuario = await db.get(ModelUsuario, usuario_id)
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     return UserResponse.from_orm(usuario)
 
 @usuario_router.get("/{usuario_id}/expand", response_model=UserResponseExpand, summary='Buscar um Usuário expandindo Amigos e Eventos (Fui/Quero ir)', tags=["Busca"])
-async def buscar_usuario(usuario_id: int, db: Session = Depends(get_db)):
-    usuario = db.query(ModelUsuario).filter(ModelUsuario.id == usuario_id).first()
+async def buscar_usuario(usuario_id: int, db: AsyncSession = Depends(get_async_db)):
+    usuario = await service.buscar_usuario(db, usuario_id, ModelUsuario.amigos, ModelUsuario.avaliacoes)
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
     amigos = [UsuarioMini(id=amigo.id) for amigo in usuario.amigos]
     
-    eventos_quero_ir, eventos_fui = service.buscar_usuario_com_eventos_e_medias(db, usuario_id)
+    eventos_quero_ir, eventos_fui = await service.buscar_usuario_com_eventos_e_medias(db, usuario_id)
     
     eventos_quero_ir = [
         EventoMini(id=evento.id, nome=evento.nome, data_hora=evento.data_hora,
@@ -105,12 +109,15 @@ def update_user(
     if not user:
         raise HTTPException(status_code=404, detail='Usuário não encontrado')
 
-    # Atualiza os campos do usuário com os valores fornecidos, se eles existirem
+    # Atualiza os campos do usuário com os valores fornecidos (uma lista vazia de
+    # categorias_interesse, por exemplo, apaga os interesses)
     for var, value in vars(user_update).items():
-        setattr(user, var, value) if value else None
+        setattr(user, var, value) if value is not None else None
 
     session.commit()
     session.refresh(user)
+    if user_update.categorias_interesse is not None:
+        agendar_recalculo(usuario_id)
 
     return user
 
@@ -170,38 +177,38 @@ def alterar_senha(
     return usuario
 
 @usuario_router.post("/{usuario_id}/amigos/{amigo_id}", status_code=status.HTTP_201_CREATED, summary='Adicionar amigo', tags=["Ações do Usuário"])
-async def adicionar_amigo(usuario_id: int, amigo_id: int, db: Session = Depends(get_db)):
-    service.adicionar_amigo(db, usuario_id, amigo_id)
+async def adicionar_amigo(usuario_id: int, amigo_id: int, db: AsyncSession = Depends(get_async_db)):
+    await service.adicionar_amigo(db, usuario_id, amigo_id)
     return {"mensagem": "Amigo adicionado com sucesso"}
 
 @usuario_router.delete("/{usuario_id}/amigos/{amigo_id}", status_code=status.HTTP_200_OK, summary='Remover amigo', tags=["Ações do Usuário"])
-async def remover_amigo_route(usuario_id: int, amigo_id: int, db: Session = Depends(get_db)):
-    service.remover_amigo(db, usuario_id, amigo_id)
+async def remover_amigo_route(usuario_id: int, amigo_id: int, db: AsyncSession = Depends(get_async_db)):
+    await service.remover_amigo(db, usuario_id, amigo_id)
     return {"mensagem": "Amigo removido com sucesso"}
 
 @usuario_router.post("/{usuario_id}/amigos_lista_contatos", status_code=status.HTTP_201_CREATED, summary='Adicionar vários amigos por uma lista de contatos', tags=["Ações do Usuário"])
-async def adicionar_amigos_endpoint(usuario_id: int, telefones: List[str], db: Session = Depends(get_db)):
-    service.adicionar_amigos_por_telefone(db, usuario_id, telefones)
+async def adicionar_amigos_endpoint(usuario_id: int, telefones: List[str], db: AsyncSession = Depends(get_async_db)):
+    await service.adicionar_amigos_por_telefone(db, usuario_id, telefones)
     return {"mensagem": "Amigos adicionados com sucesso"}
 
 @usuario_router.post("/{usuario_id}/quero_ir/{evento_id}", status_code=status.HTTP_201_CREATED, summary= "Adicionar evento à lista de 'Quero Ir'", tags=["Ações do Usuário"])
-async def adicionar_evento_quero_ir(usuario_id: int, evento_id: int, db: Session = Depends(get_db)):
-    service.adicionar_evento_quero_ir(db, usuario_id, evento_id)
+async def adicionar_evento_quero_ir(usuario_id: int, evento_id: int, db: AsyncSession = Depends(get_async_db)):
+    await service.adicionar_evento_quero_ir(db, usuario_id, evento_id)
     return {"mensagem": "Evento adicionado à lista de 'Quero Ir' com sucesso"}
 
 @usuario_router.post("/{usuario_id}/fui/{evento_id}", status_code=status.HTTP_201_CREATED, summary="Adicionar evento à lista de 'Fui'", tags=["Ações do Usuário"])
-async def adicionar_evento_fui(usuario_id: int, evento_id: int, db: Session = Depends(get_db)):
-    service.adicionar_evento_fui(db, usuario_id, evento_id)
+async def adicionar_evento_fui(usuario_id: int, evento_id: int, db: AsyncSession = Depends(get_async_db)):
+    await service.adicionar_evento_fui(db, usuario_id, evento_id)
     return {"mensagem": "Evento adicionado à lista de 'Fui' com sucesso"}
 
 @usuario_router.delete("/{usuario_id}/quero_ir/{evento_id}", status_code=status.HTTP_200_OK, summary="Remover evento da lista de 'Quero Ir'", tags=["Ações do Usuário"])
-async def remover_evento_quero_ir(usuario_id: int, evento_id: int, db: Session = Depends(get_db)):
-    service.remover_evento_quero_ir(db, usuario_id, evento_id)
+async def remover_evento_quero_ir(usuario_id: int, evento_id: int, db: AsyncSession = Depends(get_async_db)):
+    await service.remover_evento_quero_ir(db, usuario_id, evento_id)
     return {"mensagem": "Evento removido da lista de 'Quero Ir' com sucesso"}
 
 @usuario_router.delete("/{usuario_id}/fui/{evento_id}", status_code=status.HTTP_200_OK, summary="Remover evento da lista de 'Fui'", tags=["Ações do Usuário"])
-async def remover_evento_fui(usuario_id: int, evento_id: int, db: Session = Depends(get_db)):
-    service.remover_evento_fui(db, usuario_id, evento_id)
+async def remover_evento_fui(usuario_id: int, evento_id: int, db: AsyncSession = Depends(get_async_db)):
+    await service.remover_evento_fui(db, usuario_id, evento_id)
     return {"mensagem": "Evento removido da lista de 'Fui' com sucesso"}
 
 @usuario_router.post("/{usuario_id}/avaliar-evento/{evento_id}", status_code=status.HTTP_201_CREATED, summary="Avaliar um evento", tags=["Ações do Usuário"])
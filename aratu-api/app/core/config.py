@@ -1,11 +1,110 @@
+from typing import List, Optional
+
 from pydantic import BaseSettings
 
 class Settings(BaseSettings):
     APP_NAME: str = "Aratu API"
     DEBUG_MODE: bool = True
-    DATABASE_URL: str 
+    DATABASE_URL: str
+    ASYNC_DATABASE_URL: Optional[str] = None  # se omitida, DATABASE_URL com o driver assíncrono
+
+    # Pool de conexões, por engine (síncrono e assíncrono) e por processo: o total de
+    # conexões de uma instância é até 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) por worker
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # segundos esperando uma conexão livre
+    DB_POOL_RECYCLE: int = 1800  # segundos até uma conexão ser reaberta
+    DB_POOL_PRE_PING: bool = True
+    DB_ECHO: bool = False  # loga cada SQL executado
+
+    # Contagem de consultas por requisição (headers X-Qtd-Consultas/X-Tempo-Consultas-Ms)
+    CONTAR_CONSULTAS: bool = True
+    N_MAIS_UM_LIMITE: int = 5  # repetições da mesma forma de statement que contam como N+1
+
+    # Log de consultas lentas, com o plano (EXPLAIN) de cada forma de statement lenta
+    LOG_CONSULTAS_LENTAS: bool = False
+    CONSULTA_LENTA_MS: float = 200.0
+    CONSULTA_LENTA_EXPLAIN: bool = True  # EXPLAIN (ANALYZE, BUFFERS) na primeira vez, só no Postgres
+    CONSULTAS_LENTAS_MAXIMO: int = 200  # consultas (e planos) guardados para o /interno
+
+    # Cache das respostas comuns a todos os usuários (ver app/services/cache.py)
+    CACHE_BACKEND: str = "memoria"  # "memoria", "redis" ou "desligado"
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"  # ou qualquer servidor compatível com o protocolo do Redis
+    CACHE_TTL_SEGUNDOS: int = 60
+    CACHE_MAXIMO_ENTRADAS: int = 1000  # só no backend "memoria"
+    CACHE_TTL_AMIGOS_SEGUNDOS: int = 30  # feeds por usuário (populares entre amigos)
+    GRAFO_AMIGOS_TTL_SEGUNDOS: int = 300  # grafo de amizades em memória (grafo_amigos)
+    GRAFO_AMIGOS_MAXIMO: int = 10000
+
+    # Recomendações pré-calculadas (recomendacao_services)
+    RECOMENDACOES_TOP_K: int = 50
+    RECOMENDACOES_PESO_CATEGORIAS: float = 1.0
+    RECOMENDACOES_PESO_AMIGOS: float = 0.8
+    RECOMENDACOES_PESO_POPULARIDADE: float = 0.4
+    RECOMENDACOES_PESO_PROXIMIDADE: float = 0.3
+    RECOMENDACOES_MEIA_VIDA_DIAS: float = 14.0
+    RECOMENDACOES_HORIZONTE_DIAS: int = 180
+    RECOMENDACOES_CONTEXTO_TTL_SEGUNDOS: int = 600
+    RECOMENDACOES_NOVA_TENTATIVA_SEGUNDOS: int = 300  # entre recálculos pedidos pelo feed de quem segue sem recomendações
+
+    # Eventos similares por co-ocorrência de quero ir/fui (coocorrencia_eventos)
+    SIMILARES_INTERVALO_RECONSTRUCAO_SEGUNDOS: int = 900
+    SIMILARES_MAXIMO_VIZINHOS: int = 50  # guardados por evento; o máximo do ?limite=
+    SIMILARES_MAXIMO_EVENTOS_USUARIO: int = 200  # usuários acima disso ficam fora dos pares
+
+    # /feed/home: cada carrossel que passar disso volta vazio, com status "tempo_esgotado"
+    FEED_HOME_TIMEOUT_SEGUNDOS: float = 2.0
+
+    # Índice TF-IDF do texto dos eventos (indice_textual). Com vários containers, o
+    # arquivo precisa estar num volume compartilhado
+    INDICE_TEXTUAL_ARQUIVO: str = "dados/indice_textual.npz"
+    INDICE_TEXTUAL_VERIFICACAO_SEGUNDOS: int = 30  # a cada quanto a API procura uma versão nova do arquivo
+    INDICE_TEXTUAL_DIAS_PASSADOS: int = 30  # eventos que terminaram há mais tempo saem do índice
+
+    # Réplicas de leitura para feed, busca e categorias; sem réplicas, tudo vai para o primário
+    DATABASE_REPLICA_URLS: List[str] = []  # no ambiente, uma lista JSON
+    REPLICA_INTERVALO_VERIFICACAO: float = 10.0  # segundos entre health checks
+    REPLICA_TIMEOUT_VERIFICACAO: float = 2.0
+    REPLICA_ATRASO_MAXIMO_SEGUNDOS: float = 30.0  # réplicas mais atrasadas que isso saem do rodízio
+
+    INTERNO_TOKEN: Optional[str] = None  # exigido no header X-Token-Interno pelas rotas /interno; sem ele, ficam fechadas
+
+    # Crawler do Sympla
+    SYMPLA_URL: str = "https://www.sympla.com.br/api/v1/search"
+    SYMPLA_MAX_CONEXOES: int = 16
+    SYMPLA_CONCORRENCIA_POR_PASSADA: int = 4
+    SYMPLA_TAXA_INICIAL: float = 5.0  # requisições por segundo
+    SYMPLA_TAXA_MINIMA: float = 0.2
+    SYMPLA_TAXA_MAXIMA: float = 20.0
+    SYMPLA_TENTATIVAS: int = 5
+    SYMPLA_TIMEOUT: float = 15.0  # segundos por requisição
+    SYMPLA_JANELA_DIAS: int = 7
+    SYMPLA_HORIZONTE_DIAS: int = 180
+    SYMPLA_RECONCILIACAO_HORAS: int = 168
+    SYMPLA_CASSETE: Optional[str] = None  # arquivo .json.gz para gravar/reproduzir as respostas
+    SYMPLA_CASSETE_MODO: str = "reproduzir"  # "gravar" ou "reproduzir"
+
+    # Ingestão de eventos
+    INGESTAO_TAMANHO_LOTE: int = 500
+    CARGA_MAX_PROCESSOS: int = 1
+    CARGA_NICE: int = 10
+    CARGA_TIMEOUT_HORAS: int = 6
+    # Carga incremental: percorre as janelas de datas cuja assinatura (total + primeira
+    # página) mudou. Edições em eventos fora da primeira página de uma janela não mudam a
+    # assinatura; por isso, a cada carga, até CARGA_JANELAS_VENCIDAS_POR_CARGA janelas lidas
+    # há mais de CARGA_JANELA_IDADE_MAXIMA_HORAS também são percorridas (as mais antigas
+    # primeiro), e a reconciliação completa (SYMPLA_RECONCILIACAO_HORAS) pega o resto
+    CARGA_JANELA_IDADE_MAXIMA_HORAS: int = 24
+    CARGA_JANELAS_VENCIDAS_POR_CARGA: int = 4
+
+    # Crawler distribuído (fila tarefas_crawl)
+    CRAWL_CIDADES: List[str] = ["Recife/PE"]  # "Cidade/UF"; no ambiente, uma lista JSON
+    CRAWL_VISIBILIDADE_SEGUNDOS: int = 300  # tempo até uma tarefa reivindicada voltar para a fila
+    CRAWL_MAX_TENTATIVAS: int = 5
+    CRAWL_CONCORRENCIA_WORKER: int = 4
+    CRAWL_ESPERA_FILA_VAZIA: float = 5.0  # segundos
 
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,9 +1,28 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.db.consultas_lentas import instrumentar_consultas_lentas
+from app.db.pool import AsyncQueuePoolInstrumentado, QueuePoolInstrumentado
 
-engine = create_engine(settings.DATABASE_URL, echo=True)
+def opcoes_engine(url, poolclass):
+    # O SQLite (testes e scripts locais) fica com o pool padrão do SQLAlchemy
+    opcoes = dict(echo=settings.DB_ECHO)
+    if make_url(url).get_backend_name() != "sqlite":
+        opcoes.update(
+            poolclass=poolclass,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    return opcoes
+
+# Engine síncrono: endpoints "def" (rodam no threadpool do FastAPI), cargas, workers e Alembic
+engine = create_engine(settings.DATABASE_URL, **opcoes_engine(settings.DATABASE_URL, QueuePoolInstrumentado))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -11,4 +30,40 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Drivers assíncronos para os bancos que usamos
+DRIVERS_ASYNC = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def url_async(database_url: str):
+    '''Converte a DATABASE_URL síncrona para o driver assíncrono equivalente.
+
+    O asyncpg não entende o parâmetro sslmode do libpq; ele vira o argumento ssl
+    da conexão, que aceita os mesmos valores.'''
+    url = make_url(database_url)
+    connect_args = {}
+    if url.drivername in DRIVERS_ASYNC:
+        url = url.set(drivername=DRIVERS_ASYNC[url.drivername])
+    if url.drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        connect_args["ssl"] = url.query["sslmode"]
+        url = url.difference_update_query(["sslmode"])
+    return url, connect_args
+
+# Engine assíncrono: endpoints "async def", para que as consultas não bloqueiem o event loop
+_url_async, _connect_args_async = url_async(settings.ASYNC_DATABASE_URL or settings.DATABASE_URL)
+async_engine = create_async_engine(_url_async, connect_args=_connect_args_async, **opcoes_engine(_url_async, AsyncQueuePoolInstrumentado))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Log de consultas lentas com captura de EXPLAIN, ligado por LOG_CONSULTAS_LENTAS
+if settings.LOG_CONSULTAS_LENTAS:
+    instrumentar_consultas_lentas(engine, settings.DATABASE_URL)
+    instrumentar_consultas_lentas(async_engine.sync_engine, settings.DATABASE_URL)
@@ -0,0 +1,139 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings
+from app.db.contador_consultas import normalizar_sql, rota_atual
+
+logger = logging.getLogger(__name__)
+
+# Log de consultas lentas (LOG_CONSULTAS_LENTAS): statements acima de
+# CONSULTA_LENTA_MS vão para o log e para um buffer circular, com o SQL normalizado,
+# os tipos dos parâmetros e a rota de origem. Na primeira vez que uma forma de
+# statement é lenta, o plano dela é capturado com EXPLAIN numa thread à parte, numa
+# conexão fora do pool da aplicação.
+
+EXPLAIN_TIMEOUT_MS = 30000
+_PARAMETRO_POSICIONAL = re.compile(r"\$(\d+)")
+
+def forma_parametros(parameters):
+    # Só os tipos (e o tamanho das listas); os valores podem ter dados pessoais
+    def forma(valor):
+        if isinstance(valor, (list, tuple)):
+            return f"{type(valor).__name__}[{len(valor)}]"
+        return type(valor).__name__
+
+    if isinstance(parameters, dict):
+        return {nome: forma(valor) for nome, valor in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [forma(valor) for valor in parameters]
+    return None
+
+def para_psycopg2(statement: str, parameters):
+    '''O EXPLAIN roda pelo psycopg2; statements do asyncpg ($1, $2, ...) são
+    convertidos para o formato posicional dele (%s).'''
+    if not isinstance(parameters, (list, tuple)) or not _PARAMETRO_POSICIONAL.search(statement):
+        return statement, parameters
+    valores = []
+
+    def trocar(match):
+        valores.append(parameters[int(match.group(1)) - 1])
+        return "%s"
+
+    return _PARAMETRO_POSICIONAL.sub(trocar, statement.replace("%", "%%")), tuple(valores)
+
+class RegistroConsultasLentas:
+    def __init__(self, maximo: int):
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        self._engines_explain = {}
+        self.maximo = maximo
+        self.zerar()
+
+    def zerar(self):
+        with self._lock:
+            self.consultas = deque(maxlen=self.maximo)
+            self.planos = OrderedDict()
+
+    def registrar(self, statement: str, parameters, segundos: float, url_explain: str):
+        forma = normalizar_sql(statement)
+        consulta = dict(
+            quando=datetime.now().isoformat(timespec="seconds"),
+            duracao_ms=round(1000 * segundos, 1),
+            sql=forma,
+            parametros=forma_parametros(parameters),
+            rota=rota_atual.get(),
+        )
+        logger.warning("Consulta lenta (%.1f ms) em %s: %s", consulta["duracao_ms"], consulta["rota"], forma, extra=consulta)
+
+        with self._lock:
+            self.consultas.append(consulta)
+            primeira_vez = forma not in self.planos
+            if primeira_vez:
+                self.planos[forma] = None
+                while len(self.planos) > self.maximo:
+                    self.planos.popitem(last=False)
+        if primeira_vez and settings.CONSULTA_LENTA_EXPLAIN and url_explain:
+            self._executor.submit(self.__explicar, forma, statement, parameters, url_explain)
+
+    def __explicar(self, forma: str, statement: str, parameters, url_explain: str):
+        # ANALYZE executa o statement: só para SELECT, e sempre numa transação desfeita
+        analisar = statement.lstrip().upper().startswith("SELECT") and "FOR UPDATE" not in statement.upper()
+        opcoes = "ANALYZE, BUFFERS, FORMAT JSON" if analisar else "FORMAT JSON"
+        statement, parameters = para_psycopg2(statement, parameters)
+        try:
+            with self.__engine_explain(url_explain).connect() as conexao:
+                with conexao.begin() as transacao:
+                    conexao.exec_driver_sql(f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}")
+                    plano = conexao.exec_driver_sql(f"EXPLAIN ({opcoes}) {statement}", parameters).scalar()
+                    transacao.rollback()
+            plano = json.loads(plano) if isinstance(plano, str) else plano
+        except Exception as erro:
+            logger.warning("EXPLAIN da consulta lenta falhou: %s", erro)
+            plano = dict(erro=f"{type(erro).__name__}: {erro}")
+        with self._lock:
+            if forma in self.planos:
+                self.planos[forma] = plano
+
+    def __engine_explain(self, url_explain: str):
+        with self._lock:
+            if url_explain not in self._engines_explain:
+                self._engines_explain[url_explain] = create_engine(url_explain, poolclass=NullPool)
+            return self._engines_explain[url_explain]
+
+    def resumo(self):
+        with self._lock:
+            return dict(
+                consultas=list(reversed(self.consultas)),
+                planos=[dict(sql=forma, plano=plano) for forma, plano in self.planos.items()],
+            )
+
+consultas_lentas = RegistroConsultasLentas(settings.CONSULTAS_LENTAS_MAXIMO)
+
+def instrumentar_consultas_lentas(engine, database_url: str):
+    '''Passa a medir os statements do engine (síncrono; de um AsyncEngine, o
+    sync_engine). database_url é a URL síncrona do mesmo banco, usada no EXPLAIN,
+    que só é capturado no Postgres.'''
+    url_explain = database_url if make_url(database_url).get_backend_name() == "postgresql" else None
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def antes_de_executar(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inicio_consultas_lentas", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def depois_de_executar(conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get("inicio_consultas_lentas")
+        if not inicios:
+            return
+        segundos = time.perf_counter() - inicios.pop()
+        if 1000 * segundos >= settings.CONSULTA_LENTA_MS and not executemany:
+            consultas_lentas.registrar(statement, parameters, segundos, url_explain)
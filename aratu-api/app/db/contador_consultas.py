@@ -0,0 +1,128 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Conta os statements SQL e o tempo gasto no banco por requisição. Os eventos são
+# registrados na classe Engine, então valem para todos os engines (síncrono,
+# assíncrono e réplicas); o contador da requisição corrente fica numa ContextVar,
+# que o FastAPI propaga para o threadpool das rotas "def" e o SQLAlchemy para o
+# greenlet das consultas assíncronas.
+
+_contador_atual: ContextVar = ContextVar("contador_consultas", default=None)
+# "MÉTODO /caminho" da requisição corrente, para os logs de consultas
+rota_atual: ContextVar = ContextVar("rota_atual", default=None)
+
+_ESPACOS = re.compile(r"\s+")
+_LITERAIS = re.compile(r"'(?:[^']|'')*'|(?<![\w$])\d+(?:\.\d+)?\b")
+_LISTA_PARAMETROS = re.compile(r"\((?:\s*(?:\?|\$\d+|%\(\w+\)s|:\w+|%s)\s*,)+\s*(?:\?|\$\d+|%\(\w+\)s|:\w+|%s)\s*\)")
+
+def normalizar_sql(statement: str) -> str:
+    '''Forma do statement: sem literais e com listas de parâmetros (IN (...))
+    colapsadas, para que execuções que só diferem nos valores contem juntas.'''
+    sql = _ESPACOS.sub(" ", statement).strip()
+    sql = _LITERAIS.sub("?", sql)
+    return _LISTA_PARAMETROS.sub("(...)", sql)
+
+class ContadorConsultas:
+    # Contadores aninhados (o de um teste em volta do middleware) repassam ao externo
+    def __init__(self, externo: "ContadorConsultas" = None):
+        self.externo = externo
+        self.quantidade = 0
+        self.tempo_total = 0.0
+        self.formas = Counter()
+
+    def registrar(self, statement: str, segundos: float):
+        self.quantidade += 1
+        self.tempo_total += segundos
+        self.formas[normalizar_sql(statement)] += 1
+        if self.externo:
+            self.externo.registrar(statement, segundos)
+
+    def n_mais_um(self, limite: int = None):
+        # Formas repetidas mais vezes que o limite: quase sempre lazy loading em laço
+        limite = settings.N_MAIS_UM_LIMITE if limite is None else limite
+        return {forma: vezes for forma, vezes in self.formas.most_common() if vezes > limite}
+
+@event.listens_for(Engine, "before_cursor_execute")
+def __antes_de_executar(conn, cursor, statement, parameters, context, executemany):
+    if _contador_atual.get() is not None:
+        conn.info.setdefault("inicio_consultas", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def __depois_de_executar(conn, cursor, statement, parameters, context, executemany):
+    contador = _contador_atual.get()
+    inicios = conn.info.get("inicio_consultas")
+    if contador is not None and inicios:
+        contador.registrar(statement, time.perf_counter() - inicios.pop())
+
+@contextmanager
+def contar_consultas():
+    '''Conta as consultas feitas dentro do bloco (e nas tarefas criadas nele).'''
+    contador = ContadorConsultas(_contador_atual.get())
+    token = _contador_atual.set(contador)
+    try:
+        yield contador
+    finally:
+        _contador_atual.reset(token)
+
+@contextmanager
+def orcamento_consultas(maximo: int, n_mais_um: int = None):
+    '''Falha com AssertionError se o bloco fizer mais que `maximo` consultas ou
+    repetir uma mesma forma de statement mais que `n_mais_um` vezes. Feito para os
+    testes: with orcamento_consultas(3): client.get("/eventos/1/expand")'''
+    with contar_consultas() as contador:
+        yield contador
+    repetidas = contador.n_mais_um(n_mais_um)
+    assert contador.quantidade <= maximo, f"{contador.quantidade} consultas, orçamento de {maximo}: {dict(contador.formas)}"
+    assert not repetidas, f"Consultas repetidas (N+1): {repetidas}"
+
+class MedidorConsultas:
+    '''Middleware ASGI: devolve a contagem e o tempo das consultas da requisição nos
+    headers X-Qtd-Consultas e X-Tempo-Consultas-Ms e loga as suspeitas de N+1.
+
+    Os headers entram no http.response.start, que o FastAPI só envia depois de a
+    rota (e as suas consultas) terminar.'''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rota_atual.set(f"{scope['method']} {scope['path']}")
+        if not settings.CONTAR_CONSULTAS:
+            return await self.app(scope, receive, send)
+
+        with contar_consultas() as contador:
+            async def enviar(mensagem):
+                if mensagem["type"] == "http.response.start":
+                    mensagem.setdefault("headers", [])
+                    mensagem["headers"] = list(mensagem["headers"]) + self.__headers(scope, contador)
+                await send(mensagem)
+
+            await self.app(scope, receive, enviar)
+
+    def __headers(self, scope, contador: ContadorConsultas):
+        headers = [
+            (b"x-qtd-consultas", str(contador.quantidade).encode()),
+            (b"x-tempo-consultas-ms", f"{1000 * contador.tempo_total:.1f}".encode()),
+        ]
+        repetidas = contador.n_mais_um()
+        if repetidas:
+            headers.append((b"x-n-mais-um", str(len(repetidas)).encode()))
+            logger.warning(
+                "Possível N+1 em %s %s: %s consultas, %.1f ms", scope["method"], scope["path"],
+                contador.quantidade, 1000 * contador.tempo_total,
+                extra=dict(rota=scope["path"], qtd_consultas=contador.quantidade, consultas_repetidas=repetidas),
+            )
+        return headers
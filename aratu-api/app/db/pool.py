@@ -0,0 +1,102 @@
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Limites (em segundos) das faixas do histograma de espera por uma conexão do pool
+FAIXAS_ESPERA = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+class MetricasPool:
+    '''Contadores de um pool de conexões: esperas no checkout (histograma),
+    timeouts, erros ao conectar e conexões invalidadas (por exemplo, pelo pre-ping).'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.zerar()
+
+    def zerar(self):
+        with self._lock:
+            self.checkouts = 0
+            self.espera_total = 0.0
+            self.espera_maxima = 0.0
+            self.histograma = [0] * (len(FAIXAS_ESPERA) + 1)
+            self.timeouts = 0
+            self.erros_conexao = 0
+            self.invalidadas = 0
+
+    def registrar_espera(self, segundos: float):
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total += segundos
+            self.espera_maxima = max(self.espera_maxima, segundos)
+            self.histograma[bisect_left(FAIXAS_ESPERA, segundos)] += 1
+
+    def registrar_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def registrar_erro_conexao(self):
+        with self._lock:
+            self.erros_conexao += 1
+
+    def registrar_invalidacao(self):
+        with self._lock:
+            self.invalidadas += 1
+
+    def resumo(self):
+        with self._lock:
+            faixas = [f"<={limite}s" for limite in FAIXAS_ESPERA] + [f">{FAIXAS_ESPERA[-1]}s"]
+            return dict(
+                checkouts=self.checkouts,
+                espera_media_ms=round(1000 * self.espera_total / self.checkouts, 3) if self.checkouts else 0.0,
+                espera_maxima_ms=round(1000 * self.espera_maxima, 3),
+                histograma_espera=dict(zip(faixas, self.histograma)),
+                timeouts=self.timeouts,
+                erros_conexao=self.erros_conexao,
+                invalidadas=self.invalidadas,
+            )
+
+class _PoolInstrumentado:
+    # Mede quanto tempo cada checkout espera por uma conexão livre (ou pela criação de uma nova)
+    metricas: MetricasPool = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        event.listen(self, "invalidate", self.__invalidada)
+
+    def __invalidada(self, dbapi_connection, connection_record, exception):
+        self.metricas.registrar_invalidacao()
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexao = super()._do_get()
+        except exc.TimeoutError:
+            self.metricas.registrar_timeout()
+            raise
+        except Exception:
+            # Falha ao abrir uma conexão nova (o erro do driver ainda não foi embrulhado)
+            self.metricas.registrar_erro_conexao()
+            raise
+        self.metricas.registrar_espera(time.perf_counter() - inicio)
+        return conexao
+
+    def estado(self):
+        return dict(
+            tamanho=self.size(),
+            em_uso=self.checkedout(),
+            livres=self.checkedin(),
+            overflow=max(self.overflow(), 0),
+            max_overflow=self._max_overflow,
+            **self.metricas.resumo(),
+        )
+
+# Uma instância de métricas por classe, compartilhada por recriações do pool
+# (o engine recria o pool em dispose())
+class QueuePoolInstrumentado(_PoolInstrumentado, QueuePool):
+    metricas = MetricasPool()
+
+class AsyncQueuePoolInstrumentado(_PoolInstrumentado, AsyncAdaptedQueuePool):
+    metricas = MetricasPool()
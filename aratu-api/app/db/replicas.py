@@ -0,0 +1,139 @@
+import asyncio
+import itertools
+import logging
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base import async_engine, opcoes_engine, url_async
+from app.db.consultas_lentas import instrumentar_consultas_lentas
+from app.db.pool import AsyncQueuePoolInstrumentado, MetricasPool
+
+logger = logging.getLogger(__name__)
+
+# Réplicas de leitura (DATABASE_REPLICA_URLS). As rotas de feed, busca e categorias
+# leem delas pela get_async_db_leitura; as demais continuam no primário.
+#
+# Para testar localmente, suba um segundo Postgres (por exemplo, com
+# docker run -p 5433:5432 -e POSTGRES_PASSWORD=... postgres) ou use a própria
+# DATABASE_URL como réplica: DATABASE_REPLICA_URLS='["postgresql://.../app_db"]'.
+
+# Atraso em segundos de uma réplica em streaming; nulo num Postgres que não é réplica.
+# Com o primário parado, a última transação aplicada envelhece sem que falte nada
+# a aplicar: se a réplica já aplicou todo o WAL recebido, o atraso é zero, e a
+# diferença de horário só conta enquanto o replay está atrás do recebimento
+ATRASO_REPLICACAO = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN NULL "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+# Bancos sem replicação (o SQLite dos scripts locais) só precisam responder
+ATRASO_SEM_REPLICACAO = text("SELECT NULL")
+
+class Replica:
+    def __init__(self, indice: int, database_url: str):
+        url, connect_args = url_async(database_url)
+        # Cada réplica tem as suas métricas de pool
+        poolclass = type(f"PoolReplica{indice}", (AsyncQueuePoolInstrumentado,), {"metricas": MetricasPool()})
+        self.nome = f"replica_{indice}"
+        self.host = url.host
+        self.engine = create_async_engine(url, connect_args=connect_args, **opcoes_engine(url, poolclass))
+        if settings.LOG_CONSULTAS_LENTAS:
+            instrumentar_consultas_lentas(self.engine.sync_engine, database_url)
+        self._consulta_atraso = ATRASO_REPLICACAO if url.get_backend_name() == "postgresql" else ATRASO_SEM_REPLICACAO
+        self.saudavel = False
+        self.atraso_segundos = None
+        self.ultimo_erro = None
+
+    async def verificar(self):
+        # Saudável se responde dentro do timeout e não está atrasada demais em relação ao primário
+        try:
+            async with self.engine.connect() as conexao:
+                atraso = await asyncio.wait_for(conexao.scalar(self._consulta_atraso), settings.REPLICA_TIMEOUT_VERIFICACAO)
+        except Exception as erro:
+            self.__marcar(False, None, f"{type(erro).__name__}: {erro}")
+            return
+
+        atraso = float(atraso) if atraso is not None else 0.0
+        if atraso > settings.REPLICA_ATRASO_MAXIMO_SEGUNDOS:
+            self.__marcar(False, atraso, f"Atraso de replicação de {atraso:.1f}s")
+        else:
+            self.__marcar(True, atraso, None)
+
+    def __marcar(self, saudavel: bool, atraso, erro):
+        if saudavel != self.saudavel:
+            logger.warning("Réplica %s (%s) %s", self.nome, self.host, "voltou" if saudavel else f"fora: {erro}")
+        self.saudavel, self.atraso_segundos, self.ultimo_erro = saudavel, atraso, erro
+
+    def estado(self):
+        return dict(host=self.host, saudavel=self.saudavel, atraso_segundos=self.atraso_segundos, ultimo_erro=self.ultimo_erro)
+
+class RoteadorReplicas:
+    '''Distribui as sessões de leitura entre as réplicas saudáveis, em rodízio.
+    Sem réplicas configuradas ou saudáveis, as leituras vão para o primário.'''
+
+    def __init__(self, urls):
+        self.replicas = [Replica(indice, url) for indice, url in enumerate(urls, start=1)]
+        self._rodizio = itertools.cycle(self.replicas)
+        self._monitor = None
+
+    def escolher(self):
+        for _ in range(len(self.replicas)):
+            replica = next(self._rodizio)
+            if replica.saudavel:
+                return replica
+        return None
+
+    async def verificar(self):
+        await asyncio.gather(*(replica.verificar() for replica in self.replicas))
+
+    async def __monitorar(self):
+        while True:
+            await asyncio.sleep(settings.REPLICA_INTERVALO_VERIFICACAO)
+            await self.verificar()
+
+    async def iniciar(self):
+        if not self.replicas:
+            return
+        await self.verificar()
+        self._monitor = asyncio.create_task(self.__monitorar())
+
+    async def encerrar(self):
+        if self._monitor:
+            self._monitor.cancel()
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+roteador_replicas = RoteadorReplicas(settings.DATABASE_REPLICA_URLS)
+
+class SessaoLeitura(Session):
+    '''Session que lê de uma réplica até a primeira escrita. Depois de um flush, ou
+    de um INSERT/UPDATE/DELETE explícito, tudo vai para o primário, para que a
+    requisição sempre leia o que ela mesma escreveu.'''
+
+    def __init__(self, replica: Replica = None, **kwargs):
+        super().__init__(**kwargs)
+        self.replica = replica
+        self.escreveu = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or (clause is not None and getattr(clause, "is_dml", False)):
+            self.escreveu = True
+        if self.escreveu or self.replica is None:
+            return async_engine.sync_engine
+        return self.replica.engine.sync_engine
+
+@asynccontextmanager
+async def sessao_leitura():
+    # Fora das dependências do FastAPI: uma sessão por tarefa concorrente (uma
+    # AsyncSession não pode ser usada por duas consultas ao mesmo tempo)
+    replica = roteador_replicas.escolher()
+    async with AsyncSession(sync_session_class=SessaoLeitura, replica=replica, autoflush=False, expire_on_commit=False) as db:
+        yield db
+
+async def get_async_db_leitura():
+    async with sessao_leitura() as db:
+        yield db
@@ -2,6 +2,11 @@ from fastapi import FastAPI
 from starlette.responses import RedirectResponse
 from app.api.v1.usuario_router import usuario_router
 from app.api.v1.evento_router import evento_router
+from app.api.v1.interno_router import interno_router
+from app.db.contador_consultas import MedidorConsultas
+from app.db.replicas import roteador_replicas
+from app.services.coocorrencia_eventos import coocorrencia_eventos
+from app.services import execucao_cargas
 
 tags_metadata = [
     {
@@ -36,5 +41,28 @@ tags_metadata = [
 
 app = FastAPI(title="Aratu API", version="0.1", openapi_tags=tags_metadata, description="API para o aplicativo Aratu", redoc_url=None, docs_url="/")
 
+app.add_middleware(MedidorConsultas)
+
 app.include_router(usuario_router, prefix="/usuarios")
-app.include_router(evento_router, prefix="/eventos")
\ No newline at end of file
+app.include_router(evento_router, prefix="/eventos")
+app.include_router(interno_router, prefix="/interno", include_in_schema=False)
+
+@app.on_event("startup")
+async def iniciar_replicas():
+    await roteador_replicas.iniciar()
+
+@app.on_event("startup")
+async def iniciar_coocorrencia_eventos():
+    coocorrencia_eventos.iniciar()
+
+@app.on_event("shutdown")
+def encerrar_execucao_cargas():
+    execucao_cargas.encerrar()
+
+@app.on_event("shutdown")
+async def encerrar_replicas():
+    await roteador_replicas.encerrar()
+
+@app.on_event("shutdown")
+def encerrar_coocorrencia_eventos():
+    coocorrencia_eventos.encerrar()
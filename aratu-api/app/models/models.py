@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Enum, ForeignKey, Text, Table
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Enum, ForeignKey, Text, Table, UniqueConstraint, Index, text
 from sqlalchemy.dialects.postgresql import ARRAY 
 from sqlalchemy.orm import declarative_base, relationship
 
@@ -7,22 +7,28 @@ Base = declarative_base()
 # Tabela de associação para a relação many-to-many de amigos
 amigos_association = Table('amigos', Base.metadata,
     Column('usuario_id', Integer, ForeignKey('usuarios.id'), primary_key=True),
-    Column('amigo_id', Integer, ForeignKey('usuarios.id'), primary_key=True)
+    Column('amigo_id', Integer, ForeignKey('usuarios.id'), primary_key=True),
+    Index('ix_amigos_amigo_id', 'amigo_id', 'usuario_id'),
 )
 
 # Tabela de associação para a relação many-to-many de eventos e usuarios (quero ir/fui)
 usuarios_eventos_querem_ir = Table('usuarios_eventos_querem_ir', Base.metadata,
     Column('usuario_id', ForeignKey('usuarios.id'), primary_key=True),
-    Column('evento_id', ForeignKey('eventos.id'), primary_key=True)
+    Column('evento_id', ForeignKey('eventos.id'), primary_key=True),
+    Index('ix_usuarios_eventos_querem_ir_evento_id', 'evento_id', 'usuario_id'),
 )
 
 usuarios_eventos_foram = Table('usuarios_eventos_foram', Base.metadata,
     Column('usuario_id', ForeignKey('usuarios.id'), primary_key=True),
-    Column('evento_id', ForeignKey('eventos.id'), primary_key=True)
+    Column('evento_id', ForeignKey('eventos.id'), primary_key=True),
+    Index('ix_usuarios_eventos_foram_evento_id', 'evento_id', 'usuario_id'),
 )
 
 class Usuario(Base):
     __tablename__ = "usuarios"
+    __table_args__ = (
+        Index('ix_usuarios_nome_trgm', 'nome', postgresql_using='gin', postgresql_ops={'nome': 'gin_trgm_ops'}),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String)
@@ -49,6 +55,13 @@ class Usuario(Base):
 
 class Evento(Base):
     __tablename__ = "eventos"
+    __table_args__ = (
+        UniqueConstraint('fonte', 'id_sistema_origem', name='uq_eventos_fonte_id_sistema_origem'),
+        Index('ix_eventos_categoria', 'categoria', postgresql_using='gin'),
+        Index('ix_eventos_nome_trgm', 'nome', postgresql_using='gin', postgresql_ops={'nome': 'gin_trgm_ops'}),
+        Index('ix_eventos_data_hora_id', 'data_hora', 'id'),
+        Index('ix_eventos_qtd_quero_ir_id', 'qtd_quero_ir', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String)
@@ -66,6 +79,10 @@ class Evento(Base):
     organizador = Column(String)
     gratis = Column(Boolean)
     atualizado_em = Column(DateTime)
+    hash_conteudo = Column(String(40))
+    # Cópias das contagens das associações, mantidas por usuario_services (ver contadores_eventos)
+    qtd_quero_ir = Column(Integer, nullable=False, default=0, server_default='0')
+    qtd_fui = Column(Integer, nullable=False, default=0, server_default='0')
     
     usuarios_que_querem_ir = relationship("Usuario", secondary=usuarios_eventos_querem_ir, back_populates="eventos_quero_ir")
     usuarios_que_foram = relationship("Usuario", secondary=usuarios_eventos_foram, back_populates="eventos_fui")
@@ -74,8 +91,42 @@ class Evento(Base):
     def __repr__(self):
         return f"<Evento(nome='{self.nome}', descricao='{self.descricao}', local='{self.local}', data_hora='{self.data_hora}', data_fim='{self.data_fim}', valor={self.valor}, onde_comprar_ingressos='{self.onde_comprar_ingressos}', id_sistema_origem={self.id_sistema_origem}, fonte='{self.fonte}', organizador='{self.organizador}', gratis={self.gratis})>"
     
+# Catálogo das categorias dos eventos, com as contagens de cada uma. Recalculado ao
+# fim das cargas e ajustado pelo CRUD de eventos (categorias_services), para que as
+# rotas de categorias não precisem percorrer a tabela de eventos.
+class Categoria(Base):
+    __tablename__ = "categorias"
+
+    nome = Column(String, primary_key=True)
+    qtd_eventos = Column(Integer, nullable=False, default=0)
+    qtd_futuros = Column(Integer, nullable=False, default=0)  # com data_hora a partir de agora
+    atualizado_em = Column(DateTime)
+
+    def __repr__(self):
+        return f"<Categoria(nome='{self.nome}', qtd_eventos={self.qtd_eventos}, qtd_futuros={self.qtd_futuros})>"
+
+class Recomendacao(Base):
+    # Top-K pré-calculado de cada usuário (recomendacao_services)
+    __tablename__ = "recomendacoes"
+    __table_args__ = (
+        Index('ix_recomendacoes_evento_id', 'evento_id'),
+    )
+
+    usuario_id = Column(Integer, ForeignKey('usuarios.id', ondelete='CASCADE'), primary_key=True)
+    posicao = Column(Integer, primary_key=True)
+    evento_id = Column(Integer, ForeignKey('eventos.id', ondelete='CASCADE'), nullable=False)
+    score = Column(Float, nullable=False)
+    calculado_em = Column(DateTime)
+
+    def __repr__(self):
+        return f"<Recomendacao(usuario_id={self.usuario_id}, posicao={self.posicao}, evento_id={self.evento_id}, score={self.score})>"
+
 class Avaliacao(Base):
     __tablename__ = "avaliacoes"
+    __table_args__ = (
+        Index('ix_avaliacoes_evento_id', 'evento_id'),
+        Index('ix_avaliacoes_usuario_id_evento_id', 'usuario_id', 'evento_id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     evento_id = Column(Integer, ForeignKey('eventos.id'), nullable=False)
@@ -89,6 +140,11 @@ class Avaliacao(Base):
     
 class ControleCarga(Base):
     __tablename__ = "controle_carga"
+    __table_args__ = (
+        Index('ix_controle_carga_fonte_status_inic_exec', 'fonte', 'status', 'inic_exec'),
+        # No máximo uma carga em andamento por fonte (carga_services.iniciar_carga)
+        Index('uq_controle_carga_fonte_em_progresso', 'fonte', unique=True, postgresql_where=text("status = 'EM_PROGRESSO'")),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     fonte = Column(String)
@@ -97,8 +153,60 @@ class ControleCarga(Base):
     dt_inic = Column(DateTime)
     dt_fim = Column(DateTime)
     qtd_src_total = Column(Integer, default=0)
+    qtd_paginas = Column(Integer, default=0)
     qtd_sucesso = Column(Integer, default=0)
+    qtd_inseridos = Column(Integer, default=0)
+    qtd_atualizados = Column(Integer, default=0)
+    qtd_inalterados = Column(Integer, default=0)
     status = Column(Enum('ERRO', 'EM_PROGRESSO', 'SUCESSO', name="tipo_categoria"))
+    tipo = Column(Enum('COMPLETA', 'INCREMENTAL', name="tipo_carga"), default='COMPLETA')
+
+    def __repr__(self):
+        return f"<ControleCarga(id={self.id}, fonte='{self.fonte}', inic_exec='{self.inic_exec}', fim_exec='{self.fim_exec}', qtd_src_total={self.qtd_src_total}, qtd_paginas={self.qtd_paginas}, qtd_sucesso={self.qtd_sucesso}, qtd_inseridos={self.qtd_inseridos}, qtd_atualizados={self.qtd_atualizados}, qtd_inalterados={self.qtd_inalterados}, status='{self.status}', tipo='{self.tipo}')>"
+
+# Total informado pela fonte para cada janela de datas na última vez em que ela foi
+# carregada. As cargas incrementais só buscam as janelas cujo total mudou.
+class JanelaCarga(Base):
+    __tablename__ = "janelas_carga"
+    __table_args__ = (
+        UniqueConstraint('fonte', 'dt_inic', 'dt_fim', name='uq_janelas_carga_fonte_dt_inic_dt_fim'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    fonte = Column(String, nullable=False)
+    dt_inic = Column(DateTime, nullable=False)
+    dt_fim = Column(DateTime, nullable=False)
+    qtd_src_total = Column(Integer, default=0)
+    assinatura = Column(String)
+    controle_carga_id = Column(Integer, ForeignKey('controle_carga.id'))
+    atualizado_em = Column(DateTime)
+
+    def __repr__(self):
+        return f"<JanelaCarga(fonte='{self.fonte}', dt_inic='{self.dt_inic}', dt_fim='{self.dt_fim}', qtd_src_total={self.qtd_src_total}, controle_carga_id={self.controle_carga_id})>"
+
+# Fila de trabalho do crawler distribuído: cada tarefa é uma página de uma passada
+# (todos, gratuitos ou uma categoria) de uma cidade numa fonte. Os workers pegam
+# tarefas com SELECT ... FOR UPDATE SKIP LOCKED; uma tarefa reivindicada fica
+# invisível até visivel_em e volta para a fila se o worker morrer antes de concluí-la.
+class TarefaCrawl(Base):
+    __tablename__ = "tarefas_crawl"
+    __table_args__ = (
+        UniqueConstraint('controle_carga_id', 'fonte', 'cidade', 'estado', 'passada', 'pagina', name='uq_tarefas_crawl_pagina'),
+        Index('ix_tarefas_crawl_status_visivel_em', 'status', 'visivel_em'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    controle_carga_id = Column(Integer, ForeignKey('controle_carga.id'), nullable=False)
+    fonte = Column(String, nullable=False)
+    cidade = Column(String, nullable=False)
+    estado = Column(String, nullable=False)
+    passada = Column(String, nullable=False)
+    pagina = Column(Integer, nullable=False, default=1)
+    status = Column(Enum('PENDENTE', 'EM_EXECUCAO', 'CONCLUIDA', 'ERRO', name="status_tarefa_crawl"), nullable=False, default='PENDENTE')
+    tentativas = Column(Integer, nullable=False, default=0)
+    visivel_em = Column(DateTime, nullable=False)
+    erro = Column(Text)
+    atualizado_em = Column(DateTime)
 
     def __repr__(self):
-        return f"<ControleCarga(id={self.id}, fonte='{self.fonte}', inic_exec='{self.inic_exec}', fim_exec='{self.fim_exec}', qtd_src_total={self.qtd_src_total}, qtd_sucesso={self.qtd_sucesso}, status='{self.status}')>"
+        return f"<TarefaCrawl(id={self.id}, fonte='{self.fonte}', cidade='{self.cidade}/{self.estado}', passada='{self.passada}', pagina={self.pagina}, status='{self.status}', tentativas={self.tentativas})>"
@@ -1,7 +1,7 @@
 from enum import Enum
 from fastapi.params import Query
 from pydantic import BaseModel, EmailStr, Field, HttpUrl, validator
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 class Evento(BaseModel):
@@ -50,11 +50,38 @@ class AvaliacaoEvento(BaseModel):
         return v
     
 class EventoResponse(Evento):
-    pass
+    qtd_quero_ir: Optional[int] = 0
+    qtd_fui: Optional[int] = 0
 
 class EventoList(BaseModel):
-    pages: int  
+    pages: Optional[int] = Field(None, description="Total de páginas; nulo com contagem=nenhuma")
+    total: Optional[int] = Field(None, description="Total de eventos (estimado com contagem=aproximada)")
     eventos: list[EventoResponse]
+    next_cursor: Optional[str] = Field(None, description="Cursor da página seguinte; nulo na última página")
+
+class StatusCarrossel(str, Enum):
+    OK = 'ok'
+    VAZIO = 'vazio'
+    TEMPO_ESGOTADO = 'tempo_esgotado'
+    ERRO = 'erro'
+
+class CarrosselHome(BaseModel):
+    status: StatusCarrossel
+    eventos_ids: List[int] = Field([], description="Ids dos eventos do carrossel, na ordem; os dados ficam em FeedHome.eventos")
+
+class FeedHome(BaseModel):
+    eventos: List[EventoResponse] = Field(..., description="Eventos de todos os carrosséis, cada um uma única vez")
+    carrosseis: Dict[str, CarrosselHome]
+
+class EventoSimilar(BaseModel):
+    evento_id: int
+    similaridade: float = Field(..., description="Cosseno entre os eventos (0 a 1): pelos usuários que marcaram cada um, ou pelo texto")
+    usuarios_em_comum: Optional[int] = Field(None, description="Usuários que marcaram os dois eventos; nulo na similaridade por conteúdo")
+
+class ContagemFeed(str, Enum):
+    EXATA = 'exata'
+    APROXIMADA = 'aproximada'
+    NENHUMA = 'nenhuma'
 
 class UsuarioBase(BaseModel):
     nome: str
@@ -157,6 +184,10 @@ class ControleCargaStatus(str, Enum):
     EM_PROGRESSO = 'EM_PROGRESSO'
     SUCESSO = 'SUCESSO'
 
+class TipoCarga(str, Enum):
+    COMPLETA = 'COMPLETA'
+    INCREMENTAL = 'INCREMENTAL'
+
 class ControleCarga(BaseModel):
     id: Optional[int] = Field(None, description="ID do controle de carga, gerado automaticamente")
     fonte: str
@@ -165,5 +196,29 @@ class ControleCarga(BaseModel):
     dt_inic: datetime
     dt_fim: datetime
     qtd_src_total: int
+    qtd_paginas: int = 0
     qtd_sucesso: int
+    qtd_inseridos: int = 0
+    qtd_atualizados: int = 0
+    qtd_inalterados: int = 0
+    status: ControleCargaStatus
+    tipo: TipoCarga = TipoCarga.COMPLETA
+
+class ProgressoCarga(BaseModel):
+    id: int
+    fonte: str
+    tipo: Optional[TipoCarga] = None
     status: ControleCargaStatus
+    inic_exec: datetime
+    fim_exec: Optional[datetime] = None
+    dt_inic: Optional[datetime] = None
+    dt_fim: Optional[datetime] = None
+    qtd_src_total: Optional[int] = Field(None, description="Total de eventos informado pela fonte")
+    qtd_paginas: Optional[int] = Field(0, description="Páginas buscadas na fonte até agora")
+    qtd_sucesso: Optional[int] = Field(0, description="Eventos gravados até agora")
+    qtd_inseridos: Optional[int] = 0
+    qtd_atualizados: Optional[int] = 0
+    qtd_inalterados: Optional[int] = Field(0, description="Eventos ignorados por não terem mudado desde a última carga")
+    decorrido_segundos: float
+    eventos_por_segundo: float
+    eta_segundos: Optional[float] = Field(None, description="Estimativa de segundos até o fim da carga")
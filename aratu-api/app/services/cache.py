@@ -0,0 +1,250 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Cache das respostas que são iguais para todos os usuários (feed de populares,
+# categorias, eventos por categoria). Cada entrada pertence a grupos (GRUPO_EVENTOS,
+# GRUPO_PARTICIPACAO); invalidar um grupo incrementa a sua geração, que faz parte da
+# chave, e as entradas antigas deixam de ser encontradas.
+#
+# CACHE_BACKEND escolhe onde as entradas ficam:
+#   "memoria": LRU com TTL no processo. A invalidação só alcança o próprio processo;
+#              nos demais (outros workers do gunicorn, cargas, workers do crawler) a
+#              entrada vale até o TTL.
+#   "redis":   qualquer servidor que fale o protocolo do Redis (CACHE_REDIS_URL),
+#              compartilhado entre os processos. Com CACHE_REDIS_URL=fakeredis://, um
+#              Redis falso dentro do processo (pacote fakeredis, em requirements-dev.txt),
+#              para rodar o backend redis localmente e nos testes sem um servidor.
+#   "desligado"
+#
+# A leitura é assíncrona. A invalidação tem duas formas: invalidar_async, para as rotas
+# e os serviços assíncronos, e invalidar, para as cargas, os workers e as rotas "def",
+# que não estão no event loop. Nas duas, todos os grupos vão num único pipeline de INCRs.
+
+GRUPO_EVENTOS = "eventos"  # conteúdo dos eventos: criação, edição, exclusão e cargas
+GRUPO_PARTICIPACAO = "participacao"  # quero ir / fui
+
+def grupo_amigos(usuario_id: int):
+    # Respostas que dependem dos amigos de um usuário (e do que eles marcaram)
+    return f"amigos:{usuario_id}"
+
+class CacheMemoria:
+    def __init__(self, maximo: int):
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # chave -> (expira_em, valor)
+        self._geracoes = Counter()
+        self.maximo = maximo
+
+    async def obter(self, chave: str):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            expira_em, valor = entrada
+            if expira_em < time.monotonic():
+                del self._entradas[chave]
+                return None
+            self._entradas.move_to_end(chave)
+            return valor
+
+    async def guardar(self, chave: str, valor, ttl: int):
+        with self._lock:
+            self._entradas[chave] = (time.monotonic() + ttl, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+
+    def remover(self, chave: str):
+        with self._lock:
+            self._entradas.pop(chave, None)
+
+    async def geracoes(self, grupos):
+        with self._lock:
+            return [self._geracoes[grupo] for grupo in grupos]
+
+    def invalidar(self, grupos):
+        with self._lock:
+            for grupo in grupos:
+                self._geracoes[grupo] += 1
+            # As entradas das gerações antigas não seriam mais lidas; saem já
+            marcadores = [f"|{grupo}=" for grupo in grupos]
+            for chave in [chave for chave in self._entradas if any(marcador in chave for marcador in marcadores)]:
+                del self._entradas[chave]
+
+    async def invalidar_async(self, grupos):
+        # Nada de E/S: o mesmo da versão síncrona
+        self.invalidar(grupos)
+
+    def tamanho(self):
+        return len(self._entradas)
+
+class CacheRedis:
+    PREFIXO = "aratu:cache:"
+
+    def __init__(self, url: str):
+        if url.startswith("fakeredis://"):
+            self._cliente, self._cliente_sync = self.__clientes_falsos()
+            return
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis precisa do pacote redis (pip install redis)")
+        self._cliente = redis.asyncio.Redis.from_url(url)
+        self._cliente_sync = redis.Redis.from_url(url)
+
+    @staticmethod
+    def __clientes_falsos():
+        try:
+            import fakeredis
+            import fakeredis.aioredis
+        except ImportError:
+            raise RuntimeError("CACHE_REDIS_URL=fakeredis:// precisa do pacote fakeredis (pip install -r requirements-dev.txt)")
+        # Os dois clientes enxergam os mesmos dados
+        servidor = fakeredis.FakeServer()
+        return fakeredis.aioredis.FakeRedis(server=servidor), fakeredis.FakeRedis(server=servidor)
+
+    async def obter(self, chave: str):
+        valor = await self._cliente.get(self.PREFIXO + chave)
+        return json.loads(valor) if valor is not None else None
+
+    async def guardar(self, chave: str, valor, ttl: int):
+        await self._cliente.set(self.PREFIXO + chave, json.dumps(valor), ex=ttl)
+
+    async def geracoes(self, grupos):
+        valores = await self._cliente.mget([f"{self.PREFIXO}geracao:{grupo}" for grupo in grupos])
+        return [int(valor or 0) for valor in valores]
+
+    def invalidar(self, grupos):
+        # As entradas antigas expiram sozinhas pelo TTL
+        pipeline = self._cliente_sync.pipeline(transaction=False)
+        for grupo in grupos:
+            pipeline.incr(f"{self.PREFIXO}geracao:{grupo}")
+        pipeline.execute()
+
+    async def invalidar_async(self, grupos):
+        pipeline = self._cliente.pipeline(transaction=False)
+        for grupo in grupos:
+            pipeline.incr(f"{self.PREFIXO}geracao:{grupo}")
+        await pipeline.execute()
+
+    def tamanho(self):
+        return None
+
+class CacheRespostas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.backend = None
+        self.zerar_metricas()
+
+    def configurar(self, backend):
+        self.backend = backend
+
+    def zerar_metricas(self):
+        with self._lock:
+            self.acertos = Counter()
+            self.faltas = Counter()
+            self.erros = Counter()
+            self.invalidacoes = Counter()
+
+    async def obter_ou_calcular(self, nome: str, parametros: tuple, grupos: tuple, calcular, ttl: int = None):
+        '''Devolve a resposta em cache de nome(parametros) ou a calcula com
+        `await calcular()` e a guarda. O valor guardado é o JSON da resposta (dicts
+        e listas), que é o que a rota devolve nos dois casos.'''
+        if self.backend is None:
+            return jsonable_encoder(await calcular())
+
+        try:
+            geracoes = await self.backend.geracoes(grupos)
+            chave = nome + ":" + json.dumps(parametros) + "".join(f"|{grupo}={geracao}" for grupo, geracao in zip(grupos, geracoes))
+            valor = await self.backend.obter(chave)
+        except Exception as erro:
+            # Cache fora do ar não derruba a rota
+            logger.warning("Cache indisponível (%s): %s", nome, erro)
+            self.__contar(self.erros, nome)
+            return jsonable_encoder(await calcular())
+
+        if valor is not None:
+            self.__contar(self.acertos, nome)
+            return valor
+
+        self.__contar(self.faltas, nome)
+        valor = jsonable_encoder(await calcular())
+        try:
+            await self.backend.guardar(chave, valor, ttl or settings.CACHE_TTL_SEGUNDOS)
+        except Exception as erro:
+            logger.warning("Cache indisponível (%s): %s", nome, erro)
+            self.__contar(self.erros, nome)
+        return valor
+
+    def invalidar(self, *grupos: str):
+        if self.backend is None or not grupos:
+            return
+        try:
+            self.backend.invalidar(grupos)
+        except Exception as erro:
+            self.__falha_ao_invalidar(grupos, erro)
+            return
+        self.__contar_invalidacoes(grupos)
+
+    async def invalidar_async(self, *grupos: str):
+        if self.backend is None or not grupos:
+            return
+        try:
+            await self.backend.invalidar_async(grupos)
+        except Exception as erro:
+            self.__falha_ao_invalidar(grupos, erro)
+            return
+        self.__contar_invalidacoes(grupos)
+
+    def __falha_ao_invalidar(self, grupos, erro):
+        logger.warning("Falha ao invalidar o cache (%s): %s", ", ".join(grupos), erro)
+        for grupo in grupos:
+            self.__contar(self.erros, grupo)
+
+    def __contar_invalidacoes(self, grupos):
+        # Grupos por usuário ("amigos:42") contam juntos
+        for grupo in grupos:
+            self.__contar(self.invalidacoes, grupo.split(":", 1)[0])
+
+    def __contar(self, contador: Counter, nome: str):
+        with self._lock:
+            contador[nome] += 1
+
+    def metricas(self):
+        with self._lock:
+            nomes = sorted(set(self.acertos) | set(self.faltas))
+            return dict(
+                backend=settings.CACHE_BACKEND,
+                entradas=self.backend.tamanho() if self.backend else None,
+                rotas={
+                    nome: dict(
+                        acertos=self.acertos[nome],
+                        faltas=self.faltas[nome],
+                        taxa_acerto=round(self.acertos[nome] / (self.acertos[nome] + self.faltas[nome]), 3),
+                    )
+                    for nome in nomes
+                },
+                erros=dict(self.erros),
+                invalidacoes=dict(self.invalidacoes),
+            )
+
+def novo_backend():
+    if settings.CACHE_BACKEND == "memoria":
+        return CacheMemoria(settings.CACHE_MAXIMO_ENTRADAS)
+    if settings.CACHE_BACKEND == "redis":
+        return CacheRedis(settings.CACHE_REDIS_URL)
+    if settings.CACHE_BACKEND == "desligado":
+        return None
+    raise ValueError(f"CACHE_BACKEND desconhecido: {settings.CACHE_BACKEND}")
+
+cache_respostas = CacheRespostas()
+cache_respostas.configurar(novo_backend())
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.models.models import ControleCarga, JanelaCarga
+from app.services import categorias_services, evento_services, indice_textual, recomendacao_services
+from app.services.cache import GRUPO_EVENTOS, cache_respostas
+from app.services.fontes_eventos import FonteEventos, obter_fonte
+
+logger = logging.getLogger(__name__)
+
+def ultima_carga(session, fonte: str, tipo: str = None):
+    # Última carga bem-sucedida da fonte (opcionalmente de um tipo específico)
+    query = session.query(ControleCarga).filter(ControleCarga.fonte == fonte, ControleCarga.status == "SUCESSO")
+    if tipo:
+        query = query.filter(ControleCarga.tipo == tipo)
+    return query.order_by(ControleCarga.inic_exec.desc()).first()
+
+def decidir_tipo_carga(session, fonte: str):
+    '''Incremental, a não ser que a última carga completa com sucesso seja mais
+    antiga que o reconciliacao_horas da fonte (ou não exista): aí é hora de reconciliar.'''
+    completa = ultima_carga(session, fonte, "COMPLETA")
+    if not completa or completa.inic_exec < datetime.now() - timedelta(hours=obter_fonte(fonte).reconciliacao_horas):
+        return "COMPLETA"
+    return "INCREMENTAL"
+
+def janelas_de_datas(fonte: FonteEventos, hoje: date = None):
+    # Janelas de fonte.janela_dias dias, alinhadas num calendário fixo (segundas-feiras,
+    # para janelas de 7 dias) para que sejam as mesmas de uma execução para outra
+    hoje = hoje or date.today()
+    tamanho = fonte.janela_dias
+    inicio = date.fromordinal(hoje.toordinal() - (hoje.toordinal() - 1) % tamanho)
+    horizonte = hoje + timedelta(days=fonte.horizonte_dias)
+
+    janelas = []
+    while inicio <= horizonte:
+        janelas.append((inicio, inicio + timedelta(days=tamanho - 1)))
+        inicio += timedelta(days=tamanho)
+    return janelas
+
+def janelas_anteriores(session, fonte: str):
+    # (assinatura, atualizado_em) de cada janela, como registrados pela última carga que a percorreu
+    janelas = session.query(JanelaCarga).filter(JanelaCarga.fonte == fonte).all()
+    return {(janela.dt_inic.date(), janela.dt_fim.date()): (janela.assinatura, janela.atualizado_em) for janela in janelas}
+
+def janelas_alteradas(assinaturas: dict, anteriores: dict, agora: datetime = None):
+    '''Janelas que a carga incremental percorre: as novas e as de assinatura diferente
+    da registrada, mais as CARGA_JANELAS_VENCIDAS_POR_CARGA lidas há mais tempo, entre
+    as lidas há mais de CARGA_JANELA_IDADE_MAXIMA_HORAS.
+
+    A assinatura (FonteEventos.assinar_janela) pode não ver edições em eventos que não
+    estão na primeira página da janela; o rodízio das janelas vencidas limita por quanto
+    tempo uma edição dessas fica de fora, e a reconciliação completa pega o resto.'''
+    agora = agora or datetime.now()
+    alteradas = {
+        janela for janela, (_, assinatura) in assinaturas.items()
+        if janela not in anteriores or anteriores[janela][0] != assinatura
+    }
+    limite = agora - timedelta(hours=settings.CARGA_JANELA_IDADE_MAXIMA_HORAS)
+    vencidas = sorted(
+        (anteriores[janela][1] or datetime.min, janela) for janela in assinaturas
+        if janela not in alteradas and (anteriores[janela][1] or datetime.min) < limite
+    )
+    alteradas.update(janela for _, janela in vencidas[:settings.CARGA_JANELAS_VENCIDAS_POR_CARGA])
+    return sorted(alteradas)
+
+def registrar_janelas(session, fonte: str, controle_carga_id: int, assinaturas: dict):
+    if not assinaturas:
+        return
+    agora = datetime.now()
+    stmt = insert(JanelaCarga.__table__).values([
+        dict(fonte=fonte, dt_inic=inicio, dt_fim=fim, qtd_src_total=total, assinatura=assinatura, controle_carga_id=controle_carga_id, atualizado_em=agora)
+        for (inicio, fim), (total, assinatura) in assinaturas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["fonte", "dt_inic", "dt_fim"],
+        set_={coluna: stmt.excluded[coluna] for coluna in ("qtd_src_total", "assinatura", "controle_carga_id", "atualizado_em")},
+    )
+    session.execute(stmt)
+    session.commit()
+
+def __encerrar_cargas_abandonadas(session, fonte: str):
+    # Cargas EM_PROGRESSO mais antigas que CARGA_TIMEOUT_HORAS são de execuções que morreram
+    limite = datetime.now() - timedelta(hours=settings.CARGA_TIMEOUT_HORAS)
+    session.execute(
+        update(ControleCarga)
+        .where(ControleCarga.fonte == fonte, ControleCarga.status == "EM_PROGRESSO", ControleCarga.inic_exec <= limite)
+        .values(status="ERRO", fim_exec=datetime.now())
+    )
+
+def iniciar_carga(session, fonte: str, tipo: str = None):
+    '''Cria o ControleCarga EM_PROGRESSO de uma carga da fonte, ou devolve None se
+    a fonte já tem uma carga em andamento. O índice único parcial
+    uq_controle_carga_fonte_em_progresso garante uma só por fonte, mesmo com dois
+    pedidos ao mesmo tempo.'''
+    __encerrar_cargas_abandonadas(session, fonte)
+    stmt = insert(ControleCarga).values(
+        fonte = fonte,
+        tipo = tipo or decidir_tipo_carga(session, fonte),
+        inic_exec = datetime.now(),
+        fim_exec = None,
+        qtd_src_total = None,
+        qtd_paginas = 0,
+        qtd_sucesso = 0,
+        status = "EM_PROGRESSO",
+    ).on_conflict_do_nothing(
+        index_elements=[ControleCarga.fonte],
+        index_where=ControleCarga.status == "EM_PROGRESSO",
+    ).returning(ControleCarga)
+
+    controle_carga = session.scalars(stmt).one_or_none()
+    session.commit()
+    return controle_carga
+
+def progresso_carga(controle_carga: ControleCarga):
+    '''Vazão (eventos gravados por segundo) e estimativa de término de uma carga.'''
+    fim = controle_carga.fim_exec or datetime.now()
+    decorrido = max((fim - controle_carga.inic_exec).total_seconds(), 0.001)
+    gravados = controle_carga.qtd_sucesso or 0
+    eventos_por_segundo = gravados / decorrido
+
+    eta_segundos = None
+    if controle_carga.status == "EM_PROGRESSO" and controle_carga.qtd_src_total and eventos_por_segundo:
+        eta_segundos = max(controle_carga.qtd_src_total - gravados, 0) / eventos_por_segundo
+    elif controle_carga.status != "EM_PROGRESSO":
+        eta_segundos = 0
+
+    return dict(
+        decorrido_segundos=round(decorrido, 1),
+        eventos_por_segundo=round(eventos_por_segundo, 2),
+        eta_segundos=round(eta_segundos, 1) if eta_segundos is not None else None,
+    )
+
+async def executar_carga(session, controle_carga: ControleCarga):
+    '''Carrega os eventos da fonte de controle_carga e registra o andamento nele.
+
+    A carga COMPLETA percorre todo o catálogo. A INCREMENTAL assina cada janela
+    de datas (uma requisição por janela) e só percorre as que janelas_alteradas
+    escolher. O progresso (páginas buscadas e eventos gravados) é salvo a cada lote.
+
+    Várias cargas rodam no mesmo event loop (execucao_cargas), então todo acesso
+    à Session síncrona vai para uma thread (asyncio.to_thread): a gravação de um
+    lote de uma fonte não para as requisições HTTP das outras.'''
+    fonte = obter_fonte(controle_carga.fonte)
+    tipo = controle_carga.tipo
+    controle_carga_id = controle_carga.id
+
+    try:
+        async with fonte.novo_cliente() as client:
+            janelas = janelas_de_datas(fonte)
+            assinaturas = await asyncio.gather(*(fonte.assinar_janela(client, inicio, fim) for inicio, fim in janelas))
+            assinaturas = dict(zip(janelas, assinaturas))
+
+            if tipo == "COMPLETA":
+                # Total que vai ser carregado
+                alvos = [(None, None)]
+                count_total = await fonte.contar(client)
+            else:
+                anteriores = await asyncio.to_thread(janelas_anteriores, session, fonte.nome)
+                alvos = janelas_alteradas(assinaturas, anteriores)
+                count_total = sum(assinaturas[janela][0] for janela in alvos)
+
+            controle_carga.dt_inic = alvos[0][0] if alvos else None
+            controle_carga.dt_fim = alvos[-1][1] if alvos else None
+            controle_carga.qtd_src_total = count_total
+            await asyncio.to_thread(session.commit)
+
+            # Carregar eventos em lotes, à medida que as páginas chegam
+            resumo = Counter()
+            progresso = Counter()
+            for inicio, fim in alvos:
+                async for lote in fonte.aiter_lotes(client, inicio, fim, progresso):
+                    await asyncio.to_thread(__gravar_lote, session, fonte, controle_carga, lote, resumo, progresso["paginas"])
+            logger.info("Eventos carregados de %s (%s): %s; janelas: %s", fonte.nome, tipo, dict(resumo), len(alvos))
+
+        if tipo == "INCREMENTAL":
+            assinaturas = {janela: assinaturas[janela] for janela in alvos}
+        await asyncio.to_thread(__concluir_carga, session, fonte, controle_carga, assinaturas, resumo, progresso["paginas"])
+
+    except Exception:
+        await asyncio.to_thread(__registrar_erro, session, controle_carga)
+        raise
+
+    finally:
+        # Mesmo uma carga que falhou pode ter gravado lotes
+        await asyncio.to_thread(pos_carga, session, controle_carga_id, tipo == "COMPLETA")
+
+    return controle_carga
+
+def __gravar_lote(session, fonte: FonteEventos, controle_carga: ControleCarga, lote, resumo: Counter, paginas: int):
+    linhas = [fonte.normalizar(evento_api) for evento_api in lote]
+    resumo.update(evento_services.salvar_lote_eventos(session, linhas, fonte.nome))
+    __registrar_resumo(controle_carga, resumo)
+    controle_carga.qtd_paginas = paginas
+    session.commit()
+
+def __concluir_carga(session, fonte: FonteEventos, controle_carga: ControleCarga, assinaturas: dict, resumo: Counter, paginas: int):
+    registrar_janelas(session, fonte.nome, controle_carga.id, assinaturas)
+
+    __registrar_resumo(controle_carga, resumo)
+    controle_carga.qtd_paginas = paginas
+    controle_carga.status = "SUCESSO"
+    controle_carga.fim_exec = datetime.now()
+    session.add(controle_carga)
+    session.commit()
+
+def __registrar_erro(session, controle_carga: ControleCarga):
+    session.rollback()
+    controle_carga.status = "ERRO"
+    controle_carga.fim_exec = datetime.now()
+    session.add(controle_carga)
+    session.commit()
+
+def pos_carga(session, controle_carga_id: int, completo: bool = False):
+    '''O que depende dos eventos gravados por uma carga. Cada etapa roda mesmo que a
+    anterior falhe, e a falha só vai para o log: não pode esconder o erro da carga.'''
+    etapas = [
+        ("catálogo de categorias", lambda: categorias_services.atualizar_categorias(session)),
+        ("invalidação do cache", lambda: cache_respostas.invalidar(GRUPO_EVENTOS)),
+        # Novos eventos e novas popularidades: recalcula as recomendações de todos, fora da carga
+        ("recálculo das recomendações", recomendacao_services.agendar_recalculo_completo),
+        # Só os eventos alterados entram no índice textual; a carga completa o reconstrói
+        ("índice textual", lambda: indice_textual.atualizar_apos_carga(session, controle_carga_id, completo=completo)),
+    ]
+    for nome, etapa in etapas:
+        try:
+            etapa()
+        except Exception:
+            session.rollback()
+            logger.exception("Falha no pós-carga da carga %s: %s", controle_carga_id, nome)
+
+def __registrar_resumo(controle_carga: ControleCarga, resumo: Counter):
+    controle_carga.qtd_sucesso = sum(resumo.values())
+    controle_carga.qtd_inseridos = resumo["inseridos"]
+    controle_carga.qtd_atualizados = resumo["atualizados"]
+    controle_carga.qtd_inalterados = resumo["inalterados"]
@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import httpx
+
+from app.services.cliente_http import STATUS_REPETIVEIS
+
+logger = logging.getLogger(__name__)
+
+GRAVAR = "gravar"
+REPRODUZIR = "reproduzir"
+
+class RequisicaoForaDoCassete(Exception):
+    pass
+
+def chave_requisicao(request: httpx.Request, corpo: bytes):
+    # O host fica de fora: um cassete gravado contra o Sympla reproduz contra qualquer URL
+    conteudo = b"\n".join([request.method.encode(), request.url.raw_path, corpo])
+    return hashlib.sha1(conteudo).hexdigest()
+
+class TransporteCassete(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    '''Transporte httpx que grava respostas num arquivo .json.gz ou as reproduz dele.
+
+    No modo "gravar" as requisições vão para a rede e cada resposta definitiva
+    (não 429/5xx) é guardada, indexada pelo hash de método, caminho e corpo da
+    requisição; a gravação começa vazia e, quando o cliente é fechado, substitui
+    o arquivo de uma vez (nada do cassete anterior sobra). No modo "reproduzir"
+    nada sai da máquina: a resposta gravada é devolvida e uma requisição que não
+    está no cassete levanta RequisicaoForaDoCassete.'''
+
+    def __init__(self, caminho: str, modo: str = REPRODUZIR):
+        if modo not in (GRAVAR, REPRODUZIR):
+            raise ValueError(f"Modo de cassete inválido: {modo}")
+        self.caminho = caminho
+        self.modo = modo
+        self.respostas = self.__carregar() if modo == REPRODUZIR else {}
+        self.reproduzidas = 0
+        self._lock = threading.Lock()
+        self._transporte = None
+        self._transporte_async = None
+
+    def __carregar(self):
+        with gzip.open(self.caminho, "rt", encoding="utf-8") as arquivo:
+            return json.load(arquivo)["respostas"]
+
+    def salvar(self):
+        with self._lock:
+            conteudo = json.dumps({"respostas": self.respostas}, sort_keys=True)
+        # Grava ao lado e troca com os.replace: quem lê o cassete nunca vê um arquivo
+        # pela metade. mtime=0 deixa o arquivo idêntico entre gravações com as mesmas respostas
+        temporario = f"{self.caminho}.{os.getpid()}.tmp"
+        try:
+            with open(temporario, "wb") as arquivo, gzip.GzipFile(fileobj=arquivo, mode="wb", mtime=0) as gz:
+                gz.write(conteudo.encode())
+            os.replace(temporario, self.caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        logger.info("Cassete salvo em %s (%s respostas)", self.caminho, len(self.respostas))
+
+    def __reproduzir(self, request: httpx.Request, corpo: bytes):
+        gravada = self.respostas.get(chave_requisicao(request, corpo))
+        if gravada is None:
+            raise RequisicaoForaDoCassete(f"{request.method} {request.url.raw_path.decode()} não está no cassete {self.caminho}")
+        with self._lock:
+            self.reproduzidas += 1
+        return httpx.Response(
+            gravada["status"],
+            headers={"Content-Type": gravada["content_type"]},
+            content=gravada["conteudo"].encode(),
+            request=request,
+        )
+
+    def __guardar(self, request: httpx.Request, corpo: bytes, response: httpx.Response):
+        if response.status_code in STATUS_REPETIVEIS:
+            return
+        with self._lock:
+            self.respostas[chave_requisicao(request, corpo)] = dict(
+                status=response.status_code,
+                content_type=response.headers.get("Content-Type", "application/json"),
+                conteudo=response.text,
+            )
+
+    def handle_request(self, request: httpx.Request):
+        corpo = request.read()
+        if self.modo == REPRODUZIR:
+            return self.__reproduzir(request, corpo)
+
+        if self._transporte is None:
+            self._transporte = httpx.HTTPTransport()
+        response = self._transporte.handle_request(request)
+        response.read()
+        self.__guardar(request, corpo, response)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request):
+        corpo = await request.aread()
+        if self.modo == REPRODUZIR:
+            return self.__reproduzir(request, corpo)
+
+        if self._transporte_async is None:
+            self._transporte_async = httpx.AsyncHTTPTransport()
+        response = await self._transporte_async.handle_async_request(request)
+        await response.aread()
+        self.__guardar(request, corpo, response)
+        return response
+
+    def close(self):
+        if self._transporte is not None:
+            self._transporte.close()
+            self._transporte = None
+        if self.modo == GRAVAR:
+            self.salvar()
+
+    async def aclose(self):
+        if self._transporte_async is not None:
+            await self._transporte_async.aclose()
+            self._transporte_async = None
+        if self.modo == GRAVAR:
+            self.salvar()
+
+# Um cassete por arquivo e modo, para que os vários clientes abertos durante uma
+# carga gravem no mesmo arquivo e a reprodução só o leia uma vez
+_cassetes = {}
+
+def abrir_cassete(caminho: str, modo: str = REPRODUZIR):
+    chave = (os.path.abspath(caminho), modo)
+    if chave not in _cassetes:
+        _cassetes[chave] = TransporteCassete(caminho, modo)
+    return _cassetes[chave]
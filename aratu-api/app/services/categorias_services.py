@@ -0,0 +1,79 @@
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import delete, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Categoria
+
+# Recontagem completa das categorias a partir de eventos, num único statement: grava
+# as contagens atuais e apaga as categorias que não aparecem mais em nenhum evento
+RECONTAR_CATEGORIAS = text(
+    """
+    WITH contagens AS (
+        SELECT c.nome, count(DISTINCT e.id) AS qtd_eventos,
+               count(DISTINCT e.id) FILTER (WHERE e.data_hora >= localtimestamp) AS qtd_futuros
+        FROM eventos e CROSS JOIN LATERAL unnest(e.categoria) AS c(nome)
+        GROUP BY c.nome
+    ), gravadas AS (
+        INSERT INTO categorias (nome, qtd_eventos, qtd_futuros, atualizado_em)
+        SELECT nome, qtd_eventos, qtd_futuros, localtimestamp FROM contagens
+        ON CONFLICT (nome) DO UPDATE SET
+            qtd_eventos = excluded.qtd_eventos,
+            qtd_futuros = excluded.qtd_futuros,
+            atualizado_em = excluded.atualizado_em
+        RETURNING nome
+    )
+    DELETE FROM categorias WHERE nome NOT IN (SELECT nome FROM gravadas)
+    """
+)
+
+def atualizar_categorias(session):
+    '''Recalcula o catálogo inteiro. Roda ao fim das cargas, que mudam muitos
+    eventos de uma vez, e corrige também qtd_futuros dos eventos que já passaram.'''
+    session.execute(RECONTAR_CATEGORIAS)
+    session.commit()
+
+def contagem_do_evento(categorias, data_hora: datetime):
+    # Contribuição de um evento para o catálogo: (categorias, é futuro?)
+    return set(categorias or []), data_hora is not None and data_hora >= datetime.now()
+
+async def ajustar_categorias(session: AsyncSession, antes=None, depois=None):
+    '''Aplica ao catálogo a diferença entre o evento antes e depois de uma escrita
+    do CRUD (cada um uma contagem_do_evento, ou None na criação/exclusão), na mesma
+    transação da escrita. Não faz commit.'''
+    eventos, futuros = Counter(), Counter()
+    for contagem, sinal in ((antes, -1), (depois, 1)):
+        if contagem is None:
+            continue
+        categorias, futuro = contagem
+        for categoria in categorias:
+            eventos[categoria] += sinal
+            futuros[categoria] += sinal if futuro else 0
+
+    alteradas = [categoria for categoria in set(eventos) | set(futuros) if eventos[categoria] or futuros[categoria]]
+    if not alteradas:
+        return
+
+    agora = datetime.now()
+    stmt = insert(Categoria).values([
+        dict(nome=categoria, qtd_eventos=eventos[categoria], qtd_futuros=futuros[categoria], atualizado_em=agora)
+        for categoria in alteradas
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Categoria.nome],
+        set_=dict(
+            qtd_eventos=Categoria.qtd_eventos + stmt.excluded.qtd_eventos,
+            qtd_futuros=Categoria.qtd_futuros + stmt.excluded.qtd_futuros,
+            atualizado_em=stmt.excluded.atualizado_em,
+        ),
+    )
+    await session.execute(stmt)
+    await session.execute(delete(Categoria).where(Categoria.nome.in_(alteradas), Categoria.qtd_eventos <= 0))
+
+if __name__ == "__main__":
+    from app.db.base import SessionLocal
+
+    with SessionLocal() as session:
+        atualizar_categorias(session)
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Status que indicam sobrecarga ou falha temporária da fonte
+STATUS_REPETIVEIS = {429, 500, 502, 503, 504}
+
+class LimitadorTaxa:
+    '''Token bucket com taxa adaptativa (AIMD).
+
+    Cada sucesso aumenta a taxa aos poucos, até taxa_maxima; cada 429/5xx corta a
+    taxa pela metade, até taxa_minima, e um Retry-After pausa todas as requisições
+    até o horário indicado. Pode ser compartilhado por código síncrono e assíncrono.'''
+
+    def __init__(self, taxa: float, rajada: int = 1, taxa_minima: float = 0.2, taxa_maxima: float = None, incremento: float = 0.1):
+        self.taxa = taxa
+        self.rajada = rajada
+        self.taxa_minima = taxa_minima
+        self.taxa_maxima = taxa_maxima or taxa
+        self.incremento = incremento
+        self.tokens = float(rajada)
+        self.ultima_recarga = time.monotonic()
+        self.pausado_ate = 0.0
+        self._lock = threading.Lock()
+
+    def _reservar(self):
+        # Reserva um token e devolve quantos segundos esperar por ele
+        with self._lock:
+            agora = time.monotonic()
+            self.tokens = min(self.rajada, self.tokens + (agora - self.ultima_recarga) * self.taxa)
+            self.ultima_recarga = agora
+            self.tokens -= 1
+            espera = -self.tokens / self.taxa if self.tokens < 0 else 0.0
+            return max(espera, self.pausado_ate - agora)
+
+    def aguardar_sync(self):
+        espera = self._reservar()
+        if espera > 0:
+            time.sleep(espera)
+
+    async def aguardar(self):
+        espera = self._reservar()
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.taxa = min(self.taxa_maxima, self.taxa + self.incremento)
+
+    def registrar_sobrecarga(self, retry_after: float = None):
+        with self._lock:
+            self.taxa = max(self.taxa_minima, self.taxa / 2)
+            if retry_after:
+                self.pausado_ate = max(self.pausado_ate, time.monotonic() + retry_after)
+        logger.warning("Fonte sobrecarregada, taxa reduzida para %.2f req/s", self.taxa)
+
+class PoliticaRetry:
+    '''Backoff exponencial com jitter completo: espera aleatória entre 0 e base * 2^tentativa.'''
+
+    def __init__(self, tentativas: int = 5, base: float = 0.5, maximo: float = 30.0):
+        self.tentativas = tentativas
+        self.base = base
+        self.maximo = maximo
+
+    def espera(self, tentativa: int, retry_after: float = None):
+        if retry_after is not None:
+            return min(retry_after, self.maximo)
+        return random.uniform(0, min(self.maximo, self.base * 2 ** tentativa))
+
+def retry_after(response: httpx.Response):
+    # Retry-After pode vir em segundos ou como data HTTP
+    valor = response.headers.get("Retry-After")
+    if not valor:
+        return None
+    try:
+        return max(float(valor), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(valor) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class ClienteHttp:
+    '''Cliente HTTP para fontes externas: conexões keep-alive, limite de taxa
+    adaptativo, retry com backoff para 429/5xx/erros de rede e timeout por requisição.
+
+    Use "with" para o modo síncrono (post) e "async with" para o assíncrono (post_async).
+    Se todas as tentativas falharem com um status repetível, a última resposta é
+    devolvida; erros de rede são relançados. Sem limitador, as requisições não são
+    espaçadas (útil com um transporte que não toca a rede, como o cassete).'''
+
+    def __init__(self, limitador: LimitadorTaxa = None, politica: PoliticaRetry = None, timeout: float = 30.0, max_conexoes: int = 10, headers: dict = None, transporte=None):
+        self.limitador = limitador
+        self.politica = politica or PoliticaRetry()
+        self.timeout = timeout
+        self.limites = httpx.Limits(max_connections=max_conexoes, max_keepalive_connections=max_conexoes)
+        self.headers = headers or {}
+        self.transporte = transporte
+        self._client = None
+        self._async_client = None
+
+    def __enter__(self):
+        self._client = httpx.Client(headers=self.headers, limits=self.limites, timeout=self.timeout, transport=self.transporte)
+        return self
+
+    def __exit__(self, *exc):
+        self._client.close()
+
+    async def __aenter__(self):
+        self._async_client = httpx.AsyncClient(headers=self.headers, limits=self.limites, timeout=self.timeout, transport=self.transporte)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._async_client.aclose()
+
+    def _avaliar(self, response: httpx.Response, tentativa: int):
+        # Devolve quantos segundos esperar antes de repetir, ou None se a resposta é final
+        if response.status_code not in STATUS_REPETIVEIS:
+            if self.limitador:
+                self.limitador.registrar_sucesso()
+            return None
+        espera_servidor = retry_after(response)
+        if self.limitador:
+            self.limitador.registrar_sobrecarga(espera_servidor)
+        if tentativa + 1 >= self.politica.tentativas:
+            return None
+        logger.warning("%s %s respondeu %s, tentativa %s", response.request.method, response.request.url, response.status_code, tentativa + 1)
+        return self.politica.espera(tentativa, espera_servidor)
+
+    def _erro_de_rede(self, erro: httpx.TransportError, tentativa: int):
+        if tentativa + 1 >= self.politica.tentativas:
+            raise erro
+        logger.warning("Erro de rede (%s), tentativa %s", erro, tentativa + 1)
+        return self.politica.espera(tentativa)
+
+    def post(self, url: str, **kwargs):
+        for tentativa in range(self.politica.tentativas):
+            if self.limitador:
+                self.limitador.aguardar_sync()
+            try:
+                response = self._client.post(url, **kwargs)
+            except httpx.TransportError as erro:
+                time.sleep(self._erro_de_rede(erro, tentativa))
+                continue
+            espera = self._avaliar(response, tentativa)
+            if espera is None:
+                return response
+            time.sleep(espera)
+
+    async def post_async(self, url: str, **kwargs):
+        for tentativa in range(self.politica.tentativas):
+            if self.limitador:
+                await self.limitador.aguardar()
+            try:
+                response = await self._async_client.post(url, **kwargs)
+            except httpx.TransportError as erro:
+                await asyncio.sleep(self._erro_de_rede(erro, tentativa))
+                continue
+            espera = self._avaliar(response, tentativa)
+            if espera is None:
+                return response
+            await asyncio.sleep(espera)
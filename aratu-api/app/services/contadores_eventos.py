@@ -0,0 +1,51 @@
+import logging
+
+from sqlalchemy import func, or_, select, update
+
+from app.models.models import Evento, usuarios_eventos_foram, usuarios_eventos_querem_ir
+from app.services.cache import GRUPO_PARTICIPACAO, cache_respostas
+
+logger = logging.getLogger(__name__)
+
+# eventos.qtd_quero_ir e eventos.qtd_fui são cópias das contagens das associações,
+# para que o feed de populares seja uma leitura do índice (qtd_quero_ir, id) em vez
+# de um GROUP BY sobre usuarios_eventos_querem_ir. As ações dos usuários os ajustam
+# na mesma transação (usuario_services); a reconciliação corrige o que tiver
+# escapado disso (escritas diretas no banco, cargas antigas).
+#
+# Uso: python -m app.services.contadores_eventos
+
+COLUNAS_CONTADORES = {
+    "qtd_quero_ir": usuarios_eventos_querem_ir,
+    "qtd_fui": usuarios_eventos_foram,
+}
+
+def ajuste_contador(evento_id: int, coluna: str, delta: int):
+    # UPDATE relativo (qtd = qtd + delta): ações simultâneas no mesmo evento não se perdem
+    return update(Evento).where(Evento.id == evento_id).values({coluna: getattr(Evento, coluna) + delta}).execution_options(synchronize_session=False)
+
+def reconciliar_contadores(session) -> int:
+    '''Recalcula os contadores a partir das associações e corrige os divergentes.
+    Devolve quantos eventos foram corrigidos.'''
+    contagens = {
+        coluna: select(func.count()).select_from(tabela).where(tabela.c.evento_id == Evento.id).scalar_subquery()
+        for coluna, tabela in COLUNAS_CONTADORES.items()
+    }
+    resultado = session.execute(
+        update(Evento)
+        .where(or_(*(getattr(Evento, coluna) != contagem for coluna, contagem in contagens.items())))
+        .values(contagens)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    if resultado.rowcount:
+        cache_respostas.invalidar(GRUPO_PARTICIPACAO)
+        logger.warning("Contadores de participação corrigidos em %s eventos", resultado.rowcount)
+    return resultado.rowcount
+
+if __name__ == "__main__":
+    from app.db.base import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as session:
+        print(f"{reconciliar_contadores(session)} eventos corrigidos")
@@ -0,0 +1,229 @@
+import asyncio
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from sqlalchemy import literal, select, union_all
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.models.models import Evento, usuarios_eventos_foram, usuarios_eventos_querem_ir
+
+logger = logging.getLogger(__name__)
+
+# Índice item-a-item "quem quer ir também quer": para cada par de eventos, quantos
+# usuários marcaram os dois (quero ir ou fui), guardado como matriz esparsa em
+# memória (evento -> Counter de eventos). A similaridade é o cosseno entre as colunas
+# de usuários dos dois eventos: em_comum / sqrt(usuarios_a * usuarios_b).
+#
+# As marcações feitas neste processo atualizam o índice na hora; a reconstrução
+# completa a partir das tabelas de associação roda a cada
+# SIMILARES_INTERVALO_RECONSTRUCAO_SEGUNDOS e traz as feitas pelos outros processos.
+#
+# Usuários com mais de SIMILARES_MAXIMO_EVENTOS_USUARIO eventos não entram nos
+# pares: custam O(n²) e dizem pouco sobre a afinidade entre dois eventos.
+
+class IndiceCoocorrencia:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pendentes = None  # marcações recebidas durante uma reconstrução
+        self._monitor = None
+        self.reconstruido_em = None
+        self.duracao_reconstrucao = None
+        self.__limpar()
+
+    def __limpar(self):
+        self._fontes = defaultdict(dict)  # usuario -> evento -> {"quero_ir", "fui"}
+        self._usuarios = defaultdict(set)  # evento -> usuarios
+        self._coocorrencias = defaultdict(Counter)  # evento -> evento -> usuários em comum
+        self._data_hora = {}
+        self._vizinhos = {}  # evento -> [(similaridade, em_comum, vizinho)], ordenada
+
+    def __contribui(self, usuario_id: int):
+        return len(self._fontes[usuario_id]) <= settings.SIMILARES_MAXIMO_EVENTOS_USUARIO
+
+    def __somar_pares(self, evento_id: int, outros, sinal: int):
+        linha = self._coocorrencias[evento_id]
+        for outro in outros:
+            if outro == evento_id:
+                continue
+            linha[outro] += sinal
+            self._coocorrencias[outro][evento_id] += sinal
+            if linha[outro] <= 0:
+                del linha[outro]
+                del self._coocorrencias[outro][evento_id]
+            self._vizinhos.pop(outro, None)
+        self._vizinhos.pop(evento_id, None)
+
+    def __somar_usuario(self, usuario_id: int, sinal: int):
+        # Todos os pares do usuário, ao entrar ou sair do limite de eventos
+        eventos = list(self._fontes[usuario_id])
+        for posicao, evento_id in enumerate(eventos):
+            self.__somar_pares(evento_id, eventos[posicao + 1:], sinal)
+
+    def __adicionar(self, usuario_id: int, evento_id: int, fonte: str, data_hora: datetime = None):
+        if data_hora is not None:
+            self._data_hora[evento_id] = data_hora
+        fontes = self._fontes[usuario_id].get(evento_id)
+        if fontes is not None:
+            fontes.add(fonte)
+            return
+        contribuia = self.__contribui(usuario_id)
+        self._fontes[usuario_id][evento_id] = {fonte}
+        self._usuarios[evento_id].add(usuario_id)
+        self._vizinhos.pop(evento_id, None)
+        if self.__contribui(usuario_id):
+            self.__somar_pares(evento_id, self._fontes[usuario_id], 1)
+        elif contribuia:
+            # Passou do limite: sai dos pares com os eventos que já tinha
+            self._fontes[usuario_id].pop(evento_id)
+            self.__somar_usuario(usuario_id, -1)
+            self._fontes[usuario_id][evento_id] = {fonte}
+
+    def __remover(self, usuario_id: int, evento_id: int, fonte: str):
+        fontes = self._fontes.get(usuario_id, {}).get(evento_id)
+        if fontes is None or fonte not in fontes:
+            return
+        fontes.discard(fonte)
+        if fontes:
+            return
+        contribuia = self.__contribui(usuario_id)
+        del self._fontes[usuario_id][evento_id]
+        self._usuarios[evento_id].discard(usuario_id)
+        self._vizinhos.pop(evento_id, None)
+        if contribuia:
+            self.__somar_pares(evento_id, self._fontes[usuario_id], -1)
+        elif self.__contribui(usuario_id):
+            # Voltou para dentro do limite
+            self.__somar_usuario(usuario_id, 1)
+
+    def adicionar(self, usuario_id: int, evento_id: int, fonte: str, data_hora: datetime = None):
+        with self._lock:
+            self.__adicionar(usuario_id, evento_id, fonte, data_hora)
+            if self._pendentes is not None:
+                self._pendentes.append((True, usuario_id, evento_id, fonte, data_hora))
+
+    def remover(self, usuario_id: int, evento_id: int, fonte: str):
+        with self._lock:
+            self.__remover(usuario_id, evento_id, fonte)
+            if self._pendentes is not None:
+                self._pendentes.append((False, usuario_id, evento_id, fonte, None))
+
+    def remover_evento(self, evento_id: int):
+        with self._lock:
+            for usuario_id in list(self._usuarios.get(evento_id, ())):
+                for fonte in list(self._fontes[usuario_id].get(evento_id, ())):
+                    self.__remover(usuario_id, evento_id, fonte)
+            self._usuarios.pop(evento_id, None)
+            self._coocorrencias.pop(evento_id, None)
+            self._data_hora.pop(evento_id, None)
+
+    def similares(self, evento_id: int, limite: int, somente_futuros: bool = True):
+        '''Os `limite` eventos mais parecidos com evento_id: [(vizinho, similaridade,
+        em_comum)]. A lista ordenada de cada evento fica guardada até a linha dele mudar.'''
+        with self._lock:
+            vizinhos = self._vizinhos.get(evento_id)
+            if vizinhos is None:
+                vizinhos = self._vizinhos[evento_id] = self.__calcular_vizinhos(evento_id)
+            agora = datetime.now()
+            resultado = []
+            for similaridade, em_comum, vizinho in vizinhos:
+                data_hora = self._data_hora.get(vizinho)
+                if somente_futuros and data_hora is not None and data_hora < agora:
+                    continue
+                resultado.append((vizinho, similaridade, em_comum))
+                if len(resultado) == limite:
+                    break
+            return resultado
+
+    def __calcular_vizinhos(self, evento_id: int):
+        usuarios = len(self._usuarios.get(evento_id, ()))
+        linha = self._coocorrencias.get(evento_id)
+        if not usuarios or not linha:
+            return []
+        candidatos = (
+            (em_comum / math.sqrt(usuarios * max(len(self._usuarios.get(vizinho, ())), 1)), em_comum, -vizinho)
+            for vizinho, em_comum in linha.items()
+        )
+        melhores = heapq.nlargest(settings.SIMILARES_MAXIMO_VIZINHOS, candidatos)
+        return [(round(similaridade, 4), em_comum, -vizinho) for similaridade, em_comum, vizinho in melhores]
+
+    def reconstruir(self, session):
+        '''Refaz o índice a partir das tabelas de associação. As marcações que chegam
+        durante a leitura são aplicadas de novo ao fim (adicionar e remover são
+        idempotentes por usuário, evento e fonte).'''
+        inicio = time.perf_counter()
+        with self._lock:
+            self._pendentes = []
+        try:
+            marcacoes = union_all(
+                select(usuarios_eventos_querem_ir.c.usuario_id, usuarios_eventos_querem_ir.c.evento_id, literal("quero_ir").label("fonte")),
+                select(usuarios_eventos_foram.c.usuario_id, usuarios_eventos_foram.c.evento_id, literal("fui").label("fonte")),
+            ).subquery()
+            linhas = session.execute(
+                select(marcacoes.c.usuario_id, marcacoes.c.evento_id, marcacoes.c.fonte, Evento.data_hora)
+                .join(Evento, Evento.id == marcacoes.c.evento_id)
+            ).all()
+
+            novo = IndiceCoocorrencia.__new__(IndiceCoocorrencia)
+            novo.__limpar()
+            for usuario_id, evento_id, fonte, data_hora in linhas:
+                novo._fontes[usuario_id].setdefault(evento_id, set()).add(fonte)
+                novo._usuarios[evento_id].add(usuario_id)
+                novo._data_hora[evento_id] = data_hora
+            for usuario_id in novo._fontes:
+                if novo.__contribui(usuario_id):
+                    novo.__somar_usuario(usuario_id, 1)
+        except Exception:
+            with self._lock:
+                self._pendentes = None
+            raise
+
+        with self._lock:
+            self._fontes, self._usuarios, self._coocorrencias = novo._fontes, novo._usuarios, novo._coocorrencias
+            self._data_hora, self._vizinhos = novo._data_hora, {}
+            for adicao, usuario_id, evento_id, fonte, data_hora in self._pendentes:
+                if adicao:
+                    self.__adicionar(usuario_id, evento_id, fonte, data_hora)
+                else:
+                    self.__remover(usuario_id, evento_id, fonte)
+            self._pendentes = None
+            self.reconstruido_em = datetime.now()
+            self.duracao_reconstrucao = time.perf_counter() - inicio
+
+    def __reconstruir_com_sessao(self):
+        with SessionLocal() as session:
+            self.reconstruir(session)
+
+    async def __manter(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.__reconstruir_com_sessao)
+            except Exception:
+                logger.exception("Falha ao reconstruir o índice de eventos similares")
+            await asyncio.sleep(settings.SIMILARES_INTERVALO_RECONSTRUCAO_SEGUNDOS)
+
+    def iniciar(self):
+        # A primeira construção roda em segundo plano; até lá /similares devolve listas vazias
+        self._monitor = asyncio.create_task(self.__manter())
+
+    def encerrar(self):
+        if self._monitor:
+            self._monitor.cancel()
+
+    def estado(self):
+        with self._lock:
+            return dict(
+                eventos=len(self._coocorrencias),
+                pares=sum(len(linha) for linha in self._coocorrencias.values()) // 2,
+                usuarios=len(self._fontes),
+                listas_em_memoria=len(self._vizinhos),
+                reconstruido_em=self.reconstruido_em,
+                duracao_reconstrucao_s=round(self.duracao_reconstrucao, 3) if self.duracao_reconstrucao is not None else None,
+            )
+
+coocorrencia_eventos = IndiceCoocorrencia()
@@ -1,44 +1,78 @@
-import requests
-from fastapi import HTTPException
+import asyncio
+import hashlib
 import json
-import time
+import logging
+import os
+import tempfile
+from collections import Counter, deque
+from contextlib import AsyncExitStack, ExitStack, nullcontext
+from datetime import datetime
+from itertools import islice
+from fastapi import HTTPException, status
+from math import ceil
 
-def count_eventos_sympla(start_date = None, end_date = None, city: str = "Recife", state: str = "PE", sort="date"):
-    url = "https://www.sympla.com.br/api/v1/search"
-    headers = {"Content-Type": "application/json"}
+from app.core.config import settings
+from app.services.cassete_http import REPRODUZIR, abrir_cassete
+from app.services.cliente_http import ClienteHttp, LimitadorTaxa, PoliticaRetry
+from app.services.fontes_eventos import FonteEventos, registrar_fonte
 
-    data = {
-        "service": "/v4/mapsearch",
-        "params": {
-            "only": "name,start_date,end_date,images,event_type,duration_type,location,id,global_score,start_date_formats,end_date_formats,url,company,type,organizer",
-            "has_banner": "1",
-            "city": city,
-            "state": state,
-            "sort": sort,
-            "page": 1
-        }
-    }
-    if start_date and end_date:
-        data["params"]["range"] = f"{start_date},{end_date}"
+logger = logging.getLogger(__name__)
 
-    response = requests.post(url, headers=headers, data=json.dumps(data))
-    if response.status_code != 200:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao obter o count dos eventos da API externa")
+HEADERS = {"Content-Type": "application/json"}
+CAMPOS = "name,start_date,end_date,images,event_type,duration_type,location,id,global_score,start_date_formats,end_date_formats,url,company,type,organizer"
 
-    response_data = response.json()
+CATEGORIAS_SYMPLA = {
+    "GASTRONOMIA": 1,
+    "FESTAS_SHOWS": 17,
+    "RELIGIAO_ESPIRITUALIDADE": 13,
+    "CURSOS_WORKSHOPS": 8,
+    "ARTE_CINEMA_LAZER": 10,
+    "GAMES_GEEK": 12,
+    "CONGRESSOS_PALESTRAS": 4,
+    "SAUDE_BEM_ESTAR": 9,
+    "MODA_BELEZA": 11,
+    "ESPORTES": 2,
+    "INFANTIL": 15,
+    "PRIDE": 14,
+}
 
-    count = response_data["result"]["events"]["total"]
+# O crawler assíncrono roda a passada de gratuitos e uma por categoria ao mesmo tempo
+PASSADAS_SIMULTANEAS = 1 + len(CATEGORIAS_SYMPLA)
 
-    return count
+def novo_limitador_sympla():
+    # Um por cliente: a taxa aprendida (AIMD) vale para a carga que usa o cliente e
+    # não passa de uma execução para a outra. A rajada cobre a primeira leva de
+    # páginas de todas as passadas simultâneas; a taxa é o limite do Sympla como um todo
+    return LimitadorTaxa(
+        taxa=settings.SYMPLA_TAXA_INICIAL,
+        rajada=settings.SYMPLA_CONCORRENCIA_POR_PASSADA * PASSADAS_SIMULTANEAS,
+        taxa_minima=settings.SYMPLA_TAXA_MINIMA,
+        taxa_maxima=settings.SYMPLA_TAXA_MAXIMA,
+    )
+
+def novo_cliente_sympla():
+    # Com SYMPLA_CASSETE, as respostas são gravadas nesse arquivo ou reproduzidas
+    # dele (SYMPLA_CASSETE_MODO); na reprodução não há rede e, portanto, nem limite de taxa
+    limitador, transporte = novo_limitador_sympla(), None
+    if settings.SYMPLA_CASSETE:
+        transporte = abrir_cassete(settings.SYMPLA_CASSETE, settings.SYMPLA_CASSETE_MODO)
+        if transporte.modo == REPRODUZIR:
+            limitador = None
 
-def __get_eventos_sympla(page=1, need_pay="", collections="", start_date = None, end_date = None, city: str = "Recife", state: str = "PE", sort="date"):
-    url = "https://www.sympla.com.br/api/v1/search"
-    headers = {"Content-Type": "application/json"}
+    return ClienteHttp(
+        limitador,
+        PoliticaRetry(tentativas=settings.SYMPLA_TENTATIVAS),
+        timeout=settings.SYMPLA_TIMEOUT,
+        max_conexoes=settings.SYMPLA_MAX_CONEXOES,
+        headers=HEADERS,
+        transporte=transporte,
+    )
 
+def __montar_payload(page=1, need_pay="", collections="", start_date = None, end_date = None, city: str = "Recife", state: str = "PE", sort="date"):
     data = {
         "service": "/v4/mapsearch",
         "params": {
-            "only": "name,start_date,end_date,images,event_type,duration_type,location,id,global_score,start_date_formats,end_date_formats,url,company,type,organizer",
+            "only": CAMPOS,
             "has_banner": "1",
             "city": city,
             "state": state,
@@ -48,114 +82,361 @@ def __get_eventos_sympla(page=1, need_pay="", collections="", start_date = None,
             "need_pay": need_pay,
             }
         }
-    
+
     if start_date and end_date:
         data["params"]["range"] = f"{start_date},{end_date}"
 
-    response = requests.post(url, headers=headers, data=json.dumps(data))
+    return data
+
+def __ultima_pagina(response_data):
+    # Mesma condição de parada usada na paginação sequencial
+    return (response_data["result"]["events"]["page"] *
+            response_data["result"]["events"]["limit"] >= response_data["result"]["events"]["total"])
+
+def count_eventos_sympla(start_date = None, end_date = None, city: str = "Recife", state: str = "PE", sort="date", client: ClienteHttp = None):
+    data = __montar_payload(start_date=start_date, end_date=end_date, city=city, state=state, sort=sort)
+    del data["params"]["collections"], data["params"]["need_pay"]
+
+    with ExitStack() as stack:
+        client = client or stack.enter_context(novo_cliente_sympla())
+        response = client.post(settings.SYMPLA_URL, json=data)
+    if response.status_code != 200:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao obter o count dos eventos da API externa")
+
+    response_data = response.json()
+
+    count = response_data["result"]["events"]["total"]
+
+    return count
+
+def __get_eventos_sympla(client: ClienteHttp, page=1, need_pay="", collections="", start_date = None, end_date = None, city: str = "Recife", state: str = "PE", sort="date"):
+    data = __montar_payload(page, need_pay, collections, start_date, end_date, city, state, sort)
+
+    response = client.post(settings.SYMPLA_URL, json=data)
 
     if response.status_code != 200:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao obter eventos da API externa")
-    
+
     return response.json()
-    
 
-def get_eventos_sympla():
-    eventos = []
+def __possui_eventos(response_data):
+    return "result" in response_data and "events" in response_data["result"]
 
-    # Pegar todos os eventos
-    print("Pegando todos os eventos...")
-    page = 1
-    while True:
-        response_data = __get_eventos_sympla(page=page)
+class IndiceEventos:
+    '''Gratuidade e categorias, por id, dos eventos vistos nas passadas de
+    gratuitos e de categorias, que rodam antes da passada com todos os eventos.
 
-        if "result" in response_data and "events" in response_data["result"]:
-            for event in response_data["result"]["events"]["data"]:
-                event["need_pay"] = True
-                event["category"] = []
-                eventos.append(event)
+    Cada id aponta para uma tupla (gratuito, categorias) compartilhada por todos os
+    eventos com a mesma combinação, e os eventos da passada com todos seguem para os
+    lotes à medida que as páginas chegam. O payload de cada evento indexado vai para
+    um arquivo temporário, não para a memória: se a passada com todos não trouxer o
+    evento (a listagem mudou no meio da carga), ele é lido de volta de lá no final.'''
 
-            if (response_data["result"]["events"]["page"] * 
-                    response_data["result"]["events"]["limit"] >= response_data["result"]["events"]["total"]):
-                break
-        
-        page += 1
-        time.sleep(0.5)
-    print(f"Total de todos os eventos: {len(eventos)}")
+    NOVO = (False, frozenset())
 
-    # Pegar eventos gratuitos (gratuitos <<< pagos)
-    print("Pegando eventos gratuitos...")
-    count_events_free = 0
-    count_events_not_registered = 0
+    def __init__(self):
+        self.eventos = {}
+        self._combinacoes = {}
+        # id -> (início, tamanho) do payload no arquivo, enquanto o evento não é visto
+        # na passada com todos
+        self._pendentes = {}
+        self._payloads = tempfile.TemporaryFile()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._payloads.close()
+
+    def __atualizar(self, event, gratuito, categorias):
+        if event["id"] not in self.eventos:
+            payload = json.dumps(event, ensure_ascii=False).encode()
+            self._pendentes[event["id"]] = (self._payloads.seek(0, os.SEEK_END), len(payload))
+            self._payloads.write(payload)
+        chave = (gratuito, categorias)
+        self.eventos[event["id"]] = self._combinacoes.setdefault(chave, chave)
+
+    def marcar_gratuito(self, event):
+        _, categorias = self.eventos.get(event["id"], self.NOVO)
+        self.__atualizar(event, True, categorias)
+
+    def adicionar_categoria(self, event, category):
+        gratuito, categorias = self.eventos.get(event["id"], self.NOVO)
+        if category not in categorias:
+            self.__atualizar(event, gratuito, categorias | {category})
+
+    def completar(self, event):
+        # A entrada não é removida: se a paginação repetir o evento numa página
+        # seguinte, ele é completado do mesmo jeito
+        self._pendentes.pop(event["id"], None)
+        gratuito, categorias = self.eventos.get(event["id"], self.NOVO)
+        event["need_pay"] = not gratuito
+        event["category"] = self.__ordenar(categorias)
+        return event
+
+    def nao_vistos(self):
+        # Eventos que apareceram só nas passadas de gratuitos/categorias, completados
+        # a partir do payload guardado; chamar depois da passada com todos
+        pendentes, self._pendentes = self._pendentes, {}
+        for inicio, tamanho in pendentes.values():
+            self._payloads.seek(inicio)
+            yield self.completar(json.loads(self._payloads.read(tamanho)))
+
+    @staticmethod
+    def __ordenar(categorias):
+        # As passadas de categoria podem rodar em paralelo; a ordem final segue o dicionário
+        return [category for category in CATEGORIAS_SYMPLA if category in categorias]
+
+def __iter_paginas_sympla(client: ClienteHttp, **filtros):
+    # O ritmo entre as páginas é dado pelo limitador de taxa do cliente
     page = 1
     while True:
-        response_data = __get_eventos_sympla(page=page, need_pay="0")
+        response_data = __get_eventos_sympla(client, page=page, **filtros)
 
-        if "result" in response_data and "events" in response_data["result"]:
-            for event in response_data["result"]["events"]["data"]:
-                count_events_free += 1
-                event["need_pay"] = False
-
-                for event_saved in eventos:
-                    if event_saved["id"] == event["id"]:
-                        event_saved["need_pay"] = False
-                        break
-                else:
-                    count_events_not_registered += 1
-                    eventos.append(event)
-
-            if (response_data["result"]["events"]["page"] * 
-                    response_data["result"]["events"]["limit"] >= response_data["result"]["events"]["total"]):
+        if __possui_eventos(response_data):
+            yield response_data
+
+            if __ultima_pagina(response_data):
                 break
-        
+
         page += 1
-        time.sleep(0.5)
-    print(f"Total de eventos pagos: {count_events_free}; Total de eventos: {len(eventos)}; Total de eventos não registrados: {count_events_not_registered}")
-
-    # Pegar eventos por categoria
-    count_events_not_registered = 0
-    print("Pegando eventos por categoria...")
-
-    categories = {
-        "GASTRONOMIA": 1,
-        "FESTAS_SHOWS": 17,
-        "RELIGIAO_ESPIRITUALIDADE": 13,
-        "CURSOS_WORKSHOPS": 8,
-        "ARTE_CINEMA_LAZER": 10,
-        "GAMES_GEEK": 12,
-        "CONGRESSOS_PALESTRAS": 4,
-        "SAUDE_BEM_ESTAR": 9,
-        "MODA_BELEZA": 11,
-        "ESPORTES": 2,
-        "INFANTIL": 15,
-        "PRIDE": 14,
-    }
-
-    for category in categories:
-        page = 1
-        while True:
-            response_data = __get_eventos_sympla(page=page, collections=categories[category])
-
-            if "result" in response_data and "events" in response_data["result"]:
+
+def __agrupar_em_lotes(eventos, tamanho_lote):
+    lote = []
+    for event in eventos:
+        lote.append(event)
+        if len(lote) >= tamanho_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def iter_lotes_eventos_sympla(tamanho_lote: int = None):
+    '''Percorre o Sympla e gera lotes de eventos já mesclados (gratuito + categorias),
+    à medida que as páginas chegam.'''
+    tamanho_lote = tamanho_lote or settings.INGESTAO_TAMANHO_LOTE
+    with novo_cliente_sympla() as client, IndiceEventos() as indice:
+        # Pegar eventos gratuitos (gratuitos <<< pagos)
+        logger.info("Pegando eventos gratuitos...")
+        for response_data in __iter_paginas_sympla(client, need_pay="0"):
+            for event in response_data["result"]["events"]["data"]:
+                indice.marcar_gratuito(event)
+
+        # Pegar eventos por categoria
+        logger.info("Pegando eventos por categoria...")
+        for category in CATEGORIAS_SYMPLA:
+            for response_data in __iter_paginas_sympla(client, collections=CATEGORIAS_SYMPLA[category]):
                 for event in response_data["result"]["events"]["data"]:
-                    event["category"] = [category]
+                    indice.adicionar_categoria(event, category)
+
+        # Pegar todos os eventos
+        logger.info("Pegando todos os eventos...")
+        yield from __agrupar_em_lotes(__completar_todos(__iter_paginas_sympla(client), indice), tamanho_lote)
 
-                    for event_saved in eventos:
-                        if event_saved["id"] == event["id"]:
-                            if category not in event_saved["category"]:
-                                event_saved["category"].append(category)
-                            break
-                    else:
-                        count_events_not_registered += 1
-                        eventos.append(event)
+def __completar_todos(paginas, indice):
+    # A paginação pode repetir eventos entre páginas; o evento repetido sai completado
+    # do mesmo jeito, e a gravação em lote (upsert pelo id de origem) é idempotente
+    for response_data in paginas:
+        for event in response_data["result"]["events"]["data"]:
+            yield indice.completar(event)
 
-                if (response_data["result"]["events"]["page"] * 
-                        response_data["result"]["events"]["limit"] >= response_data["result"]["events"]["total"]):
-                    break
+    yield from __completar_nao_vistos(indice)
 
-            page += 1
-            time.sleep(0.5)
+def __completar_nao_vistos(indice):
+    nao_vistos = 0
+    for event in indice.nao_vistos():
+        nao_vistos += 1
+        yield event
+    if nao_vistos:
+        logger.info("%s eventos apareceram só nas passadas de gratuitos/categorias", nao_vistos)
 
-    print(f"Total de eventos após categorias: {len(eventos)}; Total de eventos não registrados: {count_events_not_registered}")
+def get_eventos_sympla():
+    eventos = [event for lote in iter_lotes_eventos_sympla() for event in lote]
+    logger.info("Total de eventos após categorias: %s", len(eventos))
     return eventos
+
+async def __get_eventos_sympla_async(client: ClienteHttp, semaforo: asyncio.Semaphore = None, page=1, **filtros):
+    data = __montar_payload(page=page, **filtros)
+
+    async with semaforo or nullcontext():
+        response = await client.post_async(settings.SYMPLA_URL, json=data)
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao obter eventos da API externa")
+
+    return response.json()
+
+async def __aiter_paginas_sympla(client: ClienteHttp, progresso: Counter = None, **filtros):
+    # A primeira página informa o total e o limite por página, o que permite
+    # buscar as páginas restantes em paralelo, numa janela deslizante do tamanho
+    # da concorrência da passada. As páginas são entregues em ordem.
+    concorrencia = settings.SYMPLA_CONCORRENCIA_POR_PASSADA
+    semaforo = asyncio.Semaphore(concorrencia)
+    primeira = await __get_eventos_sympla_async(client, semaforo, page=1, **filtros)
+    if progresso is not None:
+        progresso["paginas"] += 1
+    if not __possui_eventos(primeira):
+        return
+    yield primeira
+
+    total = primeira["result"]["events"]["total"]
+    limit = primeira["result"]["events"]["limit"]
+    total_paginas = max(1, ceil(total / limit)) if limit else 1
+
+    paginas = iter(range(2, total_paginas + 1))
+    janela = deque()
+    try:
+        for page in islice(paginas, concorrencia):
+            janela.append(asyncio.create_task(__get_eventos_sympla_async(client, semaforo, page=page, **filtros)))
+        while janela:
+            response_data = await janela.popleft()
+            if progresso is not None:
+                progresso["paginas"] += 1
+            for page in islice(paginas, 1):
+                janela.append(asyncio.create_task(__get_eventos_sympla_async(client, semaforo, page=page, **filtros)))
+            if __possui_eventos(response_data):
+                yield response_data
+    finally:
+        for tarefa in janela:
+            tarefa.cancel()
+
+async def __primeira_pagina_todos(client: ClienteHttp, start_date = None, end_date = None):
+    data = __montar_payload(start_date=start_date, end_date=end_date)
+    del data["params"]["collections"], data["params"]["need_pay"]
+
+    response = await client.post_async(settings.SYMPLA_URL, json=data)
+    if response.status_code != 200:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao obter o count dos eventos da API externa")
+
+    return response.json()["result"]["events"]
+
+async def count_eventos_sympla_async(client: ClienteHttp, start_date = None, end_date = None):
+    return (await __primeira_pagina_todos(client, start_date, end_date))["total"]
+
+async def assinar_janela_sympla_async(client: ClienteHttp, start_date = None, end_date = None):
+    # A mesma requisição da contagem já traz a primeira página da janela: a assinatura
+    # cobre o total e o conteúdo dessa página (ids, nomes, datas, locais...)
+    eventos = await __primeira_pagina_todos(client, start_date, end_date)
+    pagina = sorted(eventos.get("data") or [], key=lambda event: event["id"])
+    serializado = json.dumps([eventos["total"], pagina], sort_keys=True, default=str, ensure_ascii=False)
+    return eventos["total"], hashlib.sha1(serializado.encode()).hexdigest()
+
+async def aiter_lotes_eventos_sympla(tamanho_lote: int = None, start_date = None, end_date = None, client: ClienteHttp = None, progresso: Counter = None):
+    '''Versão assíncrona de iter_lotes_eventos_sympla: um único cliente HTTP
+    keep-alive, páginas de cada passada buscadas em paralelo e as passadas de
+    gratuitos e de categorias rodando ao mesmo tempo.
+
+    Com start_date/end_date, todas as passadas ficam restritas a essa janela de datas.
+    Se progresso for informado, progresso["paginas"] é incrementado a cada página buscada.'''
+    tamanho_lote = tamanho_lote or settings.INGESTAO_TAMANHO_LOTE
+    filtros = dict(start_date=start_date, end_date=end_date)
+
+    async with AsyncExitStack() as stack:
+        indice = stack.enter_context(IndiceEventos())
+        if client is None:
+            client = await stack.enter_async_context(novo_cliente_sympla())
+
+        async def indexar_gratuitos():
+            async for response_data in __aiter_paginas_sympla(client, progresso, need_pay="0", **filtros):
+                for event in response_data["result"]["events"]["data"]:
+                    indice.marcar_gratuito(event)
+
+        async def indexar_categoria(category):
+            async for response_data in __aiter_paginas_sympla(client, progresso, collections=CATEGORIAS_SYMPLA[category], **filtros):
+                for event in response_data["result"]["events"]["data"]:
+                    indice.adicionar_categoria(event, category)
+
+        await asyncio.gather(indexar_gratuitos(), *(indexar_categoria(category) for category in CATEGORIAS_SYMPLA))
+
+        lote = []
+        async for event in __acompletar_todos(__aiter_paginas_sympla(client, progresso, **filtros), indice):
+            lote.append(event)
+            if len(lote) >= tamanho_lote:
+                yield lote
+                lote = []
+
+    if lote:
+        yield lote
+
+async def __acompletar_todos(paginas, indice):
+    async for response_data in paginas:
+        for event in response_data["result"]["events"]["data"]:
+            yield indice.completar(event)
+
+    for event in __completar_nao_vistos(indice):
+        yield event
+
+# Passadas do crawler distribuído, além de uma por categoria
+PASSADA_TODOS = "TODOS"
+PASSADA_GRATUITOS = "GRATUITOS"
+
+async def get_pagina_eventos_sympla(client: ClienteHttp, passada: str, page: int = 1, city: str = "Recife", state: str = "PE"):
+    '''Uma página de uma passada, com need_pay e category preenchidos com o que a
+    passada sabe de cada evento, e o total de páginas da passada.'''
+    filtros = dict(city=city, state=state)
+    if passada == PASSADA_GRATUITOS:
+        filtros["need_pay"] = "0"
+    elif passada in CATEGORIAS_SYMPLA:
+        filtros["collections"] = CATEGORIAS_SYMPLA[passada]
+
+    response_data = await __get_eventos_sympla_async(client, page=page, **filtros)
+    if not __possui_eventos(response_data):
+        return [], 0
+
+    eventos = response_data["result"]["events"]["data"]
+    for event in eventos:
+        event["need_pay"] = passada != PASSADA_GRATUITOS
+        event["category"] = [passada] if passada in CATEGORIAS_SYMPLA else []
+
+    total = response_data["result"]["events"]["total"]
+    limit = response_data["result"]["events"]["limit"]
+    return eventos, max(1, ceil(total / limit)) if limit else 1
+
+async def get_eventos_sympla_async():
+    eventos = [event async for lote in aiter_lotes_eventos_sympla() for event in lote]
+    logger.info("Total de eventos após categorias: %s", len(eventos))
+    return eventos
+
+@registrar_fonte
+class FonteSympla(FonteEventos):
+    nome = "SYMPLA"
+    janela_dias = settings.SYMPLA_JANELA_DIAS
+    horizonte_dias = settings.SYMPLA_HORIZONTE_DIAS
+    reconciliacao_horas = settings.SYMPLA_RECONCILIACAO_HORAS
+
+    def novo_cliente(self):
+        return novo_cliente_sympla()
+
+    async def contar(self, client, start_date=None, end_date=None):
+        return await count_eventos_sympla_async(client, start_date, end_date)
+
+    async def assinar_janela(self, client, start_date, end_date):
+        return await assinar_janela_sympla_async(client, start_date, end_date)
+
+    def aiter_lotes(self, client, start_date=None, end_date=None, progresso=None):
+        return aiter_lotes_eventos_sympla(start_date=start_date, end_date=end_date, client=client, progresso=progresso)
+
+    def normalizar(self, evento_api):
+        # Converte um evento da API do Sympla para as colunas da tabela eventos
+        return dict(
+            nome=evento_api["name"],
+            descricao="",  # TODO: Check this
+            local=evento_api["location"]["name"],
+            endereco=f"{evento_api['location']['address']} - {evento_api['location']['city']}, {evento_api['location']['state']}",
+            data_hora=evento_api["start_date"],
+            data_fim=evento_api["end_date"],
+            banner=evento_api["images"]["original"],
+            onde_comprar_ingressos=evento_api["url"],
+            id_sistema_origem=evento_api["id"],
+            fonte=self.nome,
+            organizador=evento_api['organizer']['name'],
+            gratis=evento_api['need_pay'],
+            categoria=evento_api['category'],
+            atualizado_em=datetime.now(),
+        )
+
+    def passadas(self):
+        return [PASSADA_TODOS, PASSADA_GRATUITOS, *CATEGORIAS_SYMPLA]
+
+    async def buscar_pagina(self, client, cidade, estado, passada, pagina):
+        return await get_pagina_eventos_sympla(client, passada, pagina, city=cidade, state=estado)
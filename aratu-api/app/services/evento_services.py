@@ -0,0 +1,149 @@
+import base64
+import binascii
+import hashlib
+import json
+from collections import Counter
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import and_, func, literal_column, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.models.models import Evento
+
+async def buscar_evento(session: AsyncSession, evento_id: int, *relacoes):
+    resultado = await session.execute(
+        select(Evento).where(Evento.id == evento_id).options(*(selectinload(relacao) for relacao in relacoes))
+    )
+    return resultado.scalar_one_or_none()
+
+# Colunas que identificam o evento na origem e não entram na atualização
+CHAVE_ORIGEM = ("fonte", "id_sistema_origem")
+
+def hash_conteudo(colunas: dict):
+    '''Impressão digital do conteúdo normalizado de um evento (sem atualizado_em).'''
+    conteudo = {coluna: valor for coluna, valor in colunas.items() if coluna not in ("atualizado_em", "hash_conteudo")}
+    serializado = json.dumps(conteudo, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(serializado.encode()).hexdigest()
+
+def hashes_existentes(session, fonte: str, ids_origem: List[int]):
+    linhas = session.execute(
+        select(Evento.id_sistema_origem, Evento.hash_conteudo)
+        .where(Evento.fonte == fonte, Evento.id_sistema_origem.in_(ids_origem))
+    ).all()
+    return dict(linhas)
+
+def salvar_lote_eventos(session, lote: List[dict], fonte: str):
+    '''Grava um lote de eventos, já convertidos para as colunas da tabela eventos
+    (FonteEventos.normalizar), com um único INSERT ... ON CONFLICT DO UPDATE.
+
+    Eventos cujo hash de conteúdo é igual ao já gravado são ignorados antes de
+    chegar ao banco, e atualizado_em só muda quando o conteúdo muda de fato.
+    Retorna um Counter com a quantidade de eventos inseridos, atualizados e
+    inalterados (ignorados, sem escrita).'''
+    # Um mesmo evento não pode aparecer duas vezes no mesmo INSERT ... ON CONFLICT
+    linhas = {colunas["id_sistema_origem"]: colunas for colunas in lote}
+    resumo = Counter(inseridos=0, atualizados=0, inalterados=0)
+    if not linhas:
+        return resumo
+
+    existentes = hashes_existentes(session, fonte, list(linhas))
+    alteradas = []
+    for id_origem, colunas in linhas.items():
+        colunas["hash_conteudo"] = hash_conteudo(colunas)
+        if existentes.get(id_origem) != colunas["hash_conteudo"]:
+            alteradas.append(colunas)
+
+    resumo["inalterados"] = len(linhas) - len(alteradas)
+    if not alteradas:
+        return resumo
+
+    tabela = Evento.__table__
+    stmt = insert(tabela).values(alteradas)
+    colunas = [coluna for coluna in alteradas[0] if coluna not in CHAVE_ORIGEM]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(CHAVE_ORIGEM),
+        set_={coluna: stmt.excluded[coluna] for coluna in colunas},
+        # Protege contra uma carga concorrente que já tenha gravado o mesmo conteúdo
+        where=tabela.c.hash_conteudo.is_distinct_from(stmt.excluded.hash_conteudo),
+    ).returning(literal_column("xmax = 0").label("inserido"))
+
+    # Linhas atualizadas têm xmax preenchido; as que não mudaram nem voltam no RETURNING
+    inseridos = session.execute(stmt).scalars().all()
+    session.commit()
+
+    resumo["inseridos"] = sum(1 for inserido in inseridos if inserido)
+    resumo["atualizados"] = len(inseridos) - resumo["inseridos"]
+    resumo["inalterados"] += len(alteradas) - len(inseridos)
+    return resumo
+
+def mesclar_eventos(session, lote: List[dict]):
+    '''Grava eventos vistos por uma única passada do crawler distribuído (todos,
+    gratuitos ou uma categoria), mesclando com o que as outras passadas já gravaram:
+    as categorias são unidas e o evento fica gratuito se alguma passada o viu assim.
+
+    Não faz commit: a gravação é confirmada junto com a conclusão da tarefa da fila.
+    O hash de conteúdo é apagado, porque a linha pode estar parcial; a próxima carga
+    em lote (salvar_lote_eventos) volta a calculá-lo.'''
+    linhas = list({colunas["id_sistema_origem"]: colunas for colunas in lote}.values())
+    if not linhas:
+        return 0
+
+    tabela = Evento.__table__
+    stmt = insert(tabela).values(linhas)
+    set_ = {coluna: stmt.excluded[coluna] for coluna in linhas[0] if coluna not in CHAVE_ORIGEM}
+    set_["categoria"] = literal_column(
+        "ARRAY(SELECT DISTINCT c FROM unnest(coalesce(eventos.categoria, '{}') || excluded.categoria) AS c ORDER BY c)"
+    )
+    # gratis guarda need_pay da API: False em qualquer passada vence
+    set_["gratis"] = and_(func.coalesce(tabela.c.gratis, True), stmt.excluded.gratis)
+    set_["hash_conteudo"] = None
+    stmt = stmt.on_conflict_do_update(index_elements=list(CHAVE_ORIGEM), set_=set_)
+
+    session.execute(stmt)
+    return len(linhas)
+
+# Paginação por cursor (keyset) do feed: a página seguinte começa depois do último
+# (data_hora, id) da anterior, pelo índice ix_eventos_data_hora_id, com o mesmo
+# custo na página 1 e na 500. O cursor é opaco para o app: base64 de
+# [data_hora, id, ordem].
+
+class CursorInvalido(ValueError):
+    pass
+
+def codificar_cursor(evento: Evento, ordem: str):
+    valor = json.dumps([evento.data_hora.isoformat(), evento.id, ordem])
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str):
+    try:
+        data_hora, evento_id, ordem = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(data_hora), int(evento_id), ordem
+    except (binascii.Error, ValueError, TypeError) as erro:
+        raise CursorInvalido("Cursor inválido") from erro
+
+def pagina_eventos(ordem: str = "asc", cursor: str = None):
+    '''SELECT dos eventos do feed na ordem (data_hora, id), começando depois do
+    cursor, se houver. Eventos sem data_hora não entram no feed.'''
+    query = select(Evento).where(Evento.data_hora.is_not(None))
+    chave = tuple_(Evento.data_hora, Evento.id)
+    if cursor:
+        data_hora, evento_id, ordem_cursor = decodificar_cursor(cursor)
+        if ordem_cursor != ordem:
+            raise CursorInvalido("O cursor é de outra ordenação")
+        query = query.where(chave > tuple_(data_hora, evento_id) if ordem == "asc" else chave < tuple_(data_hora, evento_id))
+    if ordem == "asc":
+        return query.order_by(Evento.data_hora.asc(), Evento.id.asc())
+    return query.order_by(Evento.data_hora.desc(), Evento.id.desc())
+
+# Estimativa do planner (atualizada pelo autovacuum/ANALYZE); -1 se a tabela nunca foi analisada
+ESTIMATIVA_EVENTOS = text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'eventos'::regclass")
+
+async def contar_eventos_feed(session: AsyncSession, aproximado: bool = False):
+    if aproximado and (await session.connection()).dialect.name == "postgresql":
+        estimativa = await session.scalar(ESTIMATIVA_EVENTOS)
+        if estimativa is not None and estimativa >= 0:
+            return estimativa
+    return await session.scalar(select(func.count()).select_from(Evento).where(Evento.data_hora.is_not(None)))
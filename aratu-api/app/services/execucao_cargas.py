@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# As cargas rodam num pool de processos próprio, fora do processo da API: o crawler
+# e a gravação dos lotes não disputam o event loop nem o GIL com as requisições.
+_executor = None
+
+def __inicializar_processo():
+    # Prioridade menor que a da API quando as duas disputarem CPU
+    try:
+        os.nice(settings.CARGA_NICE)
+    except (AttributeError, OSError):
+        pass
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.CARGA_MAX_PROCESSOS,
+            mp_context=get_context("spawn"),
+            initializer=__inicializar_processo,
+        )
+    return _executor
+
+def executar_cargas(controle_carga_ids: list):
+    # Roda dentro do processo do pool, com sessões e event loop próprios. As fontes
+    # são carregadas ao mesmo tempo, cada uma com sua sessão e seu ControleCarga:
+    # enquanto uma espera a rede, as outras buscam páginas ou gravam lotes.
+    asyncio.run(__executar_cargas(controle_carga_ids))
+
+async def __executar_cargas(controle_carga_ids: list):
+    resultados = await asyncio.gather(*(__executar_carga(id) for id in controle_carga_ids), return_exceptions=True)
+    for controle_carga_id, resultado in zip(controle_carga_ids, resultados):
+        # A falha de uma fonte não interrompe as outras; ela já fica registrada como ERRO
+        if isinstance(resultado, Exception):
+            logger.error("Carga %s terminou com erro: %s", controle_carga_id, resultado)
+
+async def __executar_carga(controle_carga_id: int):
+    from app.db.base import SessionLocal
+    from app.models.models import ControleCarga
+    from app.services import carga_services
+
+    session = SessionLocal()
+    try:
+        controle_carga = session.get(ControleCarga, controle_carga_id)
+        if controle_carga is None:
+            logger.error("Carga %s não encontrada", controle_carga_id)
+            return
+        await carga_services.executar_carga(session, controle_carga)
+    finally:
+        session.close()
+
+def __ao_terminar(future):
+    if future.exception():
+        logger.error("Cargas terminaram com erro: %s", future.exception())
+
+def enfileirar_cargas(controle_carga_ids: list):
+    future = executor().submit(executar_cargas, controle_carga_ids)
+    future.add_done_callback(__ao_terminar)
+    return future
+
+def encerrar():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,82 @@
+import random
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import Categoria, Evento
+from app.schemas import EventoResponse
+from app.services import usuario_services
+from app.services.cache import GRUPO_EVENTOS, GRUPO_PARTICIPACAO, cache_respostas, grupo_amigos
+from app.services.grafo_amigos import grafo_amigos
+from app.services.recomendacao_services import agendar_recalculo_sem_recomendacoes
+
+# Os carrosséis do feed, usados pelas rotas de cada um e pelo /feed/home. Cada função
+# devolve o JSON dos EventoResponse (lista vazia se não houver eventos), o mesmo que
+# fica no cache: a home junta as listas sem validar nem serializar os eventos de novo,
+# e cada rota decide o que fazer com uma lista vazia.
+
+async def contagens_categorias(session: AsyncSession):
+    # [[nome, qtd_eventos], ...] do catálogo de categorias, sem passar pela tabela de eventos
+    async def calcular():
+        linhas = await session.execute(select(Categoria.nome, Categoria.qtd_eventos).order_by(Categoria.nome))
+        return [[nome, qtd_eventos] for nome, qtd_eventos in linhas]
+
+    return await cache_respostas.obter_ou_calcular("categorias", (), (GRUPO_EVENTOS,), calcular)
+
+async def eventos_da_categoria(session: AsyncSession, categoria: str, limite: int = None):
+    async def calcular():
+        query = select(Evento).where(Evento.categoria.contains([categoria]))
+        if limite:
+            query = query.limit(limite)
+        return [EventoResponse.from_orm(evento) for evento in (await session.scalars(query)).all()]
+
+    return await cache_respostas.obter_ou_calcular("eventos_da_categoria", (categoria, limite), (GRUPO_EVENTOS,), calcular)
+
+async def eventos_populares(session: AsyncSession):
+    async def calcular():
+        # Os mais marcados como "quero ir", pelo contador mantido em eventos (índice qtd_quero_ir, id)
+        eventos = (await session.scalars(
+            select(Evento)
+            .where(Evento.qtd_quero_ir > 0)
+            .order_by(Evento.qtd_quero_ir.desc(), Evento.id.desc())
+            .limit(15)
+        )).all()
+        return [EventoResponse.from_orm(evento) for evento in eventos]
+
+    return await cache_respostas.obter_ou_calcular("feed_populares", (), (GRUPO_EVENTOS, GRUPO_PARTICIPACAO), calcular)
+
+async def eventos_populares_entre_amigos(session: AsyncSession, usuario_id: int):
+    # Sem amigos (o grafo de amizades fica em memória), não há o que consultar
+    if not await grafo_amigos.amigos(session, usuario_id):
+        return []
+
+    async def calcular():
+        eventos = await usuario_services.eventos_populares_entre_amigos(session, usuario_id)
+        return [EventoResponse.from_orm(evento) for evento in eventos]
+
+    # Por usuário, com TTL curto; as ações de amizade e os "quero ir" dos amigos invalidam
+    return await cache_respostas.obter_ou_calcular(
+        "populares_entre_amigos", (usuario_id,), (GRUPO_EVENTOS, grupo_amigos(usuario_id)), calcular, ttl=settings.CACHE_TTL_AMIGOS_SEGUNDOS
+    )
+
+async def eventos_recomendados(session: AsyncSession, usuario_id: int):
+    # Servido do top-K pré-calculado (recomendacao_services). Usuários ainda sem
+    # recomendações (novos, ou antes do primeiro recálculo) recebem os eventos das
+    # suas categorias de interesse e entram na fila de recálculo, no máximo uma vez
+    # a cada RECOMENDACOES_NOVA_TENTATIVA_SEGUNDOS
+    eventos = await usuario_services.eventos_recomendados(session, usuario_id)
+    if not eventos:
+        eventos = await usuario_services.get_eventos_interesse(session, usuario_id)
+        agendar_recalculo_sem_recomendacoes(usuario_id)
+    return jsonable_encoder([EventoResponse.from_orm(evento) for evento in eventos])
+
+async def eventos_de_categoria_aleatoria(session: AsyncSession):
+    # A categoria é sorteada a cada chamada, com peso pela quantidade de eventos;
+    # o catálogo de categorias e os eventos de cada uma vêm do cache
+    contagens = await contagens_categorias(session)
+    if not contagens:
+        return []
+    nomes, pesos = zip(*contagens)
+    return await eventos_da_categoria(session, random.choices(nomes, weights=pesos)[0], limite=15)
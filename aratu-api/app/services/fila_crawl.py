@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.models.models import ControleCarga, TarefaCrawl
+from app.services import carga_services
+from app.services.cliente_http import PoliticaRetry
+from app.services.fontes_eventos import obter_fonte
+
+# Espera antes de repetir uma tarefa que falhou, com jitter, limitada à visibilidade
+politica_retry = PoliticaRetry(base=2.0, maximo=settings.CRAWL_VISIBILIDADE_SEGUNDOS)
+
+def separar_cidade(cidade: str):
+    # "Recife/PE" -> ("Recife", "PE")
+    nome, _, estado = cidade.rpartition("/")
+    if not nome or not estado:
+        raise ValueError(f"Cidade inválida: {cidade!r}, use o formato Cidade/UF")
+    return nome.strip(), estado.strip().upper()
+
+def __inserir_tarefas(session, tarefas: List[dict]):
+    # Páginas já enfileiradas (por outro worker, por exemplo) são ignoradas
+    if not tarefas:
+        return
+    agora = datetime.now()
+    for tarefa in tarefas:
+        tarefa.update(status="PENDENTE", tentativas=0, visivel_em=agora, atualizado_em=agora)
+    session.execute(insert(TarefaCrawl.__table__).values(tarefas).on_conflict_do_nothing(constraint="uq_tarefas_crawl_pagina"))
+
+def enfileirar_crawl(session, fonte: str, cidades: List[str] = None):
+    '''Cria o ControleCarga da execução e uma tarefa para a primeira página de cada
+    passada da fonte em cada cidade. As demais páginas são enfileiradas pelo worker
+    que processar a primeira, quando o total de páginas for conhecido.
+
+    Devolve None, sem enfileirar nada, se a fonte já tem uma carga em andamento.'''
+    cidades = [separar_cidade(cidade) for cidade in (cidades or settings.CRAWL_CIDADES)]
+    controle_carga = carga_services.iniciar_carga(session, fonte, "COMPLETA")
+    if controle_carga is None:
+        return None
+
+    __inserir_tarefas(session, [
+        dict(controle_carga_id=controle_carga.id, fonte=fonte, cidade=cidade, estado=estado, passada=passada, pagina=1)
+        for cidade, estado in cidades
+        for passada in obter_fonte(fonte).passadas()
+    ])
+    session.commit()
+    return controle_carga
+
+def reivindicar_tarefas(session, limite: int = 1):
+    '''Pega até `limite` tarefas disponíveis com FOR UPDATE SKIP LOCKED, de modo que
+    workers concorrentes nunca peguem a mesma, e as torna invisíveis por
+    CRAWL_VISIBILIDADE_SEGUNDOS. Tarefas EM_EXECUCAO cuja visibilidade expirou são
+    de workers que morreram e voltam a ser distribuídas.
+
+    As tarefas são devolvidas desligadas da sessão, como um retrato da reivindicação:
+    concluir_tarefa e falhar_tarefa só alteram a linha se ninguém a reivindicou depois.'''
+    agora = datetime.now()
+    tarefas = session.execute(
+        select(TarefaCrawl)
+        .where(TarefaCrawl.status.in_(("PENDENTE", "EM_EXECUCAO")), TarefaCrawl.visivel_em <= agora)
+        .order_by(TarefaCrawl.id)
+        .limit(limite)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    reivindicadas = []
+    for tarefa in tarefas:
+        tarefa.atualizado_em = agora
+        if tarefa.tentativas >= settings.CRAWL_MAX_TENTATIVAS:
+            tarefa.status = "ERRO"
+            tarefa.erro = tarefa.erro or "Visibilidade expirada na última tentativa"
+            continue
+        tarefa.status = "EM_EXECUCAO"
+        tarefa.tentativas += 1
+        tarefa.visivel_em = agora + timedelta(seconds=settings.CRAWL_VISIBILIDADE_SEGUNDOS)
+        reivindicadas.append(tarefa)
+    session.commit()
+
+    for tarefa in reivindicadas:
+        session.refresh(tarefa)
+        session.expunge(tarefa)
+    for controle_carga_id in {tarefa.controle_carga_id for tarefa in tarefas if tarefa not in reivindicadas}:
+        finalizar_carga_se_concluida(session, controle_carga_id)
+    return reivindicadas
+
+def __da_reivindicacao(tarefa: TarefaCrawl):
+    # A linha ainda é desta reivindicação (não expirou nem foi pega por outro worker)
+    return (TarefaCrawl.id == tarefa.id, TarefaCrawl.tentativas == tarefa.tentativas, TarefaCrawl.status == "EM_EXECUCAO")
+
+def concluir_tarefa(session, tarefa: TarefaCrawl, total_paginas: int, qtd_eventos: int):
+    '''Marca a tarefa como concluída, enfileira as páginas seguintes (se for a
+    primeira página da passada) e soma o progresso no ControleCarga, tudo na
+    mesma transação dos eventos gravados.'''
+    # Se a visibilidade expirou e outro worker já pegou a tarefa, esta execução
+    # é só uma duplicata: os eventos gravados são idempotentes e nada mais muda
+    concluida = session.execute(
+        update(TarefaCrawl)
+        .where(*__da_reivindicacao(tarefa))
+        .values(status="CONCLUIDA", erro=None, atualizado_em=datetime.now())
+    ).rowcount
+    if not concluida:
+        session.commit()
+        return
+
+    if tarefa.pagina == 1:
+        __inserir_tarefas(session, [
+            dict(controle_carga_id=tarefa.controle_carga_id, fonte=tarefa.fonte, cidade=tarefa.cidade, estado=tarefa.estado, passada=tarefa.passada, pagina=pagina)
+            for pagina in range(2, total_paginas + 1)
+        ])
+
+    session.execute(
+        update(ControleCarga)
+        .where(ControleCarga.id == tarefa.controle_carga_id)
+        .values(qtd_paginas=ControleCarga.qtd_paginas + 1, qtd_sucesso=ControleCarga.qtd_sucesso + qtd_eventos)
+    )
+    session.commit()
+    finalizar_carga_se_concluida(session, tarefa.controle_carga_id)
+
+def falhar_tarefa(session, tarefa: TarefaCrawl, erro: Exception):
+    # Volta para a fila com backoff, ou vira ERRO na última tentativa
+    agora = datetime.now()
+    valores = dict(erro=f"{type(erro).__name__}: {erro}", atualizado_em=agora)
+    if tarefa.tentativas >= settings.CRAWL_MAX_TENTATIVAS:
+        valores.update(status="ERRO")
+    else:
+        valores.update(status="PENDENTE", visivel_em=agora + timedelta(seconds=politica_retry.espera(tarefa.tentativas)))
+    session.execute(update(TarefaCrawl).where(*__da_reivindicacao(tarefa)).values(**valores))
+    session.commit()
+    finalizar_carga_se_concluida(session, tarefa.controle_carga_id)
+
+def finalizar_carga_se_concluida(session, controle_carga_id: int):
+    # A carga termina quando não há mais tarefas pendentes ou em execução
+    contagem = dict(session.execute(
+        select(TarefaCrawl.status, func.count())
+        .where(TarefaCrawl.controle_carga_id == controle_carga_id)
+        .group_by(TarefaCrawl.status)
+    ).all())
+    if contagem.get("PENDENTE") or contagem.get("EM_EXECUCAO"):
+        return
+
+    # Só quem de fato encerrou a carga roda o pós-carga: dois workers terminando as
+    # últimas tarefas ao mesmo tempo chegam aqui, mas só um muda o status
+    finalizada = session.execute(
+        update(ControleCarga)
+        .where(ControleCarga.id == controle_carga_id, ControleCarga.status == "EM_PROGRESSO")
+        .values(status="ERRO" if contagem.get("ERRO") else "SUCESSO", fim_exec=datetime.now())
+    ).rowcount
+    session.commit()
+    if finalizada:
+        carga_services.pos_carga(session, controle_carga_id)
@@ -0,0 +1,87 @@
+import importlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import AsyncIterator, List, Tuple
+
+from app.services.cliente_http import ClienteHttp
+
+# Módulos que registram fontes ao serem importados. Uma fonte nova é um módulo
+# com uma subclasse de FonteEventos decorada com @registrar_fonte, listado aqui.
+MODULOS_FONTES = [
+    "app.services.crowler_sympla",
+]
+
+class FonteEventos(ABC):
+    '''Adaptador de uma fonte externa de eventos.
+
+    Cada fonte sabe buscar seus eventos (em lotes, opcionalmente restritos a uma
+    janela de datas), contar quantos existem numa janela, converter um evento da
+    sua API para as colunas da tabela eventos e criar o cliente HTTP com a sua
+    própria política de taxa e de retry. As janelas de datas e a frequência da
+    reconciliação completa também são da fonte.
+
+    Para o crawler distribuído, a fonte divide a busca de uma cidade em passadas
+    (por exemplo, todos os eventos, só os gratuitos e uma por categoria) e sabe
+    buscar uma página isolada de uma passada.
+
+    Os métodos são abstratos: uma fonte incompleta falha já no @registrar_fonte,
+    que a instancia na importação, e não no meio de uma carga.'''
+
+    nome: str = None
+    janela_dias: int = 7
+    horizonte_dias: int = 180
+    reconciliacao_horas: int = 168
+
+    @abstractmethod
+    def novo_cliente(self) -> ClienteHttp:
+        ...
+
+    @abstractmethod
+    async def contar(self, client: ClienteHttp, start_date=None, end_date=None) -> int:
+        ...
+
+    async def assinar_janela(self, client: ClienteHttp, start_date, end_date) -> Tuple[int, str]:
+        # Total da janela e uma assinatura que muda quando o conteúdo dela muda; a carga
+        # incremental só percorre as janelas cuja assinatura mudou. Sem nada melhor, só o
+        # total: fontes que trazem a primeira página ou uma data de atualização na mesma
+        # requisição devem incluí-las
+        total = await self.contar(client, start_date, end_date)
+        return total, str(total)
+
+    @abstractmethod
+    def aiter_lotes(self, client: ClienteHttp, start_date=None, end_date=None, progresso: Counter = None) -> AsyncIterator[List[dict]]:
+        ...
+
+    @abstractmethod
+    def normalizar(self, evento_api: dict) -> dict:
+        ...
+
+    @abstractmethod
+    def passadas(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    async def buscar_pagina(self, client: ClienteHttp, cidade: str, estado: str, passada: str, pagina: int) -> Tuple[List[dict], int]:
+        # Eventos da página, no formato que normalizar espera, e o total de páginas da passada
+        ...
+
+_fontes = {}
+
+def registrar_fonte(classe):
+    fonte = classe()
+    _fontes[fonte.nome] = fonte
+    return classe
+
+def __carregar_fontes():
+    for modulo in MODULOS_FONTES:
+        importlib.import_module(modulo)
+
+def fontes_registradas():
+    __carregar_fontes()
+    return list(_fontes)
+
+def obter_fonte(nome: str) -> FonteEventos:
+    __carregar_fontes()
+    if nome not in _fontes:
+        raise KeyError(f"Fonte de eventos desconhecida: {nome}")
+    return _fontes[nome]
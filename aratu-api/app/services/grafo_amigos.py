@@ -0,0 +1,37 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import amigos_association
+from app.services.cache import CacheMemoria
+
+# Cópia em memória do grafo de amizades: os amigos de cada usuário e, no sentido
+# inverso, quem tem o usuário como amigo (os "seguidores", pelo índice
+# ix_amigos_amigo_id). Os seguidores dizem de quem é o feed de amigos que muda quando
+# um usuário marca um evento. As ações de amizade invalidam as entradas afetadas; as
+# escritas feitas por outros processos aparecem ao fim de GRAFO_AMIGOS_TTL_SEGUNDOS.
+
+class GrafoAmigos:
+    def __init__(self, maximo: int):
+        self._entradas = CacheMemoria(maximo)
+
+    async def __vizinhos(self, session: AsyncSession, chave: str, coluna, vizinho, usuario_id: int):
+        vizinhos = await self._entradas.obter(chave)
+        if vizinhos is None:
+            vizinhos = frozenset(await session.scalars(select(vizinho).where(coluna == usuario_id)))
+            await self._entradas.guardar(chave, vizinhos, settings.GRAFO_AMIGOS_TTL_SEGUNDOS)
+        return vizinhos
+
+    async def amigos(self, session: AsyncSession, usuario_id: int):
+        return await self.__vizinhos(session, f"amigos:{usuario_id}", amigos_association.c.usuario_id, amigos_association.c.amigo_id, usuario_id)
+
+    async def seguidores(self, session: AsyncSession, usuario_id: int):
+        return await self.__vizinhos(session, f"seguidores:{usuario_id}", amigos_association.c.amigo_id, amigos_association.c.usuario_id, usuario_id)
+
+    def invalidar(self, usuario_id: int, amigos_ids):
+        # usuario_id ganhou ou perdeu amigos_ids
+        self._entradas.remover(f"amigos:{usuario_id}")
+        for amigo_id in amigos_ids:
+            self._entradas.remover(f"seguidores:{amigo_id}")
+
+grafo_amigos = GrafoAmigos(settings.GRAFO_AMIGOS_MAXIMO)
@@ -0,0 +1,312 @@
+import fcntl
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.models.models import ControleCarga, Evento
+
+logger = logging.getLogger(__name__)
+
+# Índice de similaridade por conteúdo: um vetor TF-IDF esparso por evento, sobre
+# nome, descrição, organizador e local, para achar eventos parecidos com um evento
+# novo, que ainda não tem marcações (ver coocorrencia_eventos para o sinal de uso).
+#
+# O texto é dobrado (minúsculas, sem acentos), as stopwords do português saem e os
+# plurais são reduzidos ao singular. O índice guarda as frequências em forma CSR
+# (evento x termo) num .npz em INDICE_TEXTUAL_ARQUIVO; o IDF e a normalização são
+# calculados ao carregar.
+#
+# As cargas e o CRUD de eventos atualizam o arquivo só com os eventos alterados,
+# sob uma trava de arquivo (vários processos gravam); os processos da API recarregam
+# o arquivo quando ele muda. Eventos que terminaram há mais de
+# INDICE_TEXTUAL_DIAS_PASSADOS dias saem do índice.
+
+PESOS_CAMPOS = dict(nome=3, organizador=2, local=1, descricao=1)
+TERMOS_CONSULTA = 30  # termos de maior peso do evento usados na busca
+
+STOPWORDS = frozenset("""
+    a ao aos aquela aquelas aquele aqueles as ate com como contra da das de dela dele
+    deles depois do dos e ela elas ele eles em entre era essa essas esse esses esta
+    estas este estes eu foi for ha isso isto ja la mais mas me mesmo muito na nao nas
+    nem no nos nossa nosso num numa o os ou para pela pelas pelo pelos por pra qual
+    quando que quem sao se sem ser seu seus so sua suas tambem te tem todo todos toda
+    todas tu um uma umas uns voce voces vai vem via dia dias hora horas partir local
+    evento eventos
+""".split())
+
+# Plural -> singular, na ordem em que são testados
+SUFIXOS_PLURAL = (("coes", "cao"), ("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ois", "ol"), ("ns", "m"), ("res", "r"), ("zes", "z"))
+
+_TAGS = re.compile(r"<[^>]+>")
+_PALAVRAS = re.compile(r"[a-z0-9]+")
+
+def dobrar(texto: str) -> str:
+    return unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode()
+
+def radical(palavra: str) -> str:
+    if len(palavra) <= 4:
+        return palavra
+    for sufixo, troca in SUFIXOS_PLURAL:
+        if palavra.endswith(sufixo):
+            return palavra[:-len(sufixo)] + troca
+    if palavra.endswith("s") and not palavra.endswith(("ss", "us", "is")):
+        return palavra[:-1]
+    return palavra
+
+def termos(texto: str):
+    for palavra in _PALAVRAS.findall(dobrar(_TAGS.sub(" ", texto or ""))):
+        if len(palavra) > 2 and not palavra.isdigit() and palavra not in STOPWORDS:
+            yield radical(palavra)
+
+def frequencias(evento) -> Counter:
+    # Frequência de cada termo no evento, com o peso do campo em que aparece
+    contagem = Counter()
+    for campo, peso in PESOS_CAMPOS.items():
+        for termo in termos(getattr(evento, campo)):
+            contagem[termo] += peso
+    return contagem
+
+class IndiceTextual:
+    '''Um índice imutável: as alterações criam um índice novo (com_alteracoes), que
+    substitui o anterior de uma vez, sem travar as consultas em andamento.'''
+
+    def __init__(self, termos=(), ids=None, data_hora=None, indptr=None, termos_ids=None, contagens=None):
+        self.termos = list(termos)
+        self.ids = ids if ids is not None else np.zeros(0, dtype=np.int64)
+        self.data_hora = data_hora if data_hora is not None else np.zeros(0, dtype="datetime64[s]")
+        self.indptr = indptr if indptr is not None else np.zeros(1, dtype=np.int64)
+        self.termos_ids = termos_ids if termos_ids is not None else np.zeros(0, dtype=np.int32)
+        self.contagens = contagens if contagens is not None else np.zeros(0, dtype=np.uint16)
+        self.__preparar()
+
+    def __preparar(self):
+        self.posicoes = {evento_id: posicao for posicao, evento_id in enumerate(self.ids.tolist())}
+        self.vocabulario = {termo: indice for indice, termo in enumerate(self.termos)}
+
+        # idf suavizado e tf sublinear; cada linha fica com norma 1
+        documentos = len(self.ids)
+        df = np.bincount(self.termos_ids, minlength=len(self.termos))
+        self.idf = (np.log((1 + documentos) / (1 + df)) + 1).astype(np.float32)
+        self.pesos = (1 + np.log(self.contagens.astype(np.float32))) * self.idf[self.termos_ids] if len(self.contagens) else np.zeros(0, dtype=np.float32)
+        linhas = np.repeat(np.arange(documentos), np.diff(self.indptr))
+        normas = np.sqrt(np.bincount(linhas, weights=self.pesos ** 2, minlength=documentos))
+        if len(self.pesos):
+            self.pesos /= np.maximum(normas[linhas], 1e-9)
+
+        # Índice invertido (termo -> eventos), para a busca não percorrer todos os eventos
+        ordem = np.argsort(self.termos_ids, kind="stable")
+        self.invertido_eventos = linhas[ordem]
+        self.invertido_pesos = self.pesos[ordem]
+        self.invertido_indptr = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def vetor(self, evento):
+        '''Termos e pesos normalizados de um evento (que pode não estar no índice).'''
+        contagem = {self.vocabulario[termo]: quantidade for termo, quantidade in frequencias(evento).items() if termo in self.vocabulario}
+        if not contagem:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        termos_ids = np.fromiter(contagem, dtype=np.int32, count=len(contagem))
+        pesos = (1 + np.log(np.fromiter(contagem.values(), dtype=np.float32, count=len(contagem)))) * self.idf[termos_ids]
+        return termos_ids, pesos / max(float(np.linalg.norm(pesos)), 1e-9)
+
+    def vetor_do_evento(self, evento_id: int):
+        posicao = self.posicoes.get(evento_id)
+        if posicao is None:
+            return None
+        inicio, fim = self.indptr[posicao], self.indptr[posicao + 1]
+        return self.termos_ids[inicio:fim], self.pesos[inicio:fim]
+
+    def similares(self, vetor, limite: int, excluir: int = None, somente_futuros: bool = True):
+        '''Os eventos de maior cosseno com o vetor: [(evento_id, similaridade)].'''
+        termos_ids, pesos = vetor
+        if not len(termos_ids) or not len(self.ids):
+            return []
+        if len(termos_ids) > TERMOS_CONSULTA:
+            maiores = np.argpartition(-pesos, TERMOS_CONSULTA - 1)[:TERMOS_CONSULTA]
+            termos_ids, pesos = termos_ids[maiores], pesos[maiores]
+
+        # Produto escalar só com os eventos que têm algum dos termos
+        inicios, fins = self.invertido_indptr[termos_ids], self.invertido_indptr[termos_ids + 1]
+        fatias = [np.arange(inicio, fim) for inicio, fim in zip(inicios.tolist(), fins.tolist())]
+        entradas = np.concatenate(fatias)
+        pesos_consulta = np.repeat(pesos, fins - inicios)
+        scores = np.bincount(self.invertido_eventos[entradas], weights=self.invertido_pesos[entradas] * pesos_consulta, minlength=len(self.ids))
+
+        if excluir in self.posicoes:
+            scores[self.posicoes[excluir]] = 0
+        if somente_futuros:
+            scores[self.data_hora < np.datetime64(datetime.now(), "s")] = 0
+        candidatos = np.flatnonzero(scores > 0)
+        if len(candidatos) > limite:
+            candidatos = candidatos[np.argpartition(-scores[candidatos], limite - 1)[:limite]]
+        candidatos = candidatos[np.argsort(-scores[candidatos], kind="stable")]
+        return [(int(self.ids[posicao]), round(float(scores[posicao]), 4)) for posicao in candidatos]
+
+    def com_alteracoes(self, eventos=(), removidos=(), corte: datetime = None):
+        '''Índice novo com os eventos (re)indexados, sem os removidos e sem os que
+        terminaram antes de corte. Os termos que deixam de ser usados saem do vocabulário.'''
+        eventos = list(eventos)
+        sair = np.isin(self.ids, np.array([evento.id for evento in eventos] + list(removidos), dtype=np.int64))
+        if corte is not None:
+            sair |= self.data_hora < np.datetime64(corte, "s")
+        manter = np.flatnonzero(~sair)
+
+        tamanhos = np.diff(self.indptr)[manter]
+        entradas = np.flatnonzero(~np.repeat(sair, np.diff(self.indptr)))
+        termos_ids = [self.termos_ids[entradas]]
+        contagens = [self.contagens[entradas]]
+        vocabulario = dict(self.vocabulario)
+        novos_termos = list(self.termos)
+        novos_tamanhos = []
+        for evento in eventos:
+            contagem = frequencias(evento)
+            for termo in contagem:
+                if termo not in vocabulario:
+                    vocabulario[termo] = len(novos_termos)
+                    novos_termos.append(termo)
+            termos_ids.append(np.array([vocabulario[termo] for termo in contagem], dtype=np.int32))
+            contagens.append(np.minimum(np.array(list(contagem.values()), dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16))
+            novos_tamanhos.append(len(contagem))
+
+        termos_ids = np.concatenate(termos_ids).astype(np.int32)
+        usados = np.unique(termos_ids)
+        return IndiceTextual(
+            termos=[novos_termos[indice] for indice in usados.tolist()],
+            ids=np.concatenate((self.ids[manter], np.array([evento.id for evento in eventos], dtype=np.int64))),
+            data_hora=np.concatenate((self.data_hora[manter], np.array([evento.data_hora or "NaT" for evento in eventos], dtype="datetime64[s]"))),
+            indptr=np.concatenate(([0], np.cumsum(np.concatenate((tamanhos, novos_tamanhos))))).astype(np.int64),
+            termos_ids=np.searchsorted(usados, termos_ids).astype(np.int32),
+            contagens=np.concatenate(contagens).astype(np.uint16),
+        )
+
+    def salvar(self, caminho: str):
+        # Grava ao lado e troca de nome: quem lê nunca vê um arquivo pela metade
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, "wb") as arquivo:
+            np.savez_compressed(
+                arquivo,
+                termos=np.frombuffer("\n".join(self.termos).encode(), dtype=np.uint8),
+                ids=self.ids,
+                data_hora=self.data_hora,
+                indptr=self.indptr,
+                termos_ids=self.termos_ids,
+                contagens=self.contagens,
+            )
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho: str):
+        if not os.path.exists(caminho):
+            return cls()
+        with np.load(caminho, allow_pickle=False) as dados:
+            termos = dados["termos"].tobytes().decode()
+            return cls(
+                termos=termos.split("\n") if termos else [],
+                ids=dados["ids"],
+                data_hora=dados["data_hora"],
+                indptr=dados["indptr"],
+                termos_ids=dados["termos_ids"],
+                contagens=dados["contagens"],
+            )
+
+@contextmanager
+def __trava_arquivo():
+    # Serializa as gravações do índice entre processos (cargas, workers, API)
+    os.makedirs(os.path.dirname(settings.INDICE_TEXTUAL_ARQUIVO) or ".", exist_ok=True)
+    with open(settings.INDICE_TEXTUAL_ARQUIVO + ".lock", "w") as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+_indice = IndiceTextual()
+_versao_arquivo = None
+_verificado_em = None
+_lock = threading.Lock()
+
+def __versao(caminho: str):
+    try:
+        estado = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return estado.st_mtime_ns, estado.st_size
+
+def indice_atual():
+    '''O índice deste processo, recarregado do arquivo quando outro processo o
+    atualizou (verificado no máximo a cada INDICE_TEXTUAL_VERIFICACAO_SEGUNDOS).'''
+    global _indice, _versao_arquivo, _verificado_em
+    if _verificado_em is not None and time.monotonic() - _verificado_em < settings.INDICE_TEXTUAL_VERIFICACAO_SEGUNDOS:
+        return _indice
+    with _lock:
+        _verificado_em = time.monotonic()
+        versao = __versao(settings.INDICE_TEXTUAL_ARQUIVO)
+        if versao != _versao_arquivo:
+            _indice = IndiceTextual.carregar(settings.INDICE_TEXTUAL_ARQUIVO)
+            _versao_arquivo = versao
+    return _indice
+
+COLUNAS_TEXTO = (Evento.id, Evento.nome, Evento.descricao, Evento.organizador, Evento.local, Evento.data_hora)
+
+def atualizar_indice_textual(session, *condicoes, removidos=(), completo: bool = False):
+    '''Reindexa os eventos que atendem às condições (ex.: Evento.atualizado_em >=
+    início da carga) e tira os removidos, partindo do arquivo atual. Com completo,
+    ignora as condições e reconstrói o índice a partir de todos os eventos.'''
+    global _indice, _versao_arquivo
+    corte = datetime.now() - timedelta(days=settings.INDICE_TEXTUAL_DIAS_PASSADOS)
+    with __trava_arquivo():
+        base = IndiceTextual() if completo else IndiceTextual.carregar(settings.INDICE_TEXTUAL_ARQUIVO)
+        eventos = []
+        if completo or condicoes:
+            consulta = select(*COLUNAS_TEXTO).where(*(() if completo else condicoes), (Evento.data_hora >= corte) | Evento.data_hora.is_(None))
+            eventos = session.execute(consulta.execution_options(yield_per=1000)).all()
+        indice = base.com_alteracoes(eventos, removidos, corte)
+        indice.salvar(settings.INDICE_TEXTUAL_ARQUIVO)
+        with _lock:
+            _indice, _versao_arquivo = indice, __versao(settings.INDICE_TEXTUAL_ARQUIVO)
+    return len(eventos)
+
+def atualizar_apos_carga(session, controle_carga_id: int, completo: bool = False):
+    # Os eventos gravados pela carga (atualizado_em só muda quando o conteúdo muda);
+    # uma falha aqui não derruba a carga, e a próxima carga completa reconstrói o índice
+    inicio_carga = select(ControleCarga.inic_exec).where(ControleCarga.id == controle_carga_id).scalar_subquery()
+    try:
+        atualizar_indice_textual(session, Evento.atualizado_em >= inicio_carga, completo=completo)
+    except Exception:
+        session.rollback()
+        logger.exception("Falha ao atualizar o índice textual após a carga %s", controle_carga_id)
+
+# Alterações do CRUD de eventos, gravadas fora da requisição
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="indice-textual")
+
+def __atualizar_eventos(eventos_ids, removidos):
+    try:
+        with SessionLocal() as session:
+            atualizar_indice_textual(session, *([Evento.id.in_(eventos_ids)] if eventos_ids else []), removidos=removidos)
+    except Exception:
+        logger.exception("Falha ao atualizar o índice textual")
+
+def agendar_atualizacao(eventos_ids=(), removidos=()):
+    _executor.submit(__atualizar_eventos, list(eventos_ids), list(removidos))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as session:
+        inicio = time.perf_counter()
+        quantidade = atualizar_indice_textual(session, completo=True)
+        print(f"Índice textual com {quantidade} eventos em {settings.INDICE_TEXTUAL_ARQUIVO} ({time.perf_counter() - inicio:.1f}s)")
@@ -0,0 +1,230 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List
+
+import numpy as np
+from sqlalchemy import delete, insert, select, union_all
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.models.models import Evento, Recomendacao, Usuario, amigos_association, usuarios_eventos_foram, usuarios_eventos_querem_ir
+
+logger = logging.getLogger(__name__)
+
+# Recomendações pré-calculadas: para cada usuário, os RECOMENDACOES_TOP_K próximos
+# eventos de maior score ficam na tabela recomendacoes, e o feed "recomendados para
+# você" é uma leitura dela pela chave primária (usuario_id, posicao).
+#
+# O score de um evento para um usuário combina, com os pesos RECOMENDACOES_PESO_*:
+#   categorias:   cosseno entre as categorias do evento e o perfil do usuário (as
+#                 categorias de interesse e as dos eventos que ele marcou)
+#   amigos:       quantos amigos querem ir, com saturação (1 - 0.5^n)
+#   popularidade: log(1 + qtd_quero_ir), relativo ao evento mais popular
+#   proximidade:  meia-vida de RECOMENDACOES_MEIA_VIDA_DIAS até a data do evento
+# Eventos que o usuário já marcou ficam de fora.
+#
+# O recálculo completo roda ao fim das cargas (e pelo /interno ou por
+# python -m app.services.recomendacao_services); as ações do usuário (interesses,
+# quero ir/fui, amizades) agendam o recálculo só dele, numa thread à parte.
+
+LOTE_USUARIOS = 500
+
+class ContextoRecomendacao:
+    '''Os eventos candidatos (de agora até RECOMENDACOES_HORIZONTE_DIAS) em forma
+    vetorial, compartilhados pelo cálculo de todos os usuários.'''
+
+    def __init__(self, session, agora: datetime = None):
+        agora = agora or datetime.now()
+        linhas = session.execute(
+            select(Evento.id, Evento.categoria, Evento.qtd_quero_ir, Evento.data_hora)
+            .where(Evento.data_hora >= agora, Evento.data_hora < agora + timedelta(days=settings.RECOMENDACOES_HORIZONTE_DIAS))
+        ).all()
+
+        self.ids = np.array([linha.id for linha in linhas], dtype=np.int64)
+        self.posicoes = {evento_id: posicao for posicao, evento_id in enumerate(self.ids.tolist())}
+        self.categorias = {categoria: coluna for coluna, categoria in enumerate(sorted({c for linha in linhas for c in linha.categoria or []}))}
+
+        # Uma linha por evento, normalizada: o produto com o perfil já é o cosseno
+        self.matriz_categorias = np.zeros((len(linhas), len(self.categorias)), dtype=np.float32)
+        for posicao, linha in enumerate(linhas):
+            for categoria in set(linha.categoria or []):
+                self.matriz_categorias[posicao, self.categorias[categoria]] = 1.0
+        normas = np.linalg.norm(self.matriz_categorias, axis=1, keepdims=True)
+        self.matriz_categorias /= np.maximum(normas, 1.0)
+
+        popularidade = np.log1p(np.array([linha.qtd_quero_ir or 0 for linha in linhas], dtype=np.float32))
+        self.popularidade = popularidade / max(float(popularidade.max(initial=0.0)), 1.0)
+
+        dias = np.array([(linha.data_hora - agora).total_seconds() / 86400 for linha in linhas], dtype=np.float32)
+        self.proximidade = np.power(0.5, dias / settings.RECOMENDACOES_MEIA_VIDA_DIAS, dtype=np.float32)
+
+        self.criado_em = time.monotonic()
+
+    def posicoes_de(self, eventos_ids):
+        return np.array([self.posicoes[evento_id] for evento_id in eventos_ids if evento_id in self.posicoes], dtype=np.int64)
+
+    def perfil(self, categorias_interesse, categorias_marcadas):
+        # Interesses declarados pesam 1; cada categoria de um evento marcado, 0.5
+        perfil = np.zeros(len(self.categorias), dtype=np.float32)
+        for categoria in categorias_interesse or []:
+            if categoria in self.categorias:
+                perfil[self.categorias[categoria]] += 1.0
+        for categoria in categorias_marcadas:
+            if categoria in self.categorias:
+                perfil[self.categorias[categoria]] += 0.5
+        return perfil / max(float(np.linalg.norm(perfil)), 1e-9)
+
+    def pontuar(self, perfil, eventos_amigos, eventos_marcados):
+        '''Scores de todos os eventos candidatos para um usuário. eventos_amigos tem
+        um id por amigo que quer ir (com repetição); eventos_marcados são excluídos.'''
+        amigos = np.bincount(self.posicoes_de(eventos_amigos), minlength=len(self.ids)).astype(np.float32)
+        score = (
+            settings.RECOMENDACOES_PESO_CATEGORIAS * (self.matriz_categorias @ perfil)
+            + settings.RECOMENDACOES_PESO_AMIGOS * (1.0 - np.power(0.5, amigos))
+            + settings.RECOMENDACOES_PESO_POPULARIDADE * self.popularidade
+            + settings.RECOMENDACOES_PESO_PROXIMIDADE * self.proximidade
+        )
+        score[self.posicoes_de(eventos_marcados)] = -np.inf
+        return score
+
+    def melhores(self, score, k: int):
+        # Os k maiores sem ordenar todos os eventos
+        validos = np.flatnonzero(np.isfinite(score))
+        if len(validos) > k:
+            validos = validos[np.argpartition(-score[validos], k - 1)[:k]]
+        ordem = validos[np.argsort(-score[validos], kind="stable")]
+        return self.ids[ordem], score[ordem]
+
+_contexto = None
+_lock_contexto = threading.Lock()
+
+def contexto_atual(session, renovar: bool = False):
+    # O recálculo de um usuário reaproveita o contexto por RECOMENDACOES_CONTEXTO_TTL_SEGUNDOS
+    global _contexto
+    with _lock_contexto:
+        if renovar or _contexto is None or time.monotonic() - _contexto.criado_em > settings.RECOMENDACOES_CONTEXTO_TTL_SEGUNDOS:
+            _contexto = ContextoRecomendacao(session)
+        return _contexto
+
+def __agrupar(linhas):
+    grupos = defaultdict(list)
+    for chave, valor in linhas:
+        grupos[chave].append(valor)
+    return grupos
+
+def __dados_dos_usuarios(session, usuarios_ids: List[int]):
+    interesses = dict(session.execute(select(Usuario.id, Usuario.categorias_interesse).where(Usuario.id.in_(usuarios_ids))).all())
+
+    marcacoes = union_all(
+        select(usuarios_eventos_querem_ir.c.usuario_id, usuarios_eventos_querem_ir.c.evento_id).where(usuarios_eventos_querem_ir.c.usuario_id.in_(usuarios_ids)),
+        select(usuarios_eventos_foram.c.usuario_id, usuarios_eventos_foram.c.evento_id).where(usuarios_eventos_foram.c.usuario_id.in_(usuarios_ids)),
+    ).subquery()
+    marcados = session.execute(
+        select(marcacoes.c.usuario_id, marcacoes.c.evento_id, Evento.categoria).join(Evento, Evento.id == marcacoes.c.evento_id)
+    ).all()
+    eventos_marcados = __agrupar((usuario_id, evento_id) for usuario_id, evento_id, _ in marcados)
+    categorias_marcadas = __agrupar((usuario_id, categoria) for usuario_id, _, categorias in marcados for categoria in categorias or [])
+
+    # O que os amigos de cada usuário querem ir, num único join
+    eventos_amigos = __agrupar(session.execute(
+        select(amigos_association.c.usuario_id, usuarios_eventos_querem_ir.c.evento_id)
+        .join(usuarios_eventos_querem_ir, usuarios_eventos_querem_ir.c.usuario_id == amigos_association.c.amigo_id)
+        .where(amigos_association.c.usuario_id.in_(usuarios_ids))
+    ).all())
+
+    return interesses, eventos_marcados, categorias_marcadas, eventos_amigos
+
+def recalcular_recomendacoes(session, usuarios_ids: List[int] = None, contexto: ContextoRecomendacao = None):
+    '''Recalcula e grava o top-K dos usuários (todos, se usuarios_ids for None),
+    em lotes de LOTE_USUARIOS, cada um na sua transação.'''
+    if usuarios_ids is None:
+        contexto = contexto or contexto_atual(session, renovar=True)
+        usuarios_ids = session.scalars(select(Usuario.id).where(Usuario.ativo.is_not(False)).order_by(Usuario.id)).all()
+    contexto = contexto or contexto_atual(session)
+
+    for inicio in range(0, len(usuarios_ids), LOTE_USUARIOS):
+        lote = usuarios_ids[inicio:inicio + LOTE_USUARIOS]
+        interesses, eventos_marcados, categorias_marcadas, eventos_amigos = __dados_dos_usuarios(session, lote)
+        agora = datetime.now()
+        linhas = []
+        for usuario_id in lote:
+            if usuario_id not in interesses:
+                continue
+            perfil = contexto.perfil(interesses[usuario_id], categorias_marcadas.get(usuario_id, []))
+            score = contexto.pontuar(perfil, eventos_amigos.get(usuario_id, []), eventos_marcados.get(usuario_id, []))
+            ids, scores = contexto.melhores(score, settings.RECOMENDACOES_TOP_K)
+            linhas.extend(
+                dict(usuario_id=usuario_id, posicao=posicao, evento_id=int(evento_id), score=float(valor), calculado_em=agora)
+                for posicao, (evento_id, valor) in enumerate(zip(ids, scores), start=1)
+            )
+
+        session.execute(delete(Recomendacao).where(Recomendacao.usuario_id.in_(lote)))
+        if linhas:
+            session.execute(insert(Recomendacao), linhas)
+        session.commit()
+
+    return len(usuarios_ids)
+
+# Recálculos agendados pelas ações dos usuários: um por vez, numa thread, juntando os
+# usuários que chegarem enquanto outro recálculo roda
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recomendacoes")
+_pendentes = set()
+_lock_pendentes = threading.Lock()
+
+def __recalcular_pendentes():
+    with _lock_pendentes:
+        usuarios_ids = sorted(_pendentes)
+        _pendentes.clear()
+    if not usuarios_ids:
+        return
+    try:
+        with SessionLocal() as session:
+            recalcular_recomendacoes(session, usuarios_ids)
+    except Exception:
+        logger.exception("Falha ao recalcular as recomendações de %s usuários", len(usuarios_ids))
+
+def agendar_recalculo(*usuarios_ids: int):
+    with _lock_pendentes:
+        novos = set(usuarios_ids) - _pendentes
+        _pendentes.update(novos)
+    if novos:
+        _executor.submit(__recalcular_pendentes)
+
+# Usuários cujo feed pediu um recálculo por estar sem recomendações -> quando. Quem
+# continua sem nenhuma depois do recálculo (sem eventos candidatos, ou todos já
+# marcados) não volta para a fila a cada requisição, só a cada
+# RECOMENDACOES_NOVA_TENTATIVA_SEGUNDOS
+_tentativas = {}
+
+def agendar_recalculo_sem_recomendacoes(usuario_id: int):
+    agora = time.monotonic()
+    with _lock_pendentes:
+        # Em ordem de inserção: as vencidas estão no começo
+        while _tentativas and agora - next(iter(_tentativas.values())) >= settings.RECOMENDACOES_NOVA_TENTATIVA_SEGUNDOS:
+            _tentativas.pop(next(iter(_tentativas)))
+        if usuario_id in _tentativas:
+            return False
+        _tentativas[usuario_id] = agora
+    agendar_recalculo(usuario_id)
+    return True
+
+def __recalcular_todos():
+    try:
+        with SessionLocal() as session:
+            recalcular_recomendacoes(session)
+    except Exception:
+        logger.exception("Falha no recálculo completo das recomendações")
+
+def agendar_recalculo_completo():
+    _executor.submit(__recalcular_todos)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as session:
+        inicio = time.perf_counter()
+        quantidade = recalcular_recomendacoes(session)
+        print(f"Recomendações de {quantidade} usuários recalculadas em {time.perf_counter() - inicio:.1f}s")
@@ -1,73 +1,123 @@
 from fastapi import HTTPException
+from datetime import datetime
 from typing import List
-from app.models.models import Usuario, Evento, Avaliacao
-from sqlalchemy import func
-from sqlalchemy.exc import NoResultFound
-
-async def get_eventos_interesse(session, usuario_id):
+from app.models.models import Usuario, Evento, Avaliacao, Recomendacao, amigos_association, usuarios_eventos_querem_ir
+from app.services.cache import GRUPO_PARTICIPACAO, cache_respostas, grupo_amigos
+from app.services.contadores_eventos import ajuste_contador
+from app.services.coocorrencia_eventos import coocorrencia_eventos
+from app.services.grafo_amigos import grafo_amigos
+from app.services.recomendacao_services import agendar_recalculo
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+# Com AsyncSession não há lazy loading: as relações usadas são carregadas junto
+# com o objeto, via selectinload
+
+async def buscar_usuario(session: AsyncSession, usuario_id: int, *relacoes):
+    resultado = await session.execute(
+        select(Usuario).where(Usuario.id == usuario_id).options(*(selectinload(relacao) for relacao in relacoes))
+    )
+    return resultado.scalar_one_or_none()
+
+async def get_eventos_interesse(session: AsyncSession, usuario_id):
     # Primeiro, obtemos as categorias de interesse do usuário
-    usuario = session.query(Usuario).filter(Usuario.id == usuario_id).first()
+    usuario = await session.get(Usuario, usuario_id)
     categorias_interesse = usuario.categorias_interesse
 
     # Agora, filtramos os eventos que possuem interseção com as categorias de interesse
-    eventos_de_interesse = session.query(Evento).filter(
-        Evento.categoria.overlap(categorias_interesse)
-    ).limit(15).all()
-
-    return eventos_de_interesse
-
-def adicionar_amigo(session, usuario_id, amigo_id):
+    eventos_de_interesse = await session.scalars(
+        select(Evento).where(Evento.categoria.overlap(categorias_interesse)).limit(15)
+    )
+
+    return eventos_de_interesse.all()
+
+async def eventos_recomendados(session: AsyncSession, usuario_id: int, limite: int = 15):
+    # Top-K pré-calculado (recomendacao_services), lido pela chave primária de
+    # recomendacoes; os eventos que já passaram desde o cálculo ficam de fora
+    return (await session.scalars(
+        select(Evento)
+        .join(Recomendacao, Recomendacao.evento_id == Evento.id)
+        .where(Recomendacao.usuario_id == usuario_id, Evento.data_hora >= datetime.now())
+        .order_by(Recomendacao.posicao)
+        .limit(limite)
+    )).all()
+
+async def eventos_populares_entre_amigos(session: AsyncSession, usuario_id: int, limite: int = 15):
+    # Os eventos que mais amigos do usuário querem ir, num único statement pela tabela amigos
+    return (await session.scalars(
+        select(Evento)
+        .join(usuarios_eventos_querem_ir, usuarios_eventos_querem_ir.c.evento_id == Evento.id)
+        .join(amigos_association, amigos_association.c.amigo_id == usuarios_eventos_querem_ir.c.usuario_id)
+        .where(amigos_association.c.usuario_id == usuario_id)
+        .group_by(Evento.id)
+        .order_by(func.count().desc(), Evento.id)
+        .limit(limite)
+    )).all()
+
+async def __amizades_alteradas(usuario_id: int, amigos_ids):
+    grafo_amigos.invalidar(usuario_id, amigos_ids)
+    await cache_respostas.invalidar_async(grupo_amigos(usuario_id))
+    agendar_recalculo(usuario_id)
+
+async def __participacao_alterada(session: AsyncSession, usuario_id: int):
+    # Mudam o feed de populares e o feed de amigos de quem tem o usuário como amigo
+    seguidores = await grafo_amigos.seguidores(session, usuario_id)
+    # Um único pipeline para todos os grupos, por mais seguidores que o usuário tenha
+    await cache_respostas.invalidar_async(GRUPO_PARTICIPACAO, *(grupo_amigos(seguidor) for seguidor in seguidores))
+    # e as recomendações dele (perfil e eventos marcados) e dos seus seguidores (sinal de amigos)
+    agendar_recalculo(usuario_id, *seguidores)
+
+async def adicionar_amigo(session: AsyncSession, usuario_id, amigo_id):
     if usuario_id == amigo_id:
         raise HTTPException(status_code=400, detail="Não é possível adicionar a si mesmo como amigo.")
-    usuario = session.query(Usuario).filter(Usuario.id == usuario_id).first()
-    amigo = session.query(Usuario).filter(Usuario.id == amigo_id).first()
+    usuario = await buscar_usuario(session, usuario_id, Usuario.amigos)
+    amigo = await session.get(Usuario, amigo_id)
 
     if not usuario or not amigo:
         raise HTTPException(status_code=404, detail="Usuário ou amigo não encontrado.")
-    
+
     if amigo in usuario.amigos:
         raise HTTPException(status_code=400, detail="Este amigo já foi adicionado.")
-    
+
     usuario.amigos.append(amigo)  # Adiciona amigo à lista de amigos do usuário
-    session.commit()
+    await session.commit()
+    await __amizades_alteradas(usuario_id, [amigo_id])
 
-def remover_amigo(session, usuario_id, amigo_id):
+async def remover_amigo(session: AsyncSession, usuario_id, amigo_id):
     if usuario_id == amigo_id:
         raise HTTPException(status_code=400, detail="Não é possível remover a si mesmo da lista de amigos.")
-    
-    usuario = session.query(Usuario).filter(Usuario.id == usuario_id).first()
-    amigo = session.query(Usuario).filter(Usuario.id == amigo_id).first()
+
+    usuario = await buscar_usuario(session, usuario_id, Usuario.amigos)
+    amigo = await session.get(Usuario, amigo_id)
 
     if not usuario or not amigo:
         raise HTTPException(status_code=404, detail="Usuário ou amigo não encontrado.")
-    
+
     if amigo not in usuario.amigos:
         raise HTTPException(status_code=404, detail="Este amigo não está na sua lista de amigos.")
-    
+
     usuario.amigos.remove(amigo)  # Remove o amigo da lista de amigos do usuário
-    session.commit()
+    await session.commit()
+    await __amizades_alteradas(usuario_id, [amigo_id])
 
-def adicionar_amigos_por_telefone(session, usuario_id: int, telefones: List[str]):
-    usuario = session.query(Usuario).filter(Usuario.id == usuario_id).first()
+async def adicionar_amigos_por_telefone(session: AsyncSession, usuario_id: int, telefones: List[str]):
+    usuario = await buscar_usuario(session, usuario_id, Usuario.amigos)
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
-    for telefone in telefones:
-        try:
-            amigo_potencial = session.query(Usuario).filter(Usuario.telefone == telefone).one()
-            if amigo_potencial not in usuario.amigos:
-                usuario.amigos.append(amigo_potencial)
-            else:
-                pass
-        except NoResultFound:
-            pass
-
-    session.commit()
-
-def adicionar_evento_quero_ir(session, usuario_id, evento_id):
-    usuario = session.query(Usuario).filter(Usuario.id == usuario_id).first()
-    evento = session.query(Evento).filter(Evento.id == evento_id).first()
-    
+    # Uma única consulta para todos os telefones, em vez de uma por contato
+    amigos_potenciais = await session.scalars(select(Usuario).where(Usuario.telefone.in_(telefones)))
+    novos = [amigo_potencial for amigo_potencial in amigos_potenciais if amigo_potencial not in usuario.amigos]
+    usuario.amigos.extend(novos)
+
+    await session.commit()
+    await __amizades_alteradas(usuario_id, [amigo.id for amigo in novos])
+
+async def adicionar_evento_quero_ir(session: AsyncSession, usuario_id, evento_id):
+    usuario = await buscar_usuario(session, usuario_id, Usuario.eventos_quero_ir)
+    evento = await session.get(Evento, evento_id)
+
     if not usuario or not evento:
         raise HTTPException(status_code=404, detail="Usuário ou evento não encontrado.")
 
@@ -75,12 +125,15 @@ def adicionar_evento_quero_ir(session, usuario_id, evento_id):
         raise HTTPException(status_code=400, detail="Evento já está na lista de 'Quero Ir'.")
 
     usuario.eventos_quero_ir.append(evento)
-    session.commit()
+    await session.execute(ajuste_contador(evento_id, "qtd_quero_ir", 1))
+    await session.commit()
+    coocorrencia_eventos.adicionar(usuario_id, evento_id, "quero_ir", evento.data_hora)
+    await __participacao_alterada(session, usuario_id)
+
+async def adicionar_evento_fui(session: AsyncSession, usuario_id, evento_id):
+    usuario = await buscar_usuario(session, usuario_id, Usuario.eventos_fui)
+    evento = await session.get(Evento, evento_id)
 
-def adicionar_evento_fui(session, usuario_id, evento_id):
-    usuario = session.query(Usuario).filter(Usuario.id == usuario_id).first()
-    evento = session.query(Evento).filter(Evento.id == evento_id).first()
-    
     if not usuario or not evento:
         raise HTTPException(status_code=404, detail="Usuário ou evento não encontrado.")
 
@@ -88,12 +141,15 @@ def adicionar_evento_fui(session, usuario_id, evento_id):
         raise HTTPException(status_code=400, detail="Evento já está na lista de 'Fui'.")
 
     usuario.eventos_fui.append(evento)
-    session.commit()
+    await session.execute(ajuste_contador(evento_id, "qtd_fui", 1))
+    await session.commit()
+    coocorrencia_eventos.adicionar(usuario_id, evento_id, "fui", evento.data_hora)
+    await __participacao_alterada(session, usuario_id)
+
+async def remover_evento_quero_ir(session: AsyncSession, usuario_id, evento_id):
+    usuario = await buscar_usuario(session, usuario_id, Usuario.eventos_quero_ir)
+    evento = await session.get(Evento, evento_id)
 
-def remover_evento_quero_ir(session, usuario_id, evento_id):
-    usuario = session.query(Usuario).filter(Usuario.id == usuario_id).first()
-    evento = session.query(Evento).filter(Evento.id == evento_id).first()
-    
     if not usuario or not evento:
         raise HTTPException(status_code=404, detail="Usuário ou evento não encontrado.")
 
@@ -101,12 +157,15 @@ def remover_evento_quero_ir(session, usuario_id, evento_id):
         raise HTTPException(status_code=400, detail="Evento não está na lista de 'Quero Ir'.")
 
     usuario.eventos_quero_ir.remove(evento)
-    session.commit()
+    await session.execute(ajuste_contador(evento_id, "qtd_quero_ir", -1))
+    await session.commit()
+    coocorrencia_eventos.remover(usuario_id, evento_id, "quero_ir")
+    await __participacao_alterada(session, usuario_id)
+
+async def remover_evento_fui(session: AsyncSession, usuario_id, evento_id):
+    usuario = await buscar_usuario(session, usuario_id, Usuario.eventos_fui)
+    evento = await session.get(Evento, evento_id)
 
-def remover_evento_fui(session, usuario_id, evento_id):
-    usuario = session.query(Usuario).filter(Usuario.id == usuario_id).first()
-    evento = session.query(Evento).filter(Evento.id == evento_id).first()
-    
     if not usuario or not evento:
         raise HTTPException(status_code=404, detail="Usuário ou evento não encontrado.")
 
@@ -114,26 +173,24 @@ def remover_evento_fui(session, usuario_id, evento_id):
         raise HTTPException(status_code=400, detail="Evento não está na lista de 'Fui'.")
 
     usuario.eventos_fui.remove(evento)
-    session.commit()
-
-def buscar_usuario_com_eventos_e_medias(session, usuario_id: int):
-    # Substitua ModelEvento, ModelAvaliacao, etc., pelos nomes reais dos seus modelos
-    eventos_quero_ir = session.query(
-        Evento.id,
-        Evento.nome,
-        Evento.data_hora,
-        Evento.local,
-        Evento.banner,
-        func.coalesce(func.round(func.avg(Avaliacao.avaliacao), 1), 0).label("media_avaliacao")
-    ).outerjoin(Avaliacao).filter(Evento.usuarios_que_querem_ir.any(id=usuario_id)).group_by(Evento.id).all()
-
-    eventos_fui = session.query(
-        Evento.id,
-        Evento.nome,
-        Evento.data_hora,
-        Evento.local,
-        Evento.banner,
-        func.coalesce(func.round(func.avg(Avaliacao.avaliacao), 1), 0).label("media_avaliacao")
-    ).outerjoin(Avaliacao).filter(Evento.usuarios_que_foram.any(id=usuario_id)).group_by(Evento.id).all()
-
-    return eventos_quero_ir, eventos_fui
\ No newline at end of file
+    await session.execute(ajuste_contador(evento_id, "qtd_fui", -1))
+    await session.commit()
+    coocorrencia_eventos.remover(usuario_id, evento_id, "fui")
+    await __participacao_alterada(session, usuario_id)
+
+async def buscar_usuario_com_eventos_e_medias(session: AsyncSession, usuario_id: int):
+    # Eventos das listas do usuário com a média das avaliações de cada um
+    def eventos_com_media(relacao):
+        return select(
+            Evento.id,
+            Evento.nome,
+            Evento.data_hora,
+            Evento.local,
+            Evento.banner,
+            func.coalesce(func.round(func.avg(Avaliacao.avaliacao), 1), 0).label("media_avaliacao")
+        ).outerjoin(Avaliacao).where(relacao.any(id=usuario_id)).group_by(Evento.id)
+
+    eventos_quero_ir = (await session.execute(eventos_com_media(Evento.usuarios_que_querem_ir))).all()
+    eventos_fui = (await session.execute(eventos_com_media(Evento.usuarios_que_foram))).all()
+
+    return eventos_quero_ir, eventos_fui
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.services import evento_services, fila_crawl
+from app.services.fontes_eventos import fontes_registradas, obter_fonte
+
+logger = logging.getLogger(__name__)
+
+# Worker do crawler distribuído: consome a fila tarefas_crawl até ser interrompido.
+# Quantos processos forem iniciados, em quantas instâncias forem, dividem a fila
+# entre si sem coordenação além do banco.
+#
+# Uso: python -m app.services.worker_crawl --concorrencia 4 [--ate-esvaziar]
+
+# O banco é acessado pela Session síncrona, numa thread (asyncio.to_thread), para que
+# a gravação de um consumidor não pare as requisições HTTP dos outros. Cada consumidor
+# usa a sua sessão numa chamada por vez, nunca em duas threads ao mesmo tempo.
+
+def __gravar_pagina(session, tarefa, linhas, total_paginas):
+    evento_services.mesclar_eventos(session, linhas)
+    fila_crawl.concluir_tarefa(session, tarefa, total_paginas, len(linhas))
+
+def __registrar_falha(session, tarefa, erro):
+    session.rollback()
+    fila_crawl.falhar_tarefa(session, tarefa, erro)
+
+async def processar_tarefa(session, tarefa, clientes: dict):
+    fonte = obter_fonte(tarefa.fonte)
+    try:
+        eventos, total_paginas = await fonte.buscar_pagina(clientes[fonte.nome], tarefa.cidade, tarefa.estado, tarefa.passada, tarefa.pagina)
+        linhas = [fonte.normalizar(evento_api) for evento_api in eventos]
+        await asyncio.to_thread(__gravar_pagina, session, tarefa, linhas, total_paginas)
+    except Exception as erro:
+        logger.warning("Tarefa %s falhou na tentativa %s: %s", tarefa.id, tarefa.tentativas, erro)
+        await asyncio.to_thread(__registrar_falha, session, tarefa, erro)
+
+async def __consumir(clientes: dict, ate_esvaziar: bool):
+    # Cada consumidor tem a sua sessão; os clientes HTTP (e os limites de taxa) são das fontes
+    session = SessionLocal()
+    try:
+        while True:
+            tarefas = await asyncio.to_thread(fila_crawl.reivindicar_tarefas, session)
+            if not tarefas:
+                if ate_esvaziar:
+                    return
+                await asyncio.sleep(settings.CRAWL_ESPERA_FILA_VAZIA)
+                continue
+            for tarefa in tarefas:
+                await processar_tarefa(session, tarefa, clientes)
+    finally:
+        session.close()
+
+async def executar_worker(concorrencia: int = None, ate_esvaziar: bool = False):
+    concorrencia = concorrencia or settings.CRAWL_CONCORRENCIA_WORKER
+    async with AsyncExitStack() as stack:
+        clientes = {}
+        for nome in fontes_registradas():
+            clientes[nome] = await stack.enter_async_context(obter_fonte(nome).novo_cliente())
+        await asyncio.gather(*(__consumir(clientes, ate_esvaziar) for _ in range(concorrencia)))
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Worker do crawler distribuído")
+    parser.add_argument("--concorrencia", type=int, default=None, help="Tarefas processadas ao mesmo tempo por este processo")
+    parser.add_argument("--ate-esvaziar", action="store_true", help="Termina quando a fila estiver vazia, em vez de esperar novas tarefas")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(executar_worker(args.concorrencia, args.ate_esvaziar))
@@ -0,0 +1,123 @@
+import json
+import os
+import resource
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.core.config import settings
+from app.services import crowler_sympla
+from app.services.cassete_http import GRAVAR, REPRODUZIR, abrir_cassete
+
+# Benchmark do crawler e da ingestão sem rede, a partir de um cassete gravado.
+#
+# Gravar contra o Sympla real (SYMPLA_URL) ou contra o Fake Sympla local:
+#   python -m tests.benchmark_carga gravar --cassete sympla.json.gz
+#   python -m tests.benchmark_carga gravar --cassete sympla.json.gz --fake 20000
+#
+# Reproduzir (só crawler, ou crawler + gravação no banco de DATABASE_URL):
+#   python -m tests.benchmark_carga reproduzir --cassete sympla.json.gz
+#   python -m tests.benchmark_carga reproduzir --cassete sympla.json.gz --ingestao --json resultado.json
+
+def pico_rss_mb():
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+def usar_cassete(caminho, modo):
+    settings.SYMPLA_CASSETE = caminho
+    settings.SYMPLA_CASSETE_MODO = modo
+    return abrir_cassete(caminho, modo)
+
+def gravar(args):
+    fake = None
+    if args.fake:
+        from tests.fake_sympla import FakeSympla
+        fake = FakeSympla(args.fake, latencia=0).iniciar()
+        settings.SYMPLA_URL = fake.url
+
+    cassete = usar_cassete(args.cassete, GRAVAR)
+    try:
+        eventos = crowler_sympla.get_eventos_sympla()
+    finally:
+        if fake:
+            fake.parar()
+    print(f"Cassete {args.cassete}: {len(cassete.respostas)} respostas, {len(eventos)} eventos")
+
+def crawler(args):
+    return crowler_sympla.get_eventos_sympla(), Counter()
+
+def crawler_e_ingestao(args):
+    from app.db.base import SessionLocal
+    from app.services import evento_services
+    from app.services.fontes_eventos import obter_fonte
+
+    fonte = obter_fonte("SYMPLA")
+    eventos, resumo = [], Counter()
+    session = SessionLocal()
+    try:
+        for lote in crowler_sympla.iter_lotes_eventos_sympla():
+            linhas = [fonte.normalizar(evento_api) for evento_api in lote]
+            resumo.update(evento_services.salvar_lote_eventos(session, linhas, fonte.nome))
+            eventos.extend(lote)
+    finally:
+        session.close()
+    return eventos, resumo
+
+def reproduzir(args):
+    cassete = usar_cassete(args.cassete, REPRODUZIR)
+    medir = crawler_e_ingestao if args.ingestao else crawler
+
+    inicio = time.perf_counter()
+    eventos, resumo = medir(args)
+    duracao = time.perf_counter() - inicio
+
+    resultado = dict(
+        modo="crawler + ingestão" if args.ingestao else "crawler",
+        segundos=round(duracao, 3),
+        requisicoes=cassete.reproduzidas,
+        requisicoes_por_segundo=round(cassete.reproduzidas / duracao, 1),
+        eventos=len(eventos),
+        eventos_por_segundo=round(len(eventos) / duracao, 1),
+        pico_rss_mb=round(pico_rss_mb(), 1),
+        **dict(resumo),
+    )
+    for campo, valor in resultado.items():
+        print(f"{campo}: {valor}")
+    if args.json:
+        with open(args.json, "w") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+    # Limites opcionais, para que uma regressão falhe o CI
+    falhas = []
+    if args.min_eventos_por_segundo and resultado["eventos_por_segundo"] < args.min_eventos_por_segundo:
+        falhas.append(f"eventos/s {resultado['eventos_por_segundo']} < {args.min_eventos_por_segundo}")
+    if args.max_rss_mb and resultado["pico_rss_mb"] > args.max_rss_mb:
+        falhas.append(f"pico de RSS {resultado['pico_rss_mb']} MB > {args.max_rss_mb} MB")
+    if falhas:
+        print("Regressão: " + "; ".join(falhas))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark do crawler e da ingestão com respostas gravadas")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    parser_gravar = subparsers.add_parser("gravar", help="Grava um cassete percorrendo o Sympla")
+    parser_gravar.add_argument("--cassete", required=True)
+    parser_gravar.add_argument("--fake", type=int, default=0, help="Grava contra um Fake Sympla local com essa quantidade de eventos")
+    parser_gravar.set_defaults(funcao=gravar)
+
+    parser_reproduzir = subparsers.add_parser("reproduzir", help="Mede o crawler reproduzindo um cassete")
+    parser_reproduzir.add_argument("--cassete", required=True)
+    parser_reproduzir.add_argument("--ingestao", action="store_true", help="Grava os eventos no banco de DATABASE_URL (Postgres)")
+    parser_reproduzir.add_argument("--json", help="Salva o resultado nesse arquivo")
+    parser_reproduzir.add_argument("--min-eventos-por-segundo", type=float)
+    parser_reproduzir.add_argument("--max-rss-mb", type=float)
+    parser_reproduzir.set_defaults(funcao=reproduzir)
+
+    args = parser.parse_args()
+    args.funcao(args)
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.core.config import settings
+from app.services import crowler_sympla
+from tests.fake_sympla import FakeSympla
+
+# Compara o crawler sequencial com o assíncrono contra o Fake Sympla local.
+# Cada medição monta o seu cliente, com um limitador de taxa novo: a taxa aprendida
+# numa execução não passa para a outra, e a ordem das medições não muda o resultado.
+#
+# Uso: python -m tests.benchmark_crawler --eventos 1000 --latencia 0.05
+
+def medir(nome, funcao, fake):
+    requisicoes_antes = fake.requisicoes
+    inicio = time.perf_counter()
+    eventos = funcao()
+    duracao = time.perf_counter() - inicio
+    requisicoes = fake.requisicoes - requisicoes_antes
+    print(f"{nome}: {len(eventos)} eventos, {requisicoes} requisições em {duracao:.2f}s ({requisicoes / duracao:.1f} req/s)")
+    return eventos, duracao
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark do crawler do Sympla")
+    parser.add_argument("--eventos", type=int, default=1000)
+    parser.add_argument("--latencia", type=float, default=0.05)
+    parser.add_argument("--falhas", type=float, default=0.0, help="Fração das requisições que o Fake Sympla responde com 429/503")
+    parser.add_argument("--sem-sequencial", action="store_true", help="Mede apenas o crawler assíncrono")
+    args = parser.parse_args()
+
+    fake = FakeSympla(args.eventos, latencia=args.latencia, taxa_falhas=args.falhas).iniciar()
+    settings.SYMPLA_URL = fake.url
+
+    try:
+        eventos_async, duracao_async = medir("assíncrono", lambda: asyncio.run(crowler_sympla.get_eventos_sympla_async()), fake)
+        if not args.sem_sequencial:
+            eventos_seq, duracao_seq = medir("sequencial", crowler_sympla.get_eventos_sympla, fake)
+            por_id = lambda evento: evento["id"]
+            assert sorted(eventos_seq, key=por_id) == sorted(eventos_async, key=por_id), "Os dois crawlers devem retornar os mesmos eventos"
+            print(f"Speedup: {duracao_seq / duracao_async:.1f}x")
+    finally:
+        fake.parar()
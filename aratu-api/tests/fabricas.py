@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from itertools import count
+
+from app.models.models import Evento, Usuario
+
+# Linhas mínimas para os testes que usam o banco, gravadas pela sessão síncrona
+
+_sequencia = count(1)
+
+def novo_usuario(session, **colunas):
+    n = next(_sequencia)
+    usuario = Usuario(**{
+        "nome": f"Usuário {n}",
+        "email": f"usuario{n}@exemplo.com",
+        "senha": "hash",
+        "telefone": f"8199{n:07d}",
+        "categorias_interesse": [],
+        **colunas,
+    })
+    session.add(usuario)
+    session.flush()
+    return usuario
+
+def novo_evento(session, **colunas):
+    n = next(_sequencia)
+    data_hora = datetime.now().replace(microsecond=0) + timedelta(days=n % 30 + 1)
+    evento = Evento(**{
+        "nome": f"Evento {n}",
+        "descricao": "",
+        "banner": f"https://exemplo.com/{n}.png",
+        "local": "Marco Zero",
+        "endereco": "Recife, PE",
+        "data_hora": data_hora,
+        "data_fim": data_hora + timedelta(hours=4),
+        "categoria": ["FESTAS_SHOWS"],
+        "onde_comprar_ingressos": f"https://exemplo.com/{n}",
+        "fonte": "SYMPLA",
+        "id_sistema_origem": 100000 + n,
+        "organizador": "Organizador",
+        "gratis": True,
+        "atualizado_em": datetime.now(),
+        **colunas,
+    })
+    session.add(evento)
+    session.flush()
+    return evento
@@ -0,0 +1,131 @@
+import json
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Servidor local que imita o endpoint de busca do Sympla, usado para medir o
+# crawler sem depender da rede. Os eventos são gerados de forma determinística.
+#
+# Uso: python -m tests.fake_sympla --eventos 2000 --latencia 0.05 --porta 8765
+
+def gerar_eventos(quantidade: int, data_base: date = None):
+    # Os eventos começam na data base (hoje, por padrão), a cada 7 horas
+    inicio = datetime.combine(data_base or date.today(), datetime.min.time()) + timedelta(hours=19)
+    eventos = []
+    for i in range(1, quantidade + 1):
+        data_inicio = inicio + timedelta(hours=7 * i)
+        eventos.append({
+            "id": 100000 + i,
+            "name": f"Evento {i}",
+            "start_date": data_inicio.isoformat(),
+            "end_date": (data_inicio + timedelta(hours=4)).isoformat(),
+            "images": {"original": f"https://images.sympla.com.br/{i}.png"},
+            "location": {"name": f"Local {i % 37}", "address": f"Rua {i % 101}", "city": "Recife", "state": "PE"},
+            "url": f"https://www.sympla.com.br/evento/{100000 + i}",
+            "organizer": {"name": f"Organizador {i % 53}"},
+        })
+    return eventos
+
+def filtrar_eventos(eventos, params):
+    # Gratuitos: 1 a cada 5 eventos. Categorias: cada coleção pega 1 a cada 4
+    # eventos, com deslocamento diferente, então um evento pode ter várias.
+    selecionados = eventos
+    if params.get("need_pay") == "0":
+        selecionados = [e for e in selecionados if e["id"] % 5 == 0]
+    if params.get("collections"):
+        collection = int(params["collections"])
+        selecionados = [e for e in selecionados if (e["id"] + collection) % 4 == 0]
+    if params.get("range"):
+        inicio, fim = params["range"].split(",")
+        selecionados = [e for e in selecionados if inicio <= e["start_date"][:10] <= fim]
+    return selecionados
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class FakeSympla:
+    def __init__(self, quantidade: int = 1000, limit: int = 24, latencia: float = 0.0, porta: int = 0, taxa_falhas: float = 0.0):
+        self.eventos = gerar_eventos(quantidade)
+        self.limit = limit
+        self.latencia = latencia
+        # Fração das requisições respondidas com 429/503, para exercitar o retry
+        self.taxa_falhas = taxa_falhas
+        self._aleatorio = random.Random(42)
+        self.requisicoes = 0
+        self._lock = threading.Lock()
+        self.servidor = _Servidor(("127.0.0.1", porta), self._handler())
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.servidor.server_address[1]}/api/v1/search"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                tamanho = int(self.headers.get("Content-Length", 0))
+                params = json.loads(self.rfile.read(tamanho))["params"]
+                with fake._lock:
+                    fake.requisicoes += 1
+                    falhar = fake._aleatorio.random() < fake.taxa_falhas
+                if fake.latencia:
+                    time.sleep(fake.latencia)
+                if falhar:
+                    self.send_response(429 if fake._aleatorio.random() < 0.5 else 503)
+                    self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                selecionados = filtrar_eventos(fake.eventos, params)
+                page = int(params.get("page", 1))
+                inicio = (page - 1) * fake.limit
+                corpo = json.dumps({
+                    "result": {
+                        "events": {
+                            "data": selecionados[inicio:inicio + fake.limit],
+                            "page": page,
+                            "limit": fake.limit,
+                            "total": len(selecionados),
+                        }
+                    }
+                }).encode()
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def iniciar(self):
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return self
+
+    def parar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servidor local que imita a busca do Sympla")
+    parser.add_argument("--eventos", type=int, default=1000)
+    parser.add_argument("--latencia", type=float, default=0.05)
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--falhas", type=float, default=0.0, help="Fração das requisições que respondem 429/503")
+    args = parser.parse_args()
+
+    fake = FakeSympla(args.eventos, latencia=args.latencia, porta=args.porta, taxa_falhas=args.falhas)
+    print(f"Fake Sympla ouvindo em {fake.url}")
+    fake.servidor.serve_forever()
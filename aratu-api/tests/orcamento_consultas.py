@@ -0,0 +1,15 @@
+from app.db.contador_consultas import orcamento_consultas
+
+# Ajuda para os testes verificarem o orçamento de consultas de cada endpoint:
+#
+#     def test_expand_do_evento(client):
+#         verificar_orcamento(client, "GET", "/eventos/1/expand", maximo=4)
+#
+# A contagem vem do mesmo contador do middleware (X-Qtd-Consultas), então o teste
+# falha com a lista das formas de statement executadas, e as repetidas (N+1).
+
+def verificar_orcamento(client, metodo: str, url: str, maximo: int, n_mais_um: int = None, **kwargs):
+    with orcamento_consultas(maximo, n_mais_um):
+        resposta = client.request(metodo, url, **kwargs)
+    assert resposta.status_code < 500, resposta.text
+    return resposta
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.services.cache import GRUPO_EVENTOS, GRUPO_PARTICIPACAO, CacheMemoria, CacheRedis, CacheRespostas, grupo_amigos
+
+# Os dois backends passam pelos mesmos cenários; o redis roda contra o fakeredis
+
+@pytest.fixture(params=["memoria", "redis"])
+def cache(request):
+    if request.param == "redis":
+        pytest.importorskip("fakeredis")
+        backend = CacheRedis("fakeredis://")
+    else:
+        backend = CacheMemoria(maximo=100)
+    cache = CacheRespostas()
+    cache.configurar(backend)
+    return cache
+
+def __contador_de_calculos():
+    calculos = []
+
+    async def calcular():
+        calculos.append(1)
+        return {"versao": len(calculos)}
+
+    return calculos, calcular
+
+def test_acerto_e_falta(cache):
+    calculos, calcular = __contador_de_calculos()
+
+    async def cenario():
+        primeira = await cache.obter_ou_calcular("populares", (), (GRUPO_EVENTOS,), calcular)
+        segunda = await cache.obter_ou_calcular("populares", (), (GRUPO_EVENTOS,), calcular)
+        outra = await cache.obter_ou_calcular("populares", (2,), (GRUPO_EVENTOS,), calcular)
+        return primeira, segunda, outra
+
+    primeira, segunda, outra = asyncio.run(cenario())
+    assert primeira == segunda == {"versao": 1}
+    assert outra == {"versao": 2}
+    assert cache.metricas()["rotas"]["populares"] == dict(acertos=1, faltas=2, taxa_acerto=0.333)
+
+@pytest.mark.parametrize("assincrona", [False, True])
+def test_invalidacao_so_alcanca_os_grupos_invalidados(cache, assincrona):
+    calculos, calcular = __contador_de_calculos()
+
+    async def cenario():
+        await cache.obter_ou_calcular("populares", (), (GRUPO_EVENTOS, GRUPO_PARTICIPACAO), calcular)
+        await cache.obter_ou_calcular("amigos", (7,), (grupo_amigos(7),), calcular)
+        if assincrona:
+            await cache.invalidar_async(GRUPO_PARTICIPACAO)
+        else:
+            cache.invalidar(GRUPO_PARTICIPACAO)
+        populares = await cache.obter_ou_calcular("populares", (), (GRUPO_EVENTOS, GRUPO_PARTICIPACAO), calcular)
+        amigos = await cache.obter_ou_calcular("amigos", (7,), (grupo_amigos(7),), calcular)
+        return populares, amigos
+
+    populares, amigos = asyncio.run(cenario())
+    assert populares == {"versao": 3}
+    assert amigos == {"versao": 2}
+    assert cache.metricas()["invalidacoes"] == {GRUPO_PARTICIPACAO: 1}
+
+def test_invalidacao_de_muitos_grupos(cache):
+    calculos, calcular = __contador_de_calculos()
+    seguidores = range(1, 51)
+
+    async def cenario():
+        for seguidor in seguidores:
+            await cache.obter_ou_calcular("amigos", (seguidor,), (grupo_amigos(seguidor),), calcular)
+        await cache.invalidar_async(GRUPO_PARTICIPACAO, *(grupo_amigos(seguidor) for seguidor in seguidores))
+        for seguidor in seguidores:
+            await cache.obter_ou_calcular("amigos", (seguidor,), (grupo_amigos(seguidor),), calcular)
+
+    asyncio.run(cenario())
+    assert len(calculos) == 100
+    assert cache.metricas()["invalidacoes"] == {GRUPO_PARTICIPACAO: 1, "amigos": 50}
+
+class BackendRegistrando(CacheMemoria):
+    def __init__(self):
+        super().__init__(maximo=100)
+        self.chamadas = []
+
+    async def invalidar_async(self, grupos):
+        self.chamadas.append(tuple(grupos))
+        await super().invalidar_async(grupos)
+
+def test_grupos_vao_numa_unica_chamada_ao_backend():
+    backend = BackendRegistrando()
+    cache = CacheRespostas()
+    cache.configurar(backend)
+
+    asyncio.run(cache.invalidar_async(GRUPO_PARTICIPACAO, grupo_amigos(1), grupo_amigos(2)))
+    assert backend.chamadas == [(GRUPO_PARTICIPACAO, "amigos:1", "amigos:2")]
+
+class BackendForaDoAr(CacheMemoria):
+    async def geracoes(self, grupos):
+        raise ConnectionError("fora do ar")
+
+    def invalidar(self, grupos):
+        raise ConnectionError("fora do ar")
+
+def test_cache_fora_do_ar_nao_derruba_a_rota():
+    cache = CacheRespostas()
+    cache.configurar(BackendForaDoAr(maximo=100))
+    calculos, calcular = __contador_de_calculos()
+
+    assert asyncio.run(cache.obter_ou_calcular("populares", (), (GRUPO_EVENTOS,), calcular)) == {"versao": 1}
+    asyncio.run(cache.invalidar_async(GRUPO_EVENTOS, GRUPO_PARTICIPACAO))
+    assert cache.metricas()["erros"] == {"populares": 1, GRUPO_EVENTOS: 1, GRUPO_PARTICIPACAO: 1}
@@ -0,0 +1,31 @@
+import gzip
+import json
+
+import pytest
+
+from app.services.cassete_http import GRAVAR, REPRODUZIR, RequisicaoForaDoCassete, TransporteCassete
+from app.services.cliente_http import ClienteHttp
+from tests.fake_sympla import FakeSympla
+
+def __buscar(transporte, url, page):
+    with ClienteHttp(transporte=transporte) as client:
+        return client.post(url, json={"params": {"page": page}}).json()
+
+def test_gravar_substitui_o_cassete_anterior(tmp_path):
+    caminho = tmp_path / "sympla.json.gz"
+    with gzip.open(caminho, "wt", encoding="utf-8") as arquivo:
+        json.dump({"respostas": {"de-outra-gravacao": dict(status=200, content_type="application/json", conteudo="{}")}}, arquivo)
+
+    fake = FakeSympla(30, limit=10).iniciar()
+    try:
+        gravada = __buscar(TransporteCassete(str(caminho), GRAVAR), fake.url, page=2)
+    finally:
+        fake.parar()
+
+    reproducao = TransporteCassete(str(caminho), REPRODUZIR)
+    assert "de-outra-gravacao" not in reproducao.respostas and len(reproducao.respostas) == 1
+    assert __buscar(reproducao, "http://outro-host/api/v1/search", page=2) == gravada
+    with pytest.raises(RequisicaoForaDoCassete):
+        __buscar(reproducao, "http://outro-host/api/v1/search", page=1)
+    # Só o cassete fica no diretório, sem o arquivo temporário da gravação
+    assert [arquivo.name for arquivo in tmp_path.iterdir()] == ["sympla.json.gz"]
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.models.models import Categoria
+from app.services.categorias_services import atualizar_categorias
+from tests.fabricas import novo_evento
+
+def __catalogo(session):
+    session.expire_all()
+    linhas = session.execute(select(Categoria.nome, Categoria.qtd_eventos, Categoria.qtd_futuros)).all()
+    return {nome: (qtd_eventos, qtd_futuros) for nome, qtd_eventos, qtd_futuros in linhas}
+
+def test_recontagem(session):
+    amanha, ontem = datetime.now() + timedelta(days=1), datetime.now() - timedelta(days=1)
+    novo_evento(session, categoria=["TEATRO", "INFANTIL"], data_hora=amanha)
+    novo_evento(session, categoria=["TEATRO", "TEATRO"], data_hora=ontem)
+    novo_evento(session, categoria=[], data_hora=amanha)
+    session.add(Categoria(nome="SEM_EVENTOS", qtd_eventos=3, qtd_futuros=1))
+    session.commit()
+
+    atualizar_categorias(session)
+    assert __catalogo(session) == {"TEATRO": (2, 1), "INFANTIL": (1, 1)}
+
+def __evento_json(**campos):
+    data_hora = datetime.now().replace(microsecond=0) + timedelta(days=5)
+    return {
+        "nome": "Recital", "descricao": "", "categoria": ["MUSICA"], "local": "Teatro de Santa Isabel",
+        "endereco": "Recife, PE", "data_hora": data_hora.isoformat(), "data_fim": (data_hora + timedelta(hours=2)).isoformat(),
+        "fonte": "ARATU", "organizador": "Aratu", "gratis": True, "atualizado_em": datetime.now().isoformat(),
+        **campos,
+    }
+
+def test_crud_mantem_o_catalogo_igual_a_recontagem(client, session):
+    novo_evento(session, categoria=["MUSICA", "TEATRO"])
+    session.commit()
+    atualizar_categorias(session)
+
+    def confere(esperado):
+        incremental = __catalogo(session)
+        assert incremental == esperado
+        atualizar_categorias(session)
+        assert __catalogo(session) == incremental
+
+    resposta = client.post("/eventos/", json=__evento_json(categoria=["MUSICA", "INFANTIL"]))
+    assert resposta.status_code == 201, resposta.text
+    evento_id = resposta.json()["id"]
+    confere({"MUSICA": (2, 2), "TEATRO": (1, 1), "INFANTIL": (1, 1)})
+
+    # Troca de categorias e passa para o passado
+    ontem = datetime.now().replace(microsecond=0) - timedelta(days=1)
+    resposta = client.put(f"/eventos/{evento_id}", json=__evento_json(categoria=["MUSICA", "DANCA"], data_hora=ontem.isoformat()))
+    assert resposta.status_code == 200, resposta.text
+    confere({"MUSICA": (2, 1), "TEATRO": (1, 1), "DANCA": (1, 0)})
+
+    assert client.delete(f"/eventos/{evento_id}").status_code == 204
+    confere({"MUSICA": (1, 1), "TEATRO": (1, 1)})
+    assert sorted(client.get("/eventos/categorias/").json()) == ["MUSICA", "TEATRO"]
+
+def test_rota_interna_de_recontagem(client, session, monkeypatch):
+    monkeypatch.setattr(settings, "INTERNO_TOKEN", "token")
+    novo_evento(session, categoria=["TEATRO"])
+    session.commit()
+
+    resposta = client.post("/interno/categorias/atualizar", headers={"X-Token-Interno": "token"})
+    assert resposta.status_code == 204
+    assert resposta.content == b""
+    assert __catalogo(session) == {"TEATRO": (1, 1)}
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from app.core.config import settings
+from app.services.coocorrencia_eventos import IndiceCoocorrencia
+
+@pytest.fixture(autouse=True)
+def limite_pequeno(monkeypatch):
+    monkeypatch.setattr(settings, "SIMILARES_MAXIMO_EVENTOS_USUARIO", 3)
+
+def __similares(indice, evento_id):
+    return indice.similares(evento_id, 50, somente_futuros=False)
+
+def test_similaridade_do_cosseno():
+    indice = IndiceCoocorrencia()
+    for usuario_id, eventos in {1: [10, 20], 2: [10, 20], 3: [10, 30]}.items():
+        for evento_id in eventos:
+            indice.adicionar(usuario_id, evento_id, "quero_ir")
+
+    # 10 tem 3 usuários; 20 tem 2, ambos em comum; 30 tem 1, em comum
+    assert __similares(indice, 10) == [(20, round(2 / 6 ** 0.5, 4), 2), (30, round(1 / 3 ** 0.5, 4), 1)]
+    assert __similares(indice, 20) == [(10, round(2 / 6 ** 0.5, 4), 2)]
+
+def test_quero_ir_e_fui_contam_uma_vez():
+    indice = IndiceCoocorrencia()
+    for fonte in ("quero_ir", "fui"):
+        indice.adicionar(1, 10, fonte)
+        indice.adicionar(1, 20, fonte)
+    assert __similares(indice, 10) == [(20, 1.0, 1)]
+
+    indice.remover(1, 20, "fui")
+    assert __similares(indice, 10) == [(20, 1.0, 1)]
+    indice.remover(1, 20, "quero_ir")
+    assert __similares(indice, 10) == []
+
+def test_usuario_sai_e_volta_para_o_limite():
+    indice = IndiceCoocorrencia()
+    for evento_id in (10, 20, 30):
+        indice.adicionar(1, evento_id, "quero_ir")
+    indice.adicionar(2, 10, "quero_ir")
+    indice.adicionar(2, 20, "quero_ir")
+    assert [vizinho for vizinho, _, _ in __similares(indice, 10)] == [20, 30]
+
+    # O quarto evento tira o usuário 1 de todos os pares, inclusive os que já tinha;
+    # ele continua contando nos usuários de cada evento
+    indice.adicionar(1, 40, "quero_ir")
+    assert __similares(indice, 10) == [(20, 0.5, 1)]
+    assert __similares(indice, 30) == []
+    assert __similares(indice, 40) == []
+
+    # Ao desmarcar um evento ele volta, com os pares dos três que restaram
+    indice.remover(1, 30, "quero_ir")
+    assert __similares(indice, 10) == [(20, 1.0, 2), (40, round(1 / 2 ** 0.5, 4), 1)]
+    assert __similares(indice, 30) == []
+
+def test_remover_evento():
+    indice = IndiceCoocorrencia()
+    for usuario_id in (1, 2):
+        for evento_id in (10, 20, 30):
+            indice.adicionar(usuario_id, evento_id, "quero_ir")
+
+    indice.remover_evento(20)
+    assert [vizinho for vizinho, _, _ in __similares(indice, 10)] == [30]
+    assert __similares(indice, 20) == []
+
+def test_marcacoes_incrementais_equivalem_a_montar_do_zero():
+    # Sequências aleatórias de marcações, entrando e saindo do limite, chegam ao
+    # mesmo índice que as marcações finais aplicadas de uma vez
+    aleatorio = random.Random(7)
+    incremental = IndiceCoocorrencia()
+    marcacoes = set()
+    for _ in range(2000):
+        marcacao = (aleatorio.randint(1, 8), aleatorio.randint(1, 10), aleatorio.choice(["quero_ir", "fui"]))
+        if marcacao in marcacoes and aleatorio.random() < 0.5:
+            incremental.remover(*marcacao)
+            marcacoes.discard(marcacao)
+        else:
+            incremental.adicionar(*marcacao)
+            marcacoes.add(marcacao)
+
+    do_zero = IndiceCoocorrencia()
+    for marcacao in sorted(marcacoes):
+        do_zero.adicionar(*marcacao)
+    for evento_id in range(1, 11):
+        assert __similares(incremental, evento_id) == __similares(do_zero, evento_id)
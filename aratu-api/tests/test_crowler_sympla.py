@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services import crowler_sympla
+from app.services.cliente_http import ClienteHttp
+from tests import fake_sympla
+from tests.fake_sympla import FakeSympla
+
+# Gratuito (id múltiplo de 5) e some da passada com todos, como se a listagem
+# tivesse mudado entre as passadas
+SO_NOS_GRATUITOS = 100010
+
+@pytest.fixture
+def fake(monkeypatch):
+    filtrar_eventos = fake_sympla.filtrar_eventos
+
+    def sem_o_evento_na_passada_com_todos(eventos, params):
+        selecionados = filtrar_eventos(eventos, params)
+        if not params.get("need_pay") and not params.get("collections"):
+            selecionados = [e for e in selecionados if e["id"] != SO_NOS_GRATUITOS]
+        return selecionados
+
+    monkeypatch.setattr(fake_sympla, "filtrar_eventos", sem_o_evento_na_passada_com_todos)
+    fake = FakeSympla(60, limit=7).iniciar()
+    monkeypatch.setattr(settings, "SYMPLA_URL", fake.url)
+    monkeypatch.setattr(settings, "SYMPLA_CASSETE", None)
+    # Sem limite de taxa: o Fake Sympla é local
+    monkeypatch.setattr(crowler_sympla, "novo_cliente_sympla", lambda: ClienteHttp(headers=crowler_sympla.HEADERS))
+    yield fake
+    fake.parar()
+
+def __esperado(fake):
+    esperado = {}
+    for evento in fake.eventos:
+        categorias = [
+            category for category, collection in crowler_sympla.CATEGORIAS_SYMPLA.items()
+            if fake_sympla.filtrar_eventos([evento], {"collections": collection})
+        ]
+        esperado[evento["id"]] = (evento["id"] % 5 != 0, categorias)
+    return esperado
+
+def __mesclados(eventos):
+    assert len(eventos) == len({evento["id"] for evento in eventos})
+    return {evento["id"]: (evento["need_pay"], evento["category"]) for evento in eventos}
+
+def test_evento_so_na_passada_de_gratuitos(fake):
+    eventos = [event for lote in crowler_sympla.iter_lotes_eventos_sympla(tamanho_lote=10) for event in lote]
+    mesclados = __mesclados(eventos)
+    assert mesclados[SO_NOS_GRATUITOS][0] is False
+    assert mesclados == __esperado(fake)
+    # O evento não visto sai com o payload da passada de gratuitos
+    assert {evento["id"]: evento for evento in eventos}[SO_NOS_GRATUITOS]["name"] == "Evento 10"
+
+def test_evento_so_na_passada_de_gratuitos_async(fake):
+    async def coletar():
+        return [event async for lote in crowler_sympla.aiter_lotes_eventos_sympla(tamanho_lote=10) for event in lote]
+
+    # Loop próprio: asyncio.run troca o loop padrão, em que o TestClient dos outros
+    # testes já deixou conexões do pool assíncrono
+    loop = asyncio.new_event_loop()
+    try:
+        assert __mesclados(loop.run_until_complete(coletar())) == __esperado(fake)
+    finally:
+        loop.close()
@@ -0,0 +1,60 @@
+import asyncio
+
+from sqlalchemy import update
+
+from app.api.v1 import evento_router
+from app.core.config import settings
+from app.models.models import Evento, amigos_association, usuarios_eventos_querem_ir
+from tests.fabricas import novo_evento, novo_usuario
+
+def test_home(client, session):
+    popular, do_amigo = novo_evento(session, categoria=["TEATRO"]), novo_evento(session, categoria=["MUSICA"])
+    usuario = novo_usuario(session, categorias_interesse=["TEATRO"])
+    amigo = novo_usuario(session)
+    session.execute(amigos_association.insert().values(usuario_id=usuario.id, amigo_id=amigo.id))
+    session.execute(usuarios_eventos_querem_ir.insert().values(usuario_id=amigo.id, evento_id=do_amigo.id))
+    session.execute(update(Evento).where(Evento.id == popular.id).values(qtd_quero_ir=3))
+    session.commit()
+
+    resposta = client.get(f"/eventos/feed/home/{usuario.id}")
+    assert resposta.status_code == 200, resposta.text
+    feed = resposta.json()
+    carrosseis = {nome: (carrossel["status"], carrossel["eventos_ids"]) for nome, carrossel in feed["carrosseis"].items()}
+    assert carrosseis["populares"] == ("ok", [popular.id])
+    assert carrosseis["popular_entre_amigos"] == ("ok", [do_amigo.id])
+    assert carrosseis["recomendados_para_voce"] == ("ok", [popular.id])
+    assert carrosseis["categoria_aleatoria"][0] == "vazio"  # catálogo de categorias ainda não calculado
+    # Cada evento vai uma única vez, com os campos de EventoResponse
+    assert sorted(evento["id"] for evento in feed["eventos"]) == sorted([popular.id, do_amigo.id])
+    assert {evento["id"]: evento["nome"] for evento in feed["eventos"]}[popular.id] == popular.nome
+
+def test_usuario_inexistente_nao_dispara_os_carrosseis(client, session, monkeypatch):
+    chamados = []
+    for nome in evento_router.CARROSSEIS_HOME:
+        monkeypatch.setitem(evento_router.CARROSSEIS_HOME, nome, lambda db, usuario_id, nome=nome: chamados.append(nome))
+
+    assert client.get("/eventos/feed/home/999").status_code == 404
+    assert chamados == []
+
+def test_carrossel_com_erro_ou_lento_nao_derruba_os_outros(client, session, monkeypatch):
+    usuario = novo_usuario(session)
+    session.commit()
+
+    async def com_erro(db, usuario_id):
+        raise RuntimeError("falhou")
+
+    async def lento(db, usuario_id):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(settings, "FEED_HOME_TIMEOUT_SEGUNDOS", 0.1)
+    monkeypatch.setitem(evento_router.CARROSSEIS_HOME, "populares", com_erro)
+    monkeypatch.setitem(evento_router.CARROSSEIS_HOME, "categoria_aleatoria", lento)
+
+    feed = client.get(f"/eventos/feed/home/{usuario.id}").json()
+    assert {nome: carrossel["status"] for nome, carrossel in feed["carrosseis"].items()} == {
+        "populares": "erro",
+        "popular_entre_amigos": "vazio",
+        "recomendados_para_voce": "vazio",
+        "categoria_aleatoria": "tempo_esgotado",
+    }
+    assert feed["eventos"] == []
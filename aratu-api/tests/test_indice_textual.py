@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services.indice_textual import IndiceTextual, termos
+
+def __evento(evento_id, nome, descricao="", organizador="", local="", dias=10):
+    return SimpleNamespace(
+        id=evento_id, nome=nome, descricao=descricao, organizador=organizador, local=local,
+        data_hora=datetime.now().replace(microsecond=0) + timedelta(days=dias),
+    )
+
+EVENTOS = [
+    __evento(1, "Festival de Jazz no Recife", "<p>Shows de jazz e blues</p>", "Jazz PE", "Marco Zero"),
+    __evento(2, "Noite de jazz", "Músicos convidados", "Jazz PE", "Paço do Frevo"),
+    __evento(3, "Peça de teatro infantil", "Teatro para crianças", "Cia. Aratu", "Teatro de Santa Isabel"),
+    __evento(4, "Oficina de frevo", "Passos de frevo", "Paço do Frevo", "Paço do Frevo"),
+    __evento(5, "Show de jazz antigo", "Já aconteceu", "Jazz PE", "Marco Zero", dias=-60),
+]
+
+def test_termos_dobrados_sem_stopwords_e_no_singular():
+    assert list(termos("<b>Músicas</b> e Canções de São João, 2024")) == ["musica", "cancao", "joao"]
+
+def test_salvar_e_carregar(tmp_path):
+    indice = IndiceTextual().com_alteracoes(EVENTOS)
+    caminho = str(tmp_path / "indices" / "indice_textual.npz")
+    indice.salvar(caminho)
+    carregado = IndiceTextual.carregar(caminho)
+
+    assert carregado.termos == indice.termos
+    for campo in ("ids", "data_hora", "indptr", "termos_ids", "contagens"):
+        atual, salvo = getattr(carregado, campo), getattr(indice, campo)
+        assert atual.dtype == salvo.dtype
+        assert np.array_equal(atual, salvo)
+    vetor = indice.vetor(EVENTOS[0])
+    assert carregado.similares(vetor, 3, excluir=1, somente_futuros=False) == indice.similares(vetor, 3, excluir=1, somente_futuros=False)
+    assert not list(tmp_path.glob("indices/*.tmp"))
+
+def test_carregar_sem_arquivo_e_indice_vazio(tmp_path):
+    assert len(IndiceTextual.carregar(str(tmp_path / "nao_existe.npz"))) == 0
+
+    caminho = str(tmp_path / "vazio.npz")
+    IndiceTextual().salvar(caminho)
+    vazio = IndiceTextual.carregar(caminho)
+    assert len(vazio) == 0 and vazio.termos == []
+    assert vazio.similares(vazio.vetor(EVENTOS[0]), 3) == []
+
+def test_similares():
+    indice = IndiceTextual().com_alteracoes(EVENTOS)
+    similares = indice.similares(indice.vetor_do_evento(1), 10, excluir=1)
+    assert [evento_id for evento_id, _ in similares][0] == 2
+    # O evento passado só aparece sem o filtro de futuros
+    assert 5 not in dict(similares)
+    assert 5 in dict(indice.similares(indice.vetor_do_evento(1), 10, excluir=1, somente_futuros=False))
+    assert 3 not in dict(similares)
+
+def test_alteracoes_equivalem_a_indexar_do_zero():
+    renomeado = __evento(3, "Festival de blues", "Jazz e blues", "Jazz PE", "Marco Zero")
+    indice = IndiceTextual().com_alteracoes(EVENTOS).com_alteracoes([renomeado], removidos=[4], corte=datetime.now() - timedelta(days=30))
+    do_zero = IndiceTextual().com_alteracoes([EVENTOS[0], EVENTOS[1], renomeado])
+
+    assert sorted(indice.ids.tolist()) == [1, 2, 3]
+    # Os termos que só os eventos que saíram usavam deixam o vocabulário
+    assert sorted(indice.termos) == sorted(do_zero.termos)
+    assert "crianca" not in indice.vocabulario and "oficina" not in indice.vocabulario
+    for evento_id in (1, 2, 3):
+        assert dict(indice.similares(indice.vetor_do_evento(evento_id), 5, excluir=evento_id)) == dict(
+            do_zero.similares(do_zero.vetor_do_evento(evento_id), 5, excluir=evento_id)
+        )
@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.models.models import ControleCarga
+from app.services import carga_services
+
+def __cargas(session):
+    session.expire_all()
+    return session.execute(select(ControleCarga.fonte, ControleCarga.status).order_by(ControleCarga.id)).all()
+
+def test_uma_carga_em_andamento_por_fonte(session):
+    primeira = carga_services.iniciar_carga(session, "SYMPLA", "COMPLETA")
+    assert primeira is not None and primeira.status == "EM_PROGRESSO"
+    assert carga_services.iniciar_carga(session, "SYMPLA", "INCREMENTAL") is None
+    assert carga_services.iniciar_carga(session, "OUTRA", "COMPLETA") is not None
+
+    # Concluída a primeira, a fonte aceita uma nova carga
+    primeira.status = "SUCESSO"
+    session.commit()
+    assert carga_services.iniciar_carga(session, "SYMPLA", "INCREMENTAL") is not None
+    assert __cargas(session) == [("SYMPLA", "SUCESSO"), ("OUTRA", "EM_PROGRESSO"), ("SYMPLA", "EM_PROGRESSO")]
+
+def test_carga_abandonada_vira_erro(session):
+    abandonada = carga_services.iniciar_carga(session, "SYMPLA", "COMPLETA")
+    abandonada.inic_exec = datetime.now() - timedelta(hours=settings.CARGA_TIMEOUT_HORAS, minutes=1)
+    session.commit()
+
+    nova = carga_services.iniciar_carga(session, "SYMPLA", "COMPLETA")
+    assert nova is not None
+    session.refresh(abandonada)
+    assert abandonada.status == "ERRO" and abandonada.fim_exec is not None
+
+def test_pedidos_simultaneos_criam_uma_so_carga(session):
+    pedidos = 8
+    largada = threading.Barrier(pedidos)
+
+    def iniciar(_):
+        with SessionLocal() as outra_sessao:
+            largada.wait()
+            controle_carga = carga_services.iniciar_carga(outra_sessao, "SYMPLA", "COMPLETA")
+            return controle_carga.id if controle_carga else None
+
+    with ThreadPoolExecutor(pedidos) as executor:
+        criadas = [controle_carga_id for controle_carga_id in executor.map(iniciar, range(pedidos)) if controle_carga_id]
+    assert len(criadas) == 1
+    assert __cargas(session) == [("SYMPLA", "EM_PROGRESSO")]
+
+def test_populate_com_carga_em_andamento(client, session):
+    carga_services.iniciar_carga(session, "SYMPLA", "COMPLETA")
+
+    assert client.post("/eventos/populate/", params=dict(fontes="SYMPLA")).status_code == 409
+    assert client.post("/eventos/populate/fila", params=dict(fontes="SYMPLA")).status_code == 409
+    assert __cargas(session) == [("SYMPLA", "EM_PROGRESSO")]
@@ -0,0 +1,31 @@
+import pytest
+
+from app.core.config import settings
+
+TOKEN = "token-dos-testes"
+
+@pytest.fixture
+def cliente_interno(monkeypatch):
+    # As rotas testadas aqui não usam o banco
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    monkeypatch.setattr(settings, "INTERNO_TOKEN", TOKEN)
+    return TestClient(app)
+
+def test_sem_token_configurado_as_rotas_ficam_fechadas(cliente_interno, monkeypatch):
+    monkeypatch.setattr(settings, "INTERNO_TOKEN", None)
+    assert cliente_interno.get("/interno/pool").status_code == 403
+    assert cliente_interno.get("/interno/pool", headers={"X-Token-Interno": ""}).status_code == 403
+
+def test_token_errado_ou_ausente(cliente_interno):
+    assert cliente_interno.get("/interno/pool").status_code == 403
+    assert cliente_interno.get("/interno/pool", headers={"X-Token-Interno": "outro"}).status_code == 403
+    assert cliente_interno.get("/interno/pool", headers={"X-Token-Interno": TOKEN}).status_code == 200
+
+@pytest.mark.parametrize("rota", ["/interno/pool/zerar", "/interno/consultas-lentas/zerar", "/interno/cache/invalidar", "/interno/cache/zerar"])
+def test_rotas_204_sem_corpo(cliente_interno, rota):
+    resposta = cliente_interno.post(rota, headers={"X-Token-Interno": TOKEN})
+    assert resposta.status_code == 204
+    assert resposta.content == b""
@@ -0,0 +1,61 @@
+import pytest
+
+from app.models.models import Avaliacao
+from tests.fabricas import novo_evento, novo_usuario
+from tests.orcamento_consultas import verificar_orcamento
+
+# Orçamento de consultas das rotas que já tiveram N+1: a contagem não pode crescer
+# com o número de usuários, eventos, amigos e avaliações envolvidos
+
+@pytest.fixture
+def evento_com_relacoes(session):
+    def criar(quantidade):
+        evento = novo_evento(session)
+        for nota in range(quantidade):
+            usuario = novo_usuario(session)
+            evento.usuarios_que_querem_ir.append(usuario)
+            evento.usuarios_que_foram.append(usuario)
+            session.add(Avaliacao(evento_id=evento.id, usuario_id=usuario.id, avaliacao=nota % 5 + 1))
+        session.commit()
+        return evento.id
+    return criar
+
+@pytest.fixture
+def usuario_com_relacoes(session):
+    def criar(quantidade):
+        usuario = novo_usuario(session)
+        for nota in range(quantidade):
+            evento = novo_evento(session)
+            usuario.amigos.append(novo_usuario(session))
+            usuario.eventos_quero_ir.append(evento)
+            usuario.eventos_fui.append(evento)
+            session.add(Avaliacao(evento_id=evento.id, usuario_id=usuario.id, avaliacao=nota % 5 + 1))
+        session.commit()
+        return usuario.id
+    return criar
+
+@pytest.mark.parametrize("quantidade", [1, 25])
+def test_expand_do_evento(client, evento_com_relacoes, quantidade):
+    evento_id = evento_com_relacoes(quantidade)
+    resposta = verificar_orcamento(client, "GET", f"/eventos/{evento_id}/expand", maximo=4)
+    assert resposta.status_code == 200
+    assert len(resposta.json()["usuarios_que_querem_ir"]) == quantidade
+
+@pytest.mark.parametrize("quantidade", [1, 25])
+def test_expand_do_usuario(client, usuario_com_relacoes, quantidade):
+    usuario_id = usuario_com_relacoes(quantidade)
+    resposta = verificar_orcamento(client, "GET", f"/usuarios/{usuario_id}/expand", maximo=5)
+    assert resposta.status_code == 200
+    assert len(resposta.json()["eventos_fui"]) == quantidade
+
+@pytest.mark.parametrize("quantidade", [1, 25])
+def test_amigos_por_telefone(client, session, quantidade):
+    usuario = novo_usuario(session)
+    contatos = [novo_usuario(session).telefone for _ in range(quantidade)]
+    session.commit()
+
+    resposta = verificar_orcamento(client, "POST", f"/usuarios/{usuario.id}/amigos_lista_contatos", maximo=4, json=contatos + ["81900000000"])
+    assert resposta.status_code == 201
+
+    session.expire_all()
+    assert sorted(amigo.telefone for amigo in session.get(type(usuario), usuario.id).amigos) == sorted(contatos)
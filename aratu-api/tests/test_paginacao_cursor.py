@@ -0,0 +1,55 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.evento_services import CursorInvalido, codificar_cursor, decodificar_cursor
+from tests.fabricas import novo_evento
+
+@pytest.mark.parametrize("ordem", ["asc", "desc"])
+def test_cursor_ida_e_volta(ordem):
+    evento = SimpleNamespace(id=42, data_hora=datetime(2030, 3, 9, 21, 30, 15, 123456))
+    cursor = codificar_cursor(evento, ordem)
+    assert "=" not in cursor
+    assert decodificar_cursor(cursor) == (evento.data_hora, 42, ordem)
+
+@pytest.mark.parametrize("cursor", ["", "nao-e-base64!", "bm9wZQ", "WzFd", "WyJvbnRlbSIsIDEsICJhc2MiXQ"])
+def test_cursor_invalido(cursor):
+    # "bm9wZQ" não é JSON; "WzFd" é [1]; o último tem uma data inválida
+    with pytest.raises(CursorInvalido):
+        decodificar_cursor(cursor)
+
+def __paginas(client, ordem, por_pagina):
+    ids, cursor = [], None
+    while True:
+        params = dict(perPage=por_pagina, order=ordem, contagem="nenhuma")
+        if cursor:
+            params["cursor"] = cursor
+        resposta = client.get("/eventos/feed/todos-paginado", params=params)
+        assert resposta.status_code == 200, resposta.text
+        pagina = resposta.json()
+        ids.extend(evento["id"] for evento in pagina["eventos"])
+        cursor = pagina["next_cursor"]
+        if cursor is None:
+            return ids
+
+@pytest.mark.parametrize("ordem", ["asc", "desc"])
+def test_paginas_por_cursor_percorrem_o_feed_inteiro(client, session, ordem):
+    # Vários eventos no mesmo horário: o id desempata
+    eventos = [novo_evento(session, data_hora=datetime(2030, 1, 1 + n // 3, 20)) for n in range(10)]
+    novo_evento(session, data_hora=None)
+    session.commit()
+
+    esperado = [evento.id for evento in sorted(eventos, key=lambda evento: (evento.data_hora, evento.id), reverse=ordem == "desc")]
+    assert __paginas(client, ordem, 3) == esperado
+    assert __paginas(client, ordem, 10) == esperado
+
+def test_cursor_de_outra_ordem(client, session):
+    for _ in range(3):
+        novo_evento(session)
+    session.commit()
+
+    cursor = client.get("/eventos/feed/todos-paginado", params=dict(perPage=1, order="asc")).json()["next_cursor"]
+    resposta = client.get("/eventos/feed/todos-paginado", params=dict(perPage=1, order="desc", cursor=cursor))
+    assert resposta.status_code == 400
+    assert client.get("/eventos/feed/todos-paginado", params=dict(cursor="lixo")).status_code == 400
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.api.v1 import usuario_router
+from app.core.config import settings
+from app.models.models import Recomendacao, Usuario, amigos_association, usuarios_eventos_querem_ir
+from app.services import recomendacao_services
+from app.services.recomendacao_services import ContextoRecomendacao, recalcular_recomendacoes
+from tests.fabricas import novo_evento, novo_usuario
+
+@pytest.fixture
+def recalculos(monkeypatch):
+    # Os recálculos agendados ficam registrados em vez de rodar
+    agendados = []
+    monkeypatch.setattr(recomendacao_services, "agendar_recalculo", lambda *ids: agendados.append(ids))
+    monkeypatch.setattr(usuario_router, "agendar_recalculo", lambda *ids: agendados.append(ids))
+    monkeypatch.setattr(recomendacao_services, "_tentativas", {})
+    return agendados
+
+@pytest.fixture
+def cenario(session):
+    em_tres_dias = datetime.now().replace(microsecond=0) + timedelta(days=3)
+    eventos = dict(
+        teatro=novo_evento(session, categoria=["TEATRO"], data_hora=em_tres_dias),
+        musica=novo_evento(session, categoria=["MUSICA"], data_hora=em_tres_dias),
+        amigo_quer=novo_evento(session, categoria=["MUSICA"], data_hora=em_tres_dias),
+        marcado=novo_evento(session, categoria=["TEATRO"], data_hora=em_tres_dias),
+        passado=novo_evento(session, categoria=["TEATRO"], data_hora=datetime.now() - timedelta(days=1)),
+    )
+    usuario = novo_usuario(session, categorias_interesse=["TEATRO"])
+    amigo = novo_usuario(session)
+    session.execute(amigos_association.insert().values(usuario_id=usuario.id, amigo_id=amigo.id))
+    session.execute(usuarios_eventos_querem_ir.insert(), [
+        dict(usuario_id=usuario.id, evento_id=eventos["marcado"].id),
+        dict(usuario_id=amigo.id, evento_id=eventos["amigo_quer"].id),
+    ])
+    session.commit()
+    return usuario, {nome: evento.id for nome, evento in eventos.items()}
+
+def test_recalculo(session, cenario):
+    usuario, eventos = cenario
+    recalcular_recomendacoes(session, [usuario.id], ContextoRecomendacao(session))
+
+    recomendados = session.execute(
+        select(Recomendacao.evento_id).where(Recomendacao.usuario_id == usuario.id).order_by(Recomendacao.posicao)
+    ).scalars().all()
+    # Interesse antes do sinal dos amigos; os marcados e os que já passaram ficam de fora
+    assert recomendados == [eventos["teatro"], eventos["amigo_quer"], eventos["musica"]]
+
+def test_recalculo_substitui_o_anterior(session, cenario, monkeypatch):
+    usuario, eventos = cenario
+    recalcular_recomendacoes(session, [usuario.id], ContextoRecomendacao(session))
+    monkeypatch.setattr(settings, "RECOMENDACOES_TOP_K", 1)
+    recalcular_recomendacoes(session, [usuario.id], ContextoRecomendacao(session))
+
+    linhas = session.execute(select(Recomendacao.posicao, Recomendacao.evento_id).where(Recomendacao.usuario_id == usuario.id)).all()
+    assert linhas == [(1, eventos["teatro"])]
+
+def test_rota_le_o_top_k(client, session, cenario, recalculos):
+    usuario, eventos = cenario
+    recalcular_recomendacoes(session, [usuario.id], ContextoRecomendacao(session))
+
+    resposta = client.get(f"/eventos/feed/recomendados-para-voce/{usuario.id}")
+    assert [evento["id"] for evento in resposta.json()] == [eventos["teatro"], eventos["amigo_quer"], eventos["musica"]]
+    assert recalculos == []
+
+def test_sem_recomendacoes_agenda_um_recalculo_por_intervalo(client, session, cenario, recalculos, monkeypatch):
+    usuario, eventos = cenario
+    url = f"/eventos/feed/recomendados-para-voce/{usuario.id}"
+
+    # Sem top-K calculado, vêm os eventos das categorias de interesse
+    resposta = client.get(url)
+    assert resposta.status_code == 200
+    assert {evento["id"] for evento in resposta.json()} == {eventos["teatro"], eventos["marcado"], eventos["passado"]}
+    client.get(url)
+    assert recalculos == [(usuario.id,)]
+
+    monkeypatch.setattr(settings, "RECOMENDACOES_NOVA_TENTATIVA_SEGUNDOS", 0)
+    client.get(url)
+    assert recalculos == [(usuario.id,), (usuario.id,)]
+
+def test_apagar_os_interesses_recalcula(client, session, cenario, recalculos):
+    usuario, _ = cenario
+
+    resposta = client.put(f"/usuarios/{usuario.id}", json={"categorias_interesse": []})
+    assert resposta.status_code == 200, resposta.text
+    session.expire_all()
+    assert session.get(Usuario, usuario.id).categorias_interesse == []
+    assert recalculos == [(usuario.id,)]
+
+    # Sem categorias_interesse no corpo, os interesses não mudam e nada é recalculado
+    client.put(f"/usuarios/{usuario.id}", json={"biografia": "Olá"})
+    assert recalculos == [(usuario.id,)]
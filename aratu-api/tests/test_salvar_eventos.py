@@ -0,0 +1,117 @@
+import importlib.util
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import select, text
+
+from app.models.models import Avaliacao, Evento, usuarios_eventos_querem_ir
+from app.services import evento_services
+from tests.fabricas import novo_evento, novo_usuario
+
+def __linha(id_origem, **colunas):
+    # Um evento como FonteEventos.normalizar o entrega
+    data_hora = datetime(2030, 1, 1, 20) + timedelta(days=id_origem % 30)
+    return {
+        "nome": f"Evento {id_origem}",
+        "descricao": "",
+        "banner": None,
+        "categoria": ["FESTAS_SHOWS"],
+        "local": "Marco Zero",
+        "endereco": "Recife, PE",
+        "data_hora": data_hora,
+        "data_fim": data_hora + timedelta(hours=4),
+        "onde_comprar_ingressos": None,
+        "id_sistema_origem": id_origem,
+        "fonte": "SYMPLA",
+        "organizador": "Organizador",
+        "gratis": True,
+        "atualizado_em": datetime.now(),
+        **colunas,
+    }
+
+def __salvar(session, *linhas):
+    return dict(evento_services.salvar_lote_eventos(session, list(linhas), "SYMPLA"))
+
+def test_contagens_de_inseridos_atualizados_e_inalterados(session):
+    assert __salvar(session, __linha(1), __linha(2), __linha(3)) == dict(inseridos=3, atualizados=0, inalterados=0)
+    assert __salvar(session, __linha(1), __linha(2), __linha(3)) == dict(inseridos=0, atualizados=0, inalterados=3)
+    assert __salvar(session, __linha(1), __linha(2, nome="Renomeado"), __linha(3), __linha(4)) == dict(
+        inseridos=1, atualizados=1, inalterados=2
+    )
+
+    nomes = dict(session.execute(select(Evento.id_sistema_origem, Evento.nome)).all())
+    assert nomes == {1: "Evento 1", 2: "Renomeado", 3: "Evento 3", 4: "Evento 4"}
+
+def test_atualizado_em_so_muda_com_o_conteudo(session):
+    __salvar(session, __linha(1, atualizado_em=datetime(2030, 1, 1)))
+    __salvar(session, __linha(1, atualizado_em=datetime(2030, 1, 2)))
+    assert session.execute(select(Evento.atualizado_em)).scalar_one() == datetime(2030, 1, 1)
+
+    __salvar(session, __linha(1, local="Paço do Frevo", atualizado_em=datetime(2030, 1, 3)))
+    assert session.execute(select(Evento.atualizado_em)).scalar_one() == datetime(2030, 1, 3)
+
+def test_evento_repetido_no_lote_conta_uma_vez(session):
+    assert __salvar(session, __linha(1), __linha(1, nome="Repetido")) == dict(inseridos=1, atualizados=0, inalterados=0)
+    assert session.execute(select(Evento.nome)).scalar_one() == "Repetido"
+
+def test_carga_concorrente_com_o_mesmo_conteudo_conta_como_inalterado(session, monkeypatch):
+    __salvar(session, __linha(1))
+    # Outra carga gravou o mesmo conteúdo entre a leitura dos hashes e o INSERT
+    monkeypatch.setattr(evento_services, "hashes_existentes", lambda *args: {})
+    assert __salvar(session, __linha(1)) == dict(inseridos=0, atualizados=0, inalterados=1)
+
+def test_mesclar_une_categorias_e_gratuidade(session):
+    evento_services.mesclar_eventos(session, [__linha(1, categoria=["TEATRO"], gratis=True)])
+    evento_services.mesclar_eventos(session, [__linha(1, categoria=["FESTAS_SHOWS"], gratis=False)])
+    evento_services.mesclar_eventos(session, [__linha(1, categoria=["TEATRO"], gratis=True)])
+    session.commit()
+
+    categoria, gratis, hash_conteudo = session.execute(select(Evento.categoria, Evento.gratis, Evento.hash_conteudo)).one()
+    assert categoria == ["FESTAS_SHOWS", "TEATRO"]
+    assert gratis is False
+    assert hash_conteudo is None
+
+def __migracao_deduplicacao():
+    caminho = Path(__file__).parents[1] / "alembic" / "versions" / "5ff3bf663656_unique_fonte_id_sistema_origem.py"
+    spec = importlib.util.spec_from_file_location("migracao_deduplicacao", caminho)
+    migracao = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migracao)
+    return migracao
+
+def test_migracao_de_deduplicacao(session, engine_testes):
+    with engine_testes.begin() as conexao:
+        conexao.execute(text("ALTER TABLE eventos DROP CONSTRAINT uq_eventos_fonte_id_sistema_origem"))
+    try:
+        mantido = novo_evento(session, id_sistema_origem=1)
+        duplicado = novo_evento(session, id_sistema_origem=1)
+        outro = novo_evento(session, id_sistema_origem=2)
+        ana, bia, caio = novo_usuario(session), novo_usuario(session), novo_usuario(session)
+        session.execute(usuarios_eventos_querem_ir.insert(), [
+            dict(usuario_id=ana.id, evento_id=mantido.id),
+            dict(usuario_id=ana.id, evento_id=duplicado.id),
+            dict(usuario_id=bia.id, evento_id=duplicado.id),
+        ])
+        session.add_all([
+            # Ana avaliou as duas cópias: fica a avaliação mais recente
+            Avaliacao(usuario_id=ana.id, evento_id=mantido.id, avaliacao=2),
+            Avaliacao(usuario_id=ana.id, evento_id=duplicado.id, avaliacao=5),
+            Avaliacao(usuario_id=bia.id, evento_id=duplicado.id, avaliacao=4),
+            Avaliacao(usuario_id=caio.id, evento_id=outro.id, avaliacao=3),
+        ])
+        session.commit()
+
+        with engine_testes.begin() as conexao, Operations.context(MigrationContext.configure(conexao)):
+            __migracao_deduplicacao().deduplicar_eventos()
+    finally:
+        with engine_testes.begin() as conexao:
+            conexao.execute(text(
+                "ALTER TABLE eventos ADD CONSTRAINT uq_eventos_fonte_id_sistema_origem UNIQUE (fonte, id_sistema_origem)"
+            ))
+
+    assert session.execute(select(Evento.id).order_by(Evento.id)).scalars().all() == [mantido.id, outro.id]
+    querem_ir = session.execute(select(usuarios_eventos_querem_ir.c.usuario_id, usuarios_eventos_querem_ir.c.evento_id)).all()
+    assert sorted(querem_ir) == [(ana.id, mantido.id), (bia.id, mantido.id)]
+    avaliacoes = session.execute(select(Avaliacao.usuario_id, Avaliacao.evento_id, Avaliacao.avaliacao)).all()
+    assert sorted(avaliacoes) == [(ana.id, mantido.id, 5), (bia.id, mantido.id, 4), (caio.id, outro.id, 3)]